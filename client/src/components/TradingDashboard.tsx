@@ -81,22 +81,31 @@ const TradingDashboard: React.FC = () => {
   useEffect(() => {
     if (priceSocket) {
       priceSocket.onmessage = (event) => {
-        const data = JSON.parse(event.data);
-        handlePriceUpdate(data);
+        const message = JSON.parse(event.data);
+        // Price frames batch every token that changed in a feed tick;
+        // a snapshot with every current price arrives on connect
+        if (message.type === 'price_update' || message.type === 'snapshot') {
+          message.data.forEach((update: PriceData) => handlePriceUpdate(update));
+        }
       };
     }
 
     if (positionsSocket) {
       positionsSocket.onmessage = (event) => {
-        const data = JSON.parse(event.data);
-        handlePositionUpdate(data);
+        const message = JSON.parse(event.data);
+        if (message.type === 'position_update') {
+          message.data.forEach((position: Position) => handlePositionUpdate(position));
+        }
       };
     }
 
     if (riskSocket) {
       riskSocket.onmessage = (event) => {
-        const data = JSON.parse(event.data);
-        handleRiskAlert(data);
+        const message = JSON.parse(event.data);
+        // Pings share the channel; useWebSocket answers them
+        if (message.type === 'risk_alert') {
+          handleRiskAlert(message.data);
+        }
       };
     }
   }, [priceSocket, positionsSocket, riskSocket]);
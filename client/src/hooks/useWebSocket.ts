@@ -1,38 +1,60 @@
-import { useEffect, useRef, useState } from 'react';
+import { useEffect, useState } from 'react';
 
 export const useWebSocket = (url: string) => {
   const [isConnected, setIsConnected] = useState(false);
-  const wsRef = useRef<WebSocket | null>(null);
+  // Kept in state so consumers re-attach their handlers to a reconnected socket
+  const [socket, setSocket] = useState<WebSocket | null>(null);
 
   useEffect(() => {
-    const ws = new WebSocket(url);
-
-    ws.onopen = () => {
-      console.log(`Connected to WebSocket: ${url}`);
-      setIsConnected(true);
-    };
-
-    ws.onclose = () => {
-      console.log(`Disconnected from WebSocket: ${url}`);
-      setIsConnected(false);
-      // Attempt to reconnect after 3 seconds
-      setTimeout(() => {
-        wsRef.current = new WebSocket(url);
-      }, 3000);
-    };
-
-    ws.onerror = (error) => {
-      console.error(`WebSocket error: ${error}`);
-      ws.close();
+    let ws: WebSocket;
+    let reconnectTimer: ReturnType<typeof setTimeout> | undefined;
+    let unmounted = false;
+
+    const connect = () => {
+      ws = new WebSocket(url);
+
+      ws.onopen = () => {
+        console.log(`Connected to WebSocket: ${url}`);
+        setIsConnected(true);
+      };
+
+      ws.onclose = () => {
+        console.log(`Disconnected from WebSocket: ${url}`);
+        setIsConnected(false);
+        if (!unmounted) {
+          // Attempt to reconnect after 3 seconds
+          reconnectTimer = setTimeout(connect, 3000);
+        }
+      };
+
+      // Answer server heartbeats so the connection is not reaped as idle
+      const current = ws;
+      current.addEventListener('message', (event) => {
+        if (typeof event.data === 'string' && event.data.includes('"ping"')) {
+          const message = JSON.parse(event.data);
+          if (message.type === 'ping') {
+            current.send(JSON.stringify({ type: 'pong' }));
+          }
+        }
+      });
+
+      ws.onerror = (error) => {
+        console.error(`WebSocket error: ${error}`);
+        current.close();
+      };
+
+      setSocket(ws);
     };
 
-    wsRef.current = ws;
+    connect();
 
     // Cleanup on unmount
     return () => {
+      unmounted = true;
+      clearTimeout(reconnectTimer);
       ws.close();
     };
   }, [url]);
 
-  return wsRef.current;
+  return socket;
 };
@@ -0,0 +1,32 @@
+"""Add candle interval to market_data
+
+Revision ID: 3f9c1d2a7b10
+Revises: b28414200ec4
+Create Date: 2026-10-17 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c1d2a7b10'
+down_revision: Union[str, None] = 'b28414200ec4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('market_data', sa.Column('interval', sa.String(), nullable=True))
+    op.create_index(
+        'ix_market_data_token_interval_timestamp',
+        'market_data',
+        ['token_id', 'interval', 'timestamp'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_market_data_token_interval_timestamp', table_name='market_data')
+    op.drop_column('market_data', 'interval')
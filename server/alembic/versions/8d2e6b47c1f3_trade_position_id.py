@@ -0,0 +1,28 @@
+"""Add chain position id to trades
+
+Revision ID: 8d2e6b47c1f3
+Revises: 3f9c1d2a7b10
+Create Date: 2026-10-17 18:04:51.527310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e6b47c1f3'
+down_revision: Union[str, None] = '3f9c1d2a7b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('trades', sa.Column('position_id', sa.String(), nullable=True))
+    op.create_index(op.f('ix_trades_position_id'), 'trades', ['position_id'])
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_trades_position_id'), table_name='trades')
+    op.drop_column('trades', 'position_id')
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, HTTPException, Query, Path
+from fastapi import APIRouter, Depends, HTTPException, Query, Path
 from typing import List, Dict, Optional
 from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
 from datetime import datetime
+from ...models.database import get_db
 
 router = APIRouter()
 
@@ -9,9 +11,36 @@ router = APIRouter()
 class OpenPositionRequest(BaseModel):
     token: str = Field(..., description="Token symbol to trade")
     amount: float = Field(..., gt=0, description="Amount to trade")
-    direction: str = Field(..., regex="^(UP|DOWN)$", description="Trading direction")
+    direction: str = Field(..., pattern="^(UP|DOWN)$", description="Trading direction")
     duration: int = Field(..., ge=1, le=5, description="Trading duration in minutes")
 
+class PositionTriggersRequest(BaseModel):
+    wallet_address: str = Field(..., description="Wallet that owns the position")
+    stop_loss: Optional[float] = Field(None, gt=0, description="Close when the price reaches this loss level")
+    take_profit: Optional[float] = Field(None, gt=0, description="Close when the price reaches this profit level")
+
+MAX_BATCH_TRADES = 100
+
+class BatchTradeItem(BaseModel):
+    token: str = Field(..., description="Token symbol to trade")
+    side: str = Field(..., pattern="^(BUY|SELL)$", description="Order side")
+    size: float = Field(..., gt=0, description="Amount to trade")
+    price: float = Field(..., gt=0, description="Reference price")
+    leverage: float = Field(1.0, gt=0, description="Position leverage")
+    stop_loss: Optional[float] = Field(None, gt=0, description="Close when the price reaches this loss level")
+    take_profit: Optional[float] = Field(None, gt=0, description="Close when the price reaches this profit level")
+
+class BatchTradeRequest(BaseModel):
+    user_id: str = Field(..., description="User placing the trades")
+    wallet_address: str = Field(..., description="Wallet the trades are placed from")
+    trades: List[BatchTradeItem] = Field(..., min_length=1, max_length=MAX_BATCH_TRADES)
+    client_batch_id: Optional[str] = Field(None, description="Retries with the same id get the first result")
+
+class BatchCloseRequest(BaseModel):
+    user_id: str = Field(..., description="User closing the trades")
+    wallet_address: str = Field(..., description="Wallet that owns the positions")
+    trade_ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_TRADES)
+
 class TokenSwapRequest(BaseModel):
     from_token: str = Field(..., description="Token to swap from")
     to_token: str = Field(..., description="Token to swap to")
@@ -56,7 +85,7 @@ async def get_token_details(
 @router.get("/tokens/{token_id}/price-history")
 async def get_token_price_history(
     token_id: str = Path(..., description="Token ID"),
-    timeframe: str = Query("1d", regex="^(1d|1w)$")
+    timeframe: str = Query("1d", pattern="^(1d|1w)$")
 ) -> List[Dict]:
     """Get historical price data for a token"""
     from ...services.market_data import MarketDataService
@@ -72,6 +101,35 @@ async def get_token_analytics(
     analytics_service = AnalyticsService()
     return await analytics_service.get_token_analytics(token_id)
 
+@router.get("/market/feed-status")
+async def get_feed_status() -> Dict:
+    """Get the price feed's effective refresh interval per token"""
+    from ...services.price_feed import get_feed_status
+    return get_feed_status()
+
+@router.get("/market/trigger-metrics")
+async def get_trigger_metrics() -> Dict:
+    """Get armed and fired stop-loss/take-profit counts and tick-to-trigger latency"""
+    from ...services.mock_chain import mock_chain
+    return mock_chain.trigger_engine.get_metrics()
+
+@router.get("/market/chain-journal-metrics")
+async def get_chain_journal_metrics() -> Dict:
+    """Get mock chain write-ahead log position, fsync batching and snapshot counts"""
+    from ...services.mock_chain import mock_chain
+    if mock_chain.journal is None:
+        return {"enabled": False}
+    return {"enabled": True, **mock_chain.journal.get_metrics()}
+
+@router.get("/market/{symbol}/order-book")
+async def get_order_book(
+    symbol: str = Path(..., description="Token symbol"),
+    levels: int = Query(10, ge=1, le=100)
+) -> Dict:
+    """Get aggregated order book depth for a token"""
+    from ...services.mock_chain import mock_chain
+    return await mock_chain.get_order_book(symbol.upper(), levels)
+
 # Trading Endpoints
 @router.post("/positions/open")
 async def open_position(
@@ -106,14 +164,71 @@ async def close_position(
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+@router.post("/positions/{position_id}/triggers")
+async def set_position_triggers(
+    triggers: PositionTriggersRequest,
+    position_id: str = Path(..., description="Position ID"),
+    db: Session = Depends(get_db)
+) -> Dict:
+    """Set a stop-loss and/or take-profit on an open position"""
+    from ...services.trading import trading_service
+    
+    try:
+        return await trading_service.set_position_triggers(
+            db,
+            triggers.wallet_address,
+            position_id,
+            triggers.stop_loss,
+            triggers.take_profit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/trades/batch")
+async def place_trades(
+    request: BatchTradeRequest,
+    db: Session = Depends(get_db)
+) -> Dict:
+    """Place up to 100 trades in one request; results are in input order"""
+    from ...services.trading import trading_service
+    return await trading_service.place_trades(
+        db,
+        request.user_id,
+        request.wallet_address,
+        [trade.model_dump() for trade in request.trades],
+        request.client_batch_id
+    )
+
+@router.post("/trades/batch/close")
+async def close_trades(
+    request: BatchCloseRequest,
+    db: Session = Depends(get_db)
+) -> Dict:
+    """Close up to 100 trades in one request; results are in input order"""
+    from ...services.trading import trading_service
+    return await trading_service.close_trades(db, request.user_id, request.wallet_address, request.trade_ids)
+
 @router.get("/positions/user/{user_id}")
 async def get_user_positions(
-    user_id: str = Path(..., description="User ID")
+    user_id: str = Path(..., description="User ID"),
+    wallet_address: str = Query(..., description="Wallet that owns the positions"),
+    db: Session = Depends(get_db)
+) -> List[Dict]:
+    """Get all of a user's open positions with current PnL"""
+    from ...services.trading import trading_service
+    return await trading_service.get_user_positions(db, user_id, wallet_address)
+
+@router.get("/positions/user/{user_id}/open")
+async def get_open_positions(
+    user_id: str = Path(..., description="User ID"),
+    wallet_address: str = Query(..., description="Wallet that owns the positions"),
+    cursor: Optional[int] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
 ) -> Dict:
-    """Get all positions and analytics for a user"""
-    from ...services.trading import TradingService
-    trading_service = TradingService()
-    return await trading_service.get_user_positions(user_id)
+    """Get a page of a user's open positions with current PnL"""
+    from ...services.trading import trading_service
+    return await trading_service.get_user_positions_page(db, user_id, wallet_address, cursor, limit)
 
 # Risk Management Endpoints
 @router.get("/risk/metrics/{token_id}")
@@ -128,7 +243,7 @@ async def get_risk_metrics(
 # Rewards Endpoints
 @router.get("/rewards/leaderboard")
 async def get_leaderboard(
-    timeframe: str = Query("weekly", regex="^(daily|weekly|monthly)$")
+    timeframe: str = Query("weekly", pattern="^(daily|weekly|monthly)$")
 ) -> List[Dict]:
     """Get points leaderboard"""
     from ...services.rewards import RewardsService
@@ -1,53 +1,97 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
-from sqlalchemy.orm import Session
-from app.models.database import get_db
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from typing import Awaitable, Callable, Optional
 from app.services.websocket import ws_manager
+from app.services.ws_codec import negotiate_encoding
+import json
 import logging
 from uuid import uuid4
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-@router.websocket("/ws/price-feed")
-async def price_feed_websocket(websocket: WebSocket):
-    client_id = str(uuid4())
-    await ws_manager.manager.connect(websocket, client_id, "price_feed")
+@router.get("/ws/metrics")
+async def websocket_metrics():
+    """Connections, churn, outbound queue depth and drops per channel"""
+    metrics = ws_manager.manager.get_metrics()
+    metrics["backplane"] = ws_manager.backplane.get_metrics()
+    metrics["conflation"] = ws_manager.get_conflation_metrics()
+    return metrics
+
+async def handle_price_feed_message(client_id: str, data: str):
+    """Apply a subscribe/unsubscribe request from a price feed client.
+
+    Clients send ``{"action": "subscribe", "symbols": ["INJ"]}`` (or
+    ``unsubscribe``). Until a client subscribes it receives every symbol;
+    after unsubscribing its last symbol it receives none. ``"*"`` subscribes
+    to (or unsubscribes from) every symbol. Subscribing also sends a
+    snapshot of the newly followed symbols.
+    """
+    try:
+        request = json.loads(data)
+        action = request.get("action")
+        symbols = [str(symbol) for symbol in request.get("symbols", [])]
+    except (ValueError, AttributeError, TypeError):
+        return
+    
+    if action == "subscribe":
+        subscribed = ws_manager.manager.subscribe(client_id, "price_feed", symbols)
+        # Newly followed symbols start from their current price
+        await ws_manager.send_price_snapshot(client_id, None if subscribed is None else symbols)
+    elif action == "unsubscribe":
+        subscribed = ws_manager.manager.unsubscribe(client_id, "price_feed", symbols)
+    else:
+        return
+    
+    await ws_manager.manager.send_personal_message({
+        "type": "subscriptions",
+        "symbols": ["*"] if subscribed is None else sorted(subscribed)
+    }, client_id, "price_feed")
+
+async def receive_loop(websocket: WebSocket, client_id: str, channel: str,
+                       handler: Optional[Callable[[str, str], Awaitable[None]]] = None):
+    """Read client frames until disconnect; any frame (pongs included) counts as liveness"""
     try:
         while True:
-            # Keep connection alive
             data = await websocket.receive_text()
+            ws_manager.manager.touch(client_id, channel)
+            if handler is not None:
+                await handler(client_id, data)
     except WebSocketDisconnect:
-        ws_manager.manager.disconnect(client_id, "price_feed")
+        ws_manager.manager.disconnect(client_id, channel, websocket)
+    except Exception as e:
+        # e.g. a binary frame from a msgpack client; don't leave a zombie for the reaper
+        logger.warning(f"Closing {channel} client {client_id} after a receive error: {str(e)}")
+        ws_manager.manager.disconnect(client_id, channel, websocket)
+        try:
+            await websocket.close(code=1003)
+        except Exception:
+            pass
+
+@router.websocket("/ws/price-feed")
+async def price_feed_websocket(websocket: WebSocket, since: Optional[int] = None):
+    client_id = str(uuid4())
+    encoding, subprotocol = negotiate_encoding(websocket)
+    await ws_manager.manager.connect(websocket, client_id, "price_feed", encoding, subprotocol)
+    await ws_manager.send_price_snapshot(client_id, since=since)
+    await receive_loop(websocket, client_id, "price_feed", handle_price_feed_message)
 
 @router.websocket("/ws/trades/{user_id}")
 async def trades_websocket(websocket: WebSocket, user_id: str):
     client_id = str(user_id)
-    await ws_manager.manager.connect(websocket, client_id, "trades")
-    try:
-        while True:
-            # Keep connection alive
-            data = await websocket.receive_text()
-    except WebSocketDisconnect:
-        ws_manager.manager.disconnect(client_id, "trades")
+    encoding, subprotocol = negotiate_encoding(websocket)
+    await ws_manager.manager.connect(websocket, client_id, "trades", encoding, subprotocol)
+    await receive_loop(websocket, client_id, "trades")
 
 @router.websocket("/ws/positions/{user_id}")
 async def positions_websocket(websocket: WebSocket, user_id: str):
     client_id = str(user_id)
-    await ws_manager.manager.connect(websocket, client_id, "positions")
-    try:
-        while True:
-            # Keep connection alive
-            data = await websocket.receive_text()
-    except WebSocketDisconnect:
-        ws_manager.manager.disconnect(client_id, "positions")
+    encoding, subprotocol = negotiate_encoding(websocket)
+    await ws_manager.manager.connect(websocket, client_id, "positions", encoding, subprotocol)
+    await receive_loop(websocket, client_id, "positions")
 
 @router.websocket("/ws/risk/{user_id}")
 async def risk_websocket(websocket: WebSocket, user_id: str):
     client_id = str(user_id)
-    await ws_manager.manager.connect(websocket, client_id, "risk")
-    try:
-        while True:
-            # Keep connection alive
-            data = await websocket.receive_text()
-    except WebSocketDisconnect:
-        ws_manager.manager.disconnect(client_id, "risk")
+    encoding, subprotocol = negotiate_encoding(websocket)
+    await ws_manager.manager.connect(websocket, client_id, "risk", encoding, subprotocol)
+    await receive_loop(websocket, client_id, "risk")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Enum
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Enum, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -52,6 +52,7 @@ class Trade(Base):
     stop_loss = Column(Float, nullable=True)
     pnl = Column(Float, nullable=True)
     status = Column(String)  # OPEN, CLOSED, LIQUIDATED
+    position_id = Column(String, index=True, nullable=True)  # Mock chain position
     created_at = Column(DateTime, default=datetime.utcnow)
     closed_at = Column(DateTime, nullable=True)
     user = relationship("User", back_populates="trades")
@@ -85,10 +86,15 @@ class MarketData(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     token_id = Column(Integer, ForeignKey("tokens.id"))
+    interval = Column(String, default="1m")  # 1m, 5m, 1h, 1d
     price = Column(Float)
     volume = Column(Float)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow)  # Bar open time
     open = Column(Float)
     high = Column(Float)
     low = Column(Float)
     close = Column(Float)
+
+    __table_args__ = (
+        Index("ix_market_data_token_interval_timestamp", "token_id", "interval", "timestamp"),
+    )
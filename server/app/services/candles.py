@@ -0,0 +1,108 @@
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.models.models import MarketData
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bar intervals kept for every token, in seconds
+CANDLE_INTERVALS = {
+    "1m": 60,
+    "5m": 300,
+    "1h": 3600,
+    "1d": 86400,
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+class CandleAggregator:
+    """Folds price ticks into OHLCV bars and hands out only closed bars"""
+
+    def __init__(self, intervals: Optional[Dict[str, int]] = None):
+        self.intervals = intervals or CANDLE_INTERVALS
+        # (token_id, interval) -> bar currently being built
+        self._open_bars: Dict[Tuple[int, str], Dict] = {}
+        self._closed_bars: List[Dict] = []
+        # token_id -> last rolling 24h volume seen, to turn it into per-bar volume
+        self._last_volume: Dict[int, float] = {}
+
+    def _bucket_start(self, timestamp: datetime, seconds: int) -> datetime:
+        # Timestamps are naive UTC, so bucket against the naive epoch
+        elapsed = int((timestamp - _EPOCH).total_seconds())
+        return _EPOCH + timedelta(seconds=elapsed - elapsed % seconds)
+
+    def add_tick(self, token_id: int, price: float, volume: float, timestamp: Optional[datetime] = None):
+        """Fold one tick into the open bar of every interval.
+
+        `volume` is the feed's rolling 24h volume. A bar's volume is the sum
+        of its rises between ticks; falls (old trades leaving the 24h
+        window) are ignored, so it is an estimate of the traded volume.
+        """
+        timestamp = timestamp or datetime.utcnow()
+        previous = self._last_volume.get(token_id)
+        if volume is not None:
+            self._last_volume[token_id] = volume
+        traded = max(volume - previous, 0.0) if volume is not None and previous is not None else 0.0
+        for interval, seconds in self.intervals.items():
+            key = (token_id, interval)
+            bucket = self._bucket_start(timestamp, seconds)
+            bar = self._open_bars.get(key)
+
+            if bar is not None and bar["timestamp"] != bucket:
+                self._closed_bars.append(bar)
+                bar = None
+
+            if bar is None:
+                self._open_bars[key] = {
+                    "token_id": token_id,
+                    "interval": interval,
+                    "timestamp": bucket,
+                    "open": price,
+                    "high": price,
+                    "low": price,
+                    "close": price,
+                    "price": price,
+                    "volume": traded,
+                }
+            else:
+                bar["high"] = max(bar["high"], price)
+                bar["low"] = min(bar["low"], price)
+                bar["close"] = price
+                bar["price"] = price
+                bar["volume"] += traded
+
+    def close_expired(self, now: Optional[datetime] = None):
+        """Close bars whose window has ended even if no new tick arrived"""
+        now = now or datetime.utcnow()
+        for key, bar in list(self._open_bars.items()):
+            seconds = self.intervals[bar["interval"]]
+            if (now - bar["timestamp"]).total_seconds() >= seconds:
+                self._closed_bars.append(bar)
+                del self._open_bars[key]
+
+    def get_open_bar(self, token_id: int, interval: str) -> Optional[Dict]:
+        """Get the bar still being built for a token"""
+        return self._open_bars.get((token_id, interval))
+
+    def drain_closed(self) -> List[Dict]:
+        """Take all closed bars that have not been flushed yet"""
+        bars, self._closed_bars = self._closed_bars, []
+        return bars
+
+    def flush(self, db: Session, now: Optional[datetime] = None) -> int:
+        """Insert every closed bar in a single bulk statement.
+
+        `now` is the feed's clock (a replay's recorded time); bars whose
+        window ended before it are closed first.
+        """
+        self.close_expired(now)
+        bars = self.drain_closed()
+        if bars:
+            db.execute(insert(MarketData), bars)
+            logger.info(f"Flushed {len(bars)} closed candles")
+        return len(bars)
+
+# Global candle aggregator instance
+candle_aggregator = CandleAggregator()
@@ -0,0 +1,313 @@
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import datetime
+import asyncio
+import fcntl
+import glob
+import json
+import os
+import struct
+import time
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JOURNAL_DIR = os.getenv("CHAIN_WAL_DIR", "/tmp/memefi-chain")  # empty disables the journal
+GROUP_COMMIT_INTERVAL = float(os.getenv("CHAIN_WAL_GROUP_COMMIT_MS", "5")) / 1000
+SNAPSHOT_EVERY = int(os.getenv("CHAIN_SNAPSHOT_EVERY", "100000"))  # events between snapshots
+
+# Frame: payload length, CRC32 of the payload
+_FRAME = struct.Struct("<II")
+# Record fields holding datetimes; JSON stores them as ISO strings
+_DATETIME_FIELDS = ("timestamp", "connected_at", "closed_at")
+_SNAPSHOT_CHUNK = 10000  # records written between yields to the event loop
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def encode_event(event: Dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(event, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(event, separators=(",", ":"), default=_json_default).encode()
+
+def _restore_datetimes(record: Dict):
+    for field in _DATETIME_FIELDS:
+        value = record.get(field)
+        if isinstance(value, str):
+            record[field] = datetime.fromisoformat(value)
+
+def decode_event(payload: bytes) -> Dict:
+    event = orjson.loads(payload) if orjson is not None else json.loads(payload)
+    for value in event.values():
+        if isinstance(value, dict):
+            _restore_datetimes(value)
+    return event
+
+def frame(payload: bytes) -> bytes:
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+def read_frames(path: str) -> Iterator[Tuple[int, bytes]]:
+    """Yield (end offset, payload) for every intact frame; stops at a torn or corrupt one"""
+    offset = 0
+    with open(path, "rb", buffering=1 << 20) as f:
+        while True:
+            header = f.read(_FRAME.size)
+            if len(header) < _FRAME.size:
+                return
+            length, checksum = _FRAME.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                return
+            offset += _FRAME.size + length
+            yield offset, payload
+
+def _lsn_of(path: str) -> int:
+    return int(os.path.basename(path).split("-")[1].split(".")[0])
+
+class ChainJournal:
+    """Append-only, CRC-framed event log with group commit and fuzzy snapshots.
+
+    Events are buffered and written with one fsync per group: the flusher
+    waits ``group_commit_interval`` after the first pending event so that
+    everything arriving meanwhile shares the fsync. ``sync()`` returns once
+    the caller's events are durable.
+
+    The log is split into segments named by the sequence number (LSN) of
+    their first event. A snapshot rotates to a new segment at LSN ``n`` and
+    then writes every record, yielding to the event loop between chunks.
+    Records changed while it is being written are also in segment ``n``,
+    and events are whole-record upserts, so loading ``snapshot-n`` and then
+    replaying segments from ``n`` always ends in the latest state.
+    """
+
+    def __init__(self, directory: str = JOURNAL_DIR,
+                 group_commit_interval: float = GROUP_COMMIT_INTERVAL,
+                 snapshot_every: int = SNAPSHOT_EVERY):
+        self.directory = directory
+        self.group_commit_interval = group_commit_interval
+        self.snapshot_every = snapshot_every
+        self.lsn = 0
+        self.durable_lsn = 0
+        self.since_snapshot = 0
+        self.fsyncs = 0
+        self.written_events = 0
+        self.snapshots = 0
+        self._file = None
+        self._lock_file = None
+        self._buffer: List[bytes] = []
+        self._waiters: List[Tuple[int, asyncio.Future]] = []
+        self._wakeup = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._io_lock = asyncio.Lock()
+
+    def _path(self, prefix: str, lsn: int, suffix: str) -> str:
+        return os.path.join(self.directory, f"{prefix}-{lsn:016d}.{suffix}")
+
+    def lock(self):
+        """Take the directory for this process; a second writer would corrupt the log"""
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_file = open(os.path.join(self.directory, "LOCK"), "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise RuntimeError(f"Chain journal {self.directory} is in use by another process")
+
+    def _open_segment(self, lsn: int):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self._path("wal", lsn, "log"), "ab")
+
+    def recover(self, apply: Callable[[Dict], None]) -> Dict:
+        """Load the newest complete snapshot, replay the log after it, open for append"""
+        started = time.perf_counter()
+        snapshot_lsn, snapshot_events = 0, 0
+        snapshots = sorted(glob.glob(os.path.join(self.directory, "snapshot-*.bin")))
+        if snapshots:
+            # Snapshots are renamed into place only once complete, so the newest one is whole
+            path, complete = snapshots[-1], False
+            for _, payload in read_frames(path):
+                event = decode_event(payload)
+                kind = event.get("e")
+                if kind == "snapshot":
+                    snapshot_lsn = event["lsn"]
+                elif kind == "end":
+                    complete = True
+                else:
+                    apply(event)
+                    snapshot_events += 1
+            if not complete:
+                raise RuntimeError(f"Chain snapshot {path} is incomplete")
+
+        segments = [
+            path for path in sorted(glob.glob(os.path.join(self.directory, "wal-*.log")))
+            if _lsn_of(path) >= snapshot_lsn
+        ]
+        lsn, replayed = snapshot_lsn, 0
+        for index, path in enumerate(segments):
+            lsn, good_offset = _lsn_of(path), 0
+            for good_offset, payload in read_frames(path):
+                apply(decode_event(payload))
+                lsn += 1
+                replayed += 1
+            if good_offset < os.path.getsize(path):
+                # Normally a crash mid-write: drop the torn tail and carry on from there
+                logger.warning(f"Truncating chain journal {path} at byte {good_offset}")
+                os.truncate(path, good_offset)
+                for later in segments[index + 1:]:
+                    logger.error(f"Setting aside chain journal segment {later} after a corrupt one")
+                    os.replace(later, f"{later}.corrupt")
+                segments = segments[:index + 1]
+                break
+
+        self.lsn = self.durable_lsn = lsn
+        self._open_segment(_lsn_of(segments[-1]) if segments else lsn)
+        stats = {
+            "snapshot_lsn": snapshot_lsn,
+            "snapshot_records": snapshot_events,
+            "replayed_events": replayed,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        logger.info(f"Chain journal recovered: {stats}")
+        return stats
+
+    def start(self):
+        """Begin group-committing in the background"""
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    def append(self, event: Dict):
+        self._buffer.append(frame(encode_event(event)))
+        self.lsn += 1
+        self.since_snapshot += 1
+        self._wakeup.set()
+
+    @property
+    def snapshot_due(self) -> bool:
+        return self.since_snapshot >= self.snapshot_every
+
+    def _write(self, frames: List[bytes]):
+        self._file.write(b"".join(frames))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.fsyncs += 1
+        self.written_events += len(frames)
+
+    def flush(self):
+        """Write and fsync everything buffered, blocking (no event loop needed)"""
+        if self._buffer:
+            frames, lsn = self._buffer, self.lsn
+            self._buffer = []
+            self._write(frames)
+            self.durable_lsn = lsn
+        self._release_waiters()
+
+    def _release_waiters(self):
+        waiting = []
+        for lsn, future in self._waiters:
+            if lsn <= self.durable_lsn:
+                if not future.done():
+                    future.set_result(None)
+            else:
+                waiting.append((lsn, future))
+        self._waiters = waiting
+
+    async def _flush_group(self):
+        async with self._io_lock:
+            if not self._buffer:
+                return
+            frames, lsn = self._buffer, self.lsn
+            self._buffer = []
+            await asyncio.get_running_loop().run_in_executor(None, self._write, frames)
+            self.durable_lsn = lsn
+            self._release_waiters()
+
+    async def _flush_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await asyncio.sleep(self.group_commit_interval)
+            try:
+                await self._flush_group()
+            except Exception as e:
+                logger.error(f"Error writing chain journal: {str(e)}")
+
+    async def sync(self):
+        """Wait until every event appended so far is on disk"""
+        if self.durable_lsn >= self.lsn:
+            return
+        if self._flusher is None:
+            self.flush()
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((self.lsn, future))
+        self._wakeup.set()
+        await future
+
+    async def snapshot(self, records: Callable[[], Iterable[Dict]]):
+        """Rotate the log and write a snapshot of every record behind it"""
+        async with self._io_lock:
+            if self._buffer:
+                frames, lsn = self._buffer, self.lsn
+                self._buffer = []
+                self._write(frames)
+                self.durable_lsn = lsn
+                self._release_waiters()
+            lsn = self.lsn
+            self._open_segment(lsn)
+        self.since_snapshot = 0
+
+        started = time.perf_counter()
+        path = self._path("snapshot", lsn, "bin")
+        count = 0
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(frame(encode_event({"e": "snapshot", "lsn": lsn})))
+            for record in records():
+                f.write(frame(encode_event(record)))
+                count += 1
+                if count % _SNAPSHOT_CHUNK == 0:
+                    await asyncio.sleep(0)
+            f.write(frame(encode_event({"e": "end", "count": count})))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+        self.snapshots += 1
+
+        # Everything before the new snapshot is now redundant
+        for old in glob.glob(os.path.join(self.directory, "snapshot-*.bin")):
+            if _lsn_of(old) < lsn:
+                os.unlink(old)
+        for old in glob.glob(os.path.join(self.directory, "wal-*.log")):
+            if _lsn_of(old) < lsn:
+                os.unlink(old)
+        logger.info(f"Chain snapshot at LSN {lsn}: {count} records in {time.perf_counter() - started:.2f}s")
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def get_metrics(self) -> Dict:
+        return {
+            "directory": self.directory,
+            "lsn": self.lsn,
+            "durable_lsn": self.durable_lsn,
+            "fsyncs": self.fsyncs,
+            "events_per_fsync": round(self.written_events / self.fsyncs, 1) if self.fsyncs else None,
+            "since_snapshot": self.since_snapshot,
+            "snapshots": self.snapshots,
+        }
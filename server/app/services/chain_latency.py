@@ -0,0 +1,131 @@
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Optional
+import asyncio
+import math
+import os
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+class LatencyModel(ABC):
+    """How long the mock chain takes to settle a transaction"""
+
+    def __init__(self):
+        self.settled = 0
+
+    @abstractmethod
+    async def wait(self):
+        """Return once a transaction submitted now would be settled"""
+
+    def get_metrics(self) -> Dict:
+        return {"model": type(self).__name__, "settled": self.settled}
+
+class ZeroLatency(LatencyModel):
+    """Settle immediately, for benchmarking the server at full speed"""
+
+    async def wait(self):
+        self.settled += 1
+
+class FixedLatency(LatencyModel):
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+
+    async def wait(self):
+        await asyncio.sleep(self.delay)
+        self.settled += 1
+
+    def get_metrics(self) -> Dict:
+        metrics = super().get_metrics()
+        metrics["delay_ms"] = self.delay * 1000
+        return metrics
+
+class SampledLatency(LatencyModel):
+    """Draw every delay from a distribution (seconds)"""
+
+    def __init__(self, sample: Callable[[], float], description: str = ""):
+        super().__init__()
+        self.sample = sample
+        self.description = description
+        self.total_delay = 0.0
+
+    async def wait(self):
+        delay = max(self.sample(), 0.0)
+        await asyncio.sleep(delay)
+        self.settled += 1
+        self.total_delay += delay
+
+    def get_metrics(self) -> Dict:
+        metrics = super().get_metrics()
+        metrics["distribution"] = self.description
+        metrics["mean_delay_ms"] = self.total_delay / self.settled * 1000 if self.settled else None
+        return metrics
+
+class BlockTimeLatency(LatencyModel):
+    """Transactions settle together at the end of the block they were submitted in.
+
+    Blocks are aligned to multiples of ``block_time`` on the loop clock. All
+    waiters of a block share one future, so they resume in submission order
+    as soon as the block closes.
+    """
+
+    def __init__(self, block_time: float):
+        super().__init__()
+        self.block_time = block_time
+        self.blocks = 0
+        self._block: Optional[asyncio.Future] = None
+        self._block_end = 0.0
+
+    def _close_block(self, block: asyncio.Future):
+        if self._block is block:
+            self._block = None
+        self.blocks += 1
+        block.set_result(None)
+
+    async def wait(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._block is None or now >= self._block_end:
+            self._block_end = (math.floor(now / self.block_time) + 1) * self.block_time
+            self._block = loop.create_future()
+            loop.call_at(self._block_end, self._close_block, self._block)
+        await asyncio.shield(self._block)
+        self.settled += 1
+
+    def get_metrics(self) -> Dict:
+        metrics = super().get_metrics()
+        metrics["block_time_ms"] = self.block_time * 1000
+        metrics["blocks"] = self.blocks
+        metrics["mean_block_size"] = self.settled / self.blocks if self.blocks else None
+        return metrics
+
+def _sampler(distribution: str, mean: float, jitter: float) -> Callable[[], float]:
+    if mean <= 0:
+        return lambda: 0.0
+    if distribution == "lognormal":
+        # `mean` is the median; `jitter` is the sigma of the underlying normal
+        mu = math.log(mean)
+        return lambda: random.lognormvariate(mu, jitter)
+    if distribution == "exponential":
+        return lambda: random.expovariate(1 / mean)
+    if distribution == "uniform":
+        # `jitter` is the spread as a fraction of `mean`
+        return lambda: random.uniform(mean * max(1 - jitter, 0.0), mean * (1 + jitter))
+    raise ValueError(f"Unknown latency distribution: {distribution}")
+
+def create_latency_model() -> LatencyModel:
+    """Build the latency model selected by CHAIN_LATENCY_MODEL"""
+    kind = os.getenv("CHAIN_LATENCY_MODEL", "fixed").lower()
+    delay = float(os.getenv("CHAIN_LATENCY_MS", "1000")) / 1000
+    if kind == "zero":
+        return ZeroLatency()
+    if kind == "fixed":
+        return FixedLatency(delay)
+    if kind == "sampled":
+        distribution = os.getenv("CHAIN_LATENCY_DISTRIBUTION", "lognormal").lower()
+        jitter = float(os.getenv("CHAIN_LATENCY_JITTER", "0.5"))
+        return SampledLatency(_sampler(distribution, delay, jitter), distribution)
+    if kind == "block":
+        return BlockTimeLatency(float(os.getenv("CHAIN_BLOCK_TIME_MS", "1000")) / 1000)
+    raise ValueError(f"Unknown chain latency model: {kind}")
@@ -0,0 +1,141 @@
+from typing import Callable, Deque, Dict, List, Optional
+from collections import deque
+import math
+import statistics
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PollScheduler:
+    """Gives every token its own refresh interval within a global request budget.
+
+    Volatile tokens and tokens with watchers (WebSocket subscribers, open
+    positions) are polled more often; quiet ones back off towards
+    ``max_interval``. If the combined refresh rate would exceed
+    ``request_budget_per_minute`` (counting ``symbols_per_request`` ids per
+    request), every interval is stretched by the same factor.
+    """
+
+    def __init__(self, symbols: List[str], base_interval: float = 60,
+                 min_interval: float = 5, max_interval: float = 300,
+                 request_budget_per_minute: float = 30,
+                 symbols_per_request: int = 100,
+                 reference_volatility: float = 0.01,
+                 history_size: int = 20,
+                 demand_provider: Optional[Callable[[], Dict[str, Dict[str, int]]]] = None):
+        self.symbols = list(symbols)
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.request_budget_per_minute = request_budget_per_minute
+        self.symbols_per_request = symbols_per_request
+        self.reference_volatility = reference_volatility
+        self.demand_provider = demand_provider
+
+        self._prices: Dict[str, Deque[float]] = {
+            symbol: deque(maxlen=history_size) for symbol in self.symbols
+        }
+        self._demand: Dict[str, Dict[str, int]] = {}
+        self._intervals: Dict[str, float] = {symbol: base_interval for symbol in self.symbols}
+        self._last_polled: Dict[str, float] = {}
+        self._last_request_at: Optional[float] = None
+
+    def record_price(self, symbol: str, price: float):
+        """Remember a fetched price for the volatility estimate"""
+        if symbol in self._prices and price:
+            self._prices[symbol].append(price)
+
+    def volatility(self, symbol: str) -> float:
+        """Standard deviation of recent tick-to-tick returns"""
+        prices = self._prices.get(symbol)
+        if not prices or len(prices) < 3:
+            return 0.0
+        values = list(prices)
+        return statistics.pstdev(b / a - 1 for a, b in zip(values, values[1:]))
+
+    def _refresh_demand(self):
+        if self.demand_provider is not None:
+            try:
+                self._demand = self.demand_provider()
+            except Exception as e:
+                logger.error(f"Error reading token demand: {str(e)}")
+
+    def compute_intervals(self) -> Dict[str, float]:
+        """Recompute every token's interval from volatility, demand and budget"""
+        self._refresh_demand()
+        intervals = {}
+        for symbol in self.symbols:
+            demand = self._demand.get(symbol, {})
+            watchers = demand.get("subscribers", 0) + demand.get("open_positions", 0)
+            score = (1 + self.volatility(symbol) / self.reference_volatility) * (1 + math.log1p(watchers))
+            intervals[symbol] = min(max(self.base_interval / score, self.min_interval), self.max_interval)
+
+        # Stretch everything proportionally if we would blow the request budget
+        refreshes_per_minute = sum(60 / interval for interval in intervals.values())
+        requests_per_minute = refreshes_per_minute / self.symbols_per_request
+        if requests_per_minute > self.request_budget_per_minute:
+            factor = requests_per_minute / self.request_budget_per_minute
+            intervals = {
+                symbol: min(interval * factor, self.max_interval)
+                for symbol, interval in intervals.items()
+            }
+
+        self._intervals = intervals
+        return intervals
+
+    def _min_request_gap(self) -> float:
+        return 60 / self.request_budget_per_minute
+
+    def due(self, now: Optional[float] = None) -> List[str]:
+        """Symbols whose interval has elapsed, or none while the budget needs a pause"""
+        now = time.monotonic() if now is None else now
+        if self._last_request_at is not None and now - self._last_request_at < self._min_request_gap():
+            return []
+        intervals = self.compute_intervals()
+        return [
+            symbol for symbol in self.symbols
+            if now - self._last_polled.get(symbol, -math.inf) >= intervals[symbol]
+        ]
+
+    def mark_polled(self, symbols: List[str], now: Optional[float] = None):
+        """Record that the given symbols were just fetched"""
+        now = time.monotonic() if now is None else now
+        for symbol in symbols:
+            self._last_polled[symbol] = now
+        requests = math.ceil(len(symbols) / self.symbols_per_request)
+        if requests:
+            # A poll of several chunks uses up several slots of the budget
+            self._last_request_at = now + (requests - 1) * self._min_request_gap()
+
+    def next_wakeup(self, now: Optional[float] = None) -> float:
+        """Seconds until the next token becomes due"""
+        now = time.monotonic() if now is None else now
+        waits = [
+            self._last_polled.get(symbol, -math.inf) + self._intervals[symbol] - now
+            for symbol in self.symbols
+        ]
+        wait = max(min(waits, default=self.base_interval), 0)
+        if self._last_request_at is not None:
+            wait = max(wait, self._last_request_at + self._min_request_gap() - now)
+        return wait
+
+    def get_interval(self, symbol: str) -> float:
+        """Current effective interval for one token"""
+        return self._intervals.get(symbol, self.base_interval)
+
+    def get_status(self) -> Dict[str, Dict]:
+        """Effective interval and inputs per token, for monitoring"""
+        now = time.monotonic()
+        return {
+            symbol: {
+                "interval": round(self._intervals[symbol], 2),
+                "volatility": self.volatility(symbol),
+                "subscribers": self._demand.get(symbol, {}).get("subscribers", 0),
+                "open_positions": self._demand.get(symbol, {}).get("open_positions", 0),
+                "next_poll_in": round(max(
+                    self._last_polled.get(symbol, -math.inf) + self._intervals[symbol] - now, 0
+                ), 2),
+            }
+            for symbol in self.symbols
+        }
@@ -0,0 +1,79 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from collections import OrderedDict
+import asyncio
+import os
+import time
+
+CLIENT_ORDER_TTL = float(os.getenv("CLIENT_ORDER_TTL_SECONDS", "600"))  # how long a retry gets the original result
+CLIENT_ORDER_CACHE_SIZE = int(os.getenv("CLIENT_ORDER_CACHE_SIZE", "100000"))  # client order ids remembered
+
+class IdempotencyCache:
+    """Bounded TTL map from an idempotency key to the first result.
+
+    Every entry lives for the same ``ttl``, so insertion order is expiry
+    order: expired entries are dropped from the front on each access and
+    the oldest goes first once ``max_size`` is reached.
+    """
+
+    def __init__(self, ttl: float = CLIENT_ORDER_TTL, max_size: int = CLIENT_ORDER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires, value)
+        self.hits = 0
+        self.misses = 0
+
+    def _expire(self, now: float):
+        while self._entries:
+            key, (expires, _) = next(iter(self._entries.items()))
+            if expires > now:
+                return
+            del self._entries[key]
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        self._expire(time.monotonic())
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        now = time.monotonic()
+        self._expire(now)
+        self._entries.pop(key, None)
+        self._entries[key] = (now + self.ttl, value)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[Any]],
+                  keep: Optional[Callable[[Any], bool]] = None) -> Any:
+        """Await `call()` once per key; duplicates share its task and result.
+
+        Duplicates arriving while the call runs share its outcome either way.
+        Afterwards only a result passing `keep` (any result by default) is
+        remembered; a call that raises or fails `keep` is forgotten, so the
+        next retry runs it again.
+        """
+        task = self.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            task.add_done_callback(lambda done: self._forget_failure(key, done, keep))
+            self.put(key, task)
+        # A cancelled caller must not cancel the call other retries wait on
+        return await asyncio.shield(task)
+
+    def _forget_failure(self, key: Hashable, task: asyncio.Future, keep: Optional[Callable[[Any], bool]]):
+        if task.cancelled() or task.exception() is not None or (keep is not None and not keep(task.result())):
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is task:
+                self.discard(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_metrics(self) -> Dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
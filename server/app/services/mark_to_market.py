@@ -0,0 +1,145 @@
+from typing import Dict, List, Tuple
+import numpy as np
+from app.services.websocket import ws_manager
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TokenPositions:
+    """Open positions on one token as columnar arrays.
+
+    Slot ``i`` of every array belongs to ``positions[i]``. Removing a position
+    moves the last one into its slot, so the arrays stay dense.
+    """
+
+    COLUMNS = ("entry_price", "size", "leverage", "direction", "liquidation_price", "pnl")
+
+    def __init__(self, capacity: int = 1024):
+        self.count = 0
+        self.positions: List[Dict] = []
+        self.slots: Dict[str, int] = {}
+        self.columns = {name: np.zeros(capacity) for name in self.COLUMNS}
+
+    def _grow(self):
+        for name, column in self.columns.items():
+            grown = np.zeros(len(column) * 2)
+            grown[:self.count] = column[:self.count]
+            self.columns[name] = grown
+
+    def _write(self, slot: int, position: Dict):
+        columns = self.columns
+        columns["entry_price"][slot] = position["entry_price"]
+        columns["size"][slot] = position["size"]
+        columns["leverage"][slot] = position["leverage"]
+        columns["direction"][slot] = -1.0 if position.get("side") == "SELL" else 1.0
+        columns["liquidation_price"][slot] = position["liquidation_price"]
+        columns["pnl"][slot] = position.get("pnl", 0)
+
+    def add(self, position: Dict):
+        if position["id"] in self.slots:
+            self.update(position)
+            return
+        if self.count == len(self.columns["pnl"]):
+            self._grow()
+        slot = self.count
+        self.slots[position["id"]] = slot
+        self.positions.append(position)
+        self._write(slot, position)
+        self.count += 1
+
+    def update(self, position: Dict):
+        """Pick up a changed size, entry or liquidation price"""
+        slot = self.slots.get(position["id"])
+        if slot is not None:
+            self._write(slot, position)
+
+    def remove(self, position_id: str):
+        slot = self.slots.pop(position_id, None)
+        if slot is None:
+            return
+        last = self.count - 1
+        if slot != last:
+            moved = self.positions[last]
+            self.positions[slot] = moved
+            self.slots[moved["id"]] = slot
+            for column in self.columns.values():
+                column[slot] = column[last]
+        self.positions.pop()
+        self.count = last
+
+    def mark(self, price: float) -> Tuple[List[Dict], List[Dict]]:
+        """Revalue every position at `price` in one pass.
+
+        Writes pnl and current_price back into the position dicts that
+        changed and returns (changed, liquidated).
+        """
+        n = self.count
+        if not n:
+            return [], []
+        c = {name: column[:n] for name, column in self.columns.items()}
+        pnl = (price - c["entry_price"]) * c["direction"] * c["size"] * c["leverage"]
+        changed = np.flatnonzero(pnl != c["pnl"])
+        c["pnl"][:] = pnl
+        liquidated = np.flatnonzero(np.where(
+            c["direction"] > 0, price <= c["liquidation_price"], price >= c["liquidation_price"]
+        ))
+
+        positions = self.positions
+        changed_positions = []
+        for slot, value in zip(changed.tolist(), pnl[changed].tolist()):
+            position = positions[slot]
+            position["pnl"] = value
+            position["current_price"] = price
+            changed_positions.append(position)
+        return changed_positions, [positions[slot] for slot in liquidated.tolist()]
+
+class MarkToMarketEngine:
+    """Keeps every open position's PnL current from price ticks, one token at a time"""
+
+    def __init__(self):
+        self.tokens: Dict[str, TokenPositions] = {}
+
+    def track(self, position: Dict):
+        book = self.tokens.get(position["token"])
+        if book is None:
+            book = self.tokens[position["token"]] = TokenPositions()
+        book.add(position)
+
+    def update(self, position: Dict):
+        book = self.tokens.get(position["token"])
+        if book is not None:
+            book.update(position)
+
+    def untrack(self, position: Dict):
+        book = self.tokens.get(position["token"])
+        if book is not None:
+            book.remove(position["id"])
+
+    def mark(self, token: str, price: float) -> Tuple[List[Dict], List[Dict]]:
+        """(changed, liquidated) positions on `token` at the new price"""
+        book = self.tokens.get(token)
+        if book is None or not price:
+            return [], []
+        return book.mark(price)
+
+def position_update(position: Dict) -> Dict:
+    """The positions-channel payload for one position"""
+    return {
+        "position_id": position["id"],
+        "token": position["token"],
+        "side": position.get("side"),
+        "size": position["size"],
+        "entry_price": position["entry_price"],
+        "current_price": position.get("current_price", position["entry_price"]),
+        "leverage": position["leverage"],
+        "pnl": position["pnl"],
+        "liquidation_price": position["liquidation_price"],
+        "status": position.get("status", "OPEN"),
+    }
+
+async def push_position_updates(positions: List[Dict]):
+    """Send each position to its owner's positions channel"""
+    for position in positions:
+        await ws_manager.send_position_update(
+            position.get("user_id", position["wallet_address"]), position_update(position)
+        )
@@ -1,6 +1,8 @@
 from typing import Dict, List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime
 import random
+from app.models.models import Token, MarketData
+from app.models.database import SessionLocal
 
 class MarketDataService:
     def __init__(self):
@@ -11,6 +13,11 @@ class MarketDataService:
             "FLOKI": {"name": "Floki", "symbol": "FLOKI"}
         }
         self._price_data = {}  # Cache for price data
+        # timeframe -> (candle interval, number of bars)
+        self._history_timeframes = {
+            "1d": ("1h", 24),
+            "1w": ("1h", 7 * 24),
+        }
         
     async def get_token_price(self, token_id: str) -> Optional[Dict]:
         """Get current price for a token"""
@@ -28,25 +35,33 @@ class MarketDataService:
     
     async def get_price_history(self, token_id: str, 
                               timeframe: str = "1d") -> List[Dict]:
-        """Get historical price data"""
+        """Get historical OHLCV bars from the candle table"""
         if token_id not in self._supported_tokens:
             return []
             
-        # Generate dummy historical data
-        history = []
-        base_price = random.uniform(0.0001, 1.0)
-        intervals = 24 if timeframe == "1d" else 7 * 24  # 1d or 1w
+        interval, bars = self._history_timeframes.get(timeframe, ("1h", 24))
         
-        for i in range(intervals):
-            timestamp = datetime.now() - timedelta(hours=i)
-            price = base_price * (1 + random.uniform(-0.1, 0.1))
-            history.append({
-                "timestamp": timestamp.isoformat(),
-                "price": price,
-                "volume": random.uniform(10000, 100000)
-            })
+        db = SessionLocal()
+        try:
+            candles = (db.query(MarketData)
+                      .join(Token, Token.id == MarketData.token_id)
+                      .filter(Token.symbol == token_id)
+                      .filter(MarketData.interval == interval)
+                      .order_by(MarketData.timestamp.desc())
+                      .limit(bars)
+                      .all())
+        finally:
+            db.close()
             
-        return sorted(history, key=lambda x: x["timestamp"])
+        return [{
+            "timestamp": candle.timestamp.isoformat(),
+            "price": candle.close,
+            "open": candle.open,
+            "high": candle.high,
+            "low": candle.low,
+            "close": candle.close,
+            "volume": candle.volume
+        } for candle in reversed(candles)]
     
     async def get_market_summary(self) -> Dict:
         """Get overall market summary"""
@@ -1,18 +1,185 @@
-from typing import Dict, Optional
+from typing import Dict, List, Optional
+from collections import defaultdict
 import asyncio
 import random
 from datetime import datetime
+from app.services.chain_journal import JOURNAL_DIR, ChainJournal
+from app.services.chain_latency import LatencyModel, create_latency_model
+from app.services.idempotency import IdempotencyCache
+from app.services.mark_to_market import MarkToMarketEngine
+from app.services.triggers import STOP_LOSS, TAKE_PROFIT, TriggerEngine
+from app.services.order_book import EPSILON, Fill, MatchingEngine, Order
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Simulated market maker quoting around the last price of each token
+MARKET_MAKER = "market_maker"
+LIQUIDITY_LEVELS = 10  # price levels per side
+LIQUIDITY_HALF_SPREAD = 0.001  # best bid/ask 0.1% from the reference price
+LIQUIDITY_LEVEL_STEP = 0.0005  # each further level another 0.05% away
+LIQUIDITY_LEVEL_NOTIONAL = 10000.0  # USDT quoted per level
+
+def _seq_of(record_id: str) -> int:
+    return int(record_id.split("_")[1])
+
 class MockChainService:
-    def __init__(self):
+    def __init__(self, latency: Optional[LatencyModel] = None):
         self.connected_wallets: Dict[str, Dict] = {}
         self.orders: Dict[str, Dict] = {}
         self.positions: Dict[str, Dict] = {}
         self.balances: Dict[str, Dict[str, float]] = {}
-        
+        self.matching_engine = MatchingEngine()
+        self.reference_prices: Dict[str, float] = {}
+        self._maker_orders: Dict[str, List[str]] = {}
+        self._maker_seq = 0
+        # Last order/position number handed out; ids never reuse one
+        self._order_seq = 0
+        self._position_seq = 0
+        # (wallet, client_order_id) -> order id, so retries get the original order
+        self._client_orders = IdempotencyCache()
+        # Time to settle a transaction (CHAIN_LATENCY_MODEL)
+        self.latency = latency or create_latency_model()
+        self._settlements: Dict[str, asyncio.Task] = {}
+        # Indexes so per-user and per-token lookups don't scan everything
+        self._wallet_positions: Dict[str, Dict[str, Dict]] = defaultdict(dict)
+        self._wallet_orders: Dict[str, Dict[str, Dict]] = defaultdict(dict)
+        self._token_open_positions: Dict[str, Dict[str, Dict]] = defaultdict(dict)
+        # Columnar copy of open positions for vectorized PnL on price ticks
+        self.mark_engine = MarkToMarketEngine()
+        # Price-indexed stop-loss / take-profit triggers
+        self.trigger_engine = TriggerEngine()
+        # Positions the chain closed by itself (liquidations, stops, take-profits),
+        # for the trading service to settle
+        self._closed_by_chain: List[Dict] = []
+        # Write-ahead log of every state change; None until start()
+        self.journal: Optional[ChainJournal] = None
+        self._snapshot_task: Optional[asyncio.Task] = None
+
+    async def start(self, directory: str = JOURNAL_DIR) -> Optional[Dict]:
+        """Restore state from the journal in `directory` and keep journaling to it.
+
+        Returns the recovery stats, or None when journaling is disabled or
+        another process already owns the directory.
+        """
+        if not directory or self.journal is not None:
+            return None
+        journal = ChainJournal(directory)
+        try:
+            journal.lock()
+        except RuntimeError as e:
+            logger.warning(f"{str(e)}; mock chain state will not be persisted")
+            return None
+        stats = journal.recover(self._apply_event)
+        self.journal = journal
+        self._rebuild_indexes()
+        journal.start()
+        return stats
+
+    async def stop(self):
+        """Flush the journal and release it"""
+        if self.journal is None:
+            return
+        if self._snapshot_task is not None:
+            await self._snapshot_task
+        await self.journal.close()
+        self.journal = None
+
+    def _log(self, event: Dict):
+        if self.journal is None:
+            return
+        self.journal.append(event)
+        if self.journal.snapshot_due and self._snapshot_task is None:
+            self._snapshot_task = asyncio.create_task(self._snapshot())
+
+    def _log_order(self, order: Dict):
+        self._log({"e": "order", "order": order})
+
+    def _log_position(self, position: Dict):
+        self._log({"e": "position", "position": position})
+
+    def _log_balances(self, wallet_address: str):
+        self._log({"e": "balances", "address": wallet_address, "balances": self.balances.get(wallet_address, {})})
+
+    async def _commit(self):
+        """Wait until the changes made so far are durable"""
+        if self.journal is not None:
+            await self.journal.sync()
+
+    async def _snapshot(self):
+        try:
+            await self.journal.snapshot(self._snapshot_records)
+        except Exception as e:
+            logger.error(f"Error writing chain snapshot: {str(e)}")
+        finally:
+            self._snapshot_task = None
+
+    def _snapshot_records(self):
+        """Every wallet, order and position as journal events"""
+        # Copy the containers: the snapshot yields to the event loop between chunks
+        for address, wallet in list(self.connected_wallets.items()):
+            yield {"e": "wallet", "address": address, "wallet": wallet}
+        for address, balances in list(self.balances.items()):
+            yield {"e": "balances", "address": address, "balances": balances}
+        for order in list(self.orders.values()):
+            yield {"e": "order", "order": order}
+        for position in list(self.positions.values()):
+            yield {"e": "position", "position": position}
+
+    def _apply_event(self, event: Dict):
+        """Replay one journal event onto the raw state (indexes are rebuilt afterwards)"""
+        kind = event["e"]
+        if kind == "order":
+            self.orders[event["order"]["id"]] = event["order"]
+        elif kind == "position":
+            self.positions[event["position"]["id"]] = event["position"]
+        elif kind == "balances":
+            self.balances[event["address"]] = event["balances"]
+        elif kind == "wallet":
+            self.connected_wallets[event["address"]] = event["wallet"]
+        elif kind == "wallet_disconnect":
+            self.connected_wallets.pop(event["address"], None)
+        else:
+            logger.warning(f"Unknown chain journal event: {kind}")
+
+    def _rebuild_indexes(self):
+        """Derive indexes, PnL columns, triggers and resting orders from recovered state"""
+        self._wallet_positions.clear()
+        self._wallet_orders.clear()
+        self._token_open_positions.clear()
+        self.mark_engine = MarkToMarketEngine()
+        self.trigger_engine = TriggerEngine()
+        self.matching_engine = MatchingEngine()
+        self._client_orders = IdempotencyCache()
+        self._order_seq = max((_seq_of(order_id) for order_id in self.orders), default=0)
+        self._position_seq = max((_seq_of(position_id) for position_id in self.positions), default=0)
+
+        for position_id, position in self.positions.items():
+            self._wallet_positions[position["wallet_address"]][position_id] = position
+            if position.get("status") in ("CLOSED", "LIQUIDATED"):
+                continue
+            self._token_open_positions[position["token"]][position_id] = position
+            self.mark_engine.track(position)
+            for kind, field in ((STOP_LOSS, "stop_loss"), (TAKE_PROFIT, "take_profit")):
+                if position.get(field):
+                    self.trigger_engine.arm(position, kind, position[field])
+
+        # Re-rest limit orders in submission order to keep time priority
+        for order in sorted(self.orders.values(), key=lambda order: _seq_of(order["id"])):
+            self._wallet_orders[order["wallet_address"]][order["id"]] = order
+            if order.get("client_order_id"):
+                self._client_orders.put((order["wallet_address"], order["client_order_id"]), order["id"])
+            if order["status"] == "PENDING":
+                # It never reached the book, and nobody is waiting for it any more
+                order["status"] = "FAILED"
+                order["error"] = "Interrupted by restart"
+                self._log_order(order)
+            elif order["type"] == "LIMIT" and order["status"] in ("OPEN", "PARTIALLY_FILLED"):
+                self.matching_engine.book(order["token"]).restore(
+                    order["id"], order["side"], order["price"], order["size"],
+                    order["size"] - order["filled_size"], order["wallet_address"]
+                )
+
     async def connect_wallet(self, wallet_address: str) -> Dict:
         """Simulate wallet connection"""
         if wallet_address not in self.connected_wallets:
@@ -28,12 +195,17 @@ class MockChainService:
                 "PEPE": 1000000.0,
                 "DOGE": 10000.0
             }
+            self._log({"e": "wallet", "address": wallet_address, "wallet": self.connected_wallets[wallet_address]})
+            self._log_balances(wallet_address)
+            await self._commit()
         return self.connected_wallets[wallet_address]
     
     async def disconnect_wallet(self, wallet_address: str) -> bool:
         """Simulate wallet disconnection"""
         if wallet_address in self.connected_wallets:
             del self.connected_wallets[wallet_address]
+            self._log({"e": "wallet_disconnect", "address": wallet_address})
+            await self._commit()
             return True
         return False
     
@@ -43,60 +215,352 @@ class MockChainService:
             return 0.0
         return self.balances[wallet_address].get(token, 0.0)
     
-    async def place_order(self, wallet_address: str, order_data: Dict) -> Dict:
-        """Simulate placing an order on chain"""
-        order_id = f"order_{len(self.orders) + 1}"
+    def _liquidation_price(self, side: str, entry_price: float) -> float:
+        return entry_price * (0.8 if side == "BUY" else 1.2)
+
+    def _quote_liquidity(self, token: str, reference_price: float):
+        """Replace the market maker's ladder of quotes around the reference price"""
+        book = self.matching_engine.book(token)
+        for order_id in self._maker_orders.pop(token, []):
+            book.cancel(order_id)
+
+        size = LIQUIDITY_LEVEL_NOTIONAL / reference_price
+        order_ids = []
+        for i in range(LIQUIDITY_LEVELS):
+            offset = LIQUIDITY_HALF_SPREAD + i * LIQUIDITY_LEVEL_STEP
+            for side, price in (("BUY", reference_price * (1 - offset)), ("SELL", reference_price * (1 + offset))):
+                self._maker_seq += 1
+                order_id = f"mm_{self._maker_seq}"
+                order, fills = book.limit(order_id, side, float(f"{price:.8g}"), size, MARKET_MAKER)
+                self._apply_fills(fills)
+                if order.remaining > EPSILON:
+                    order_ids.append(order_id)
+        self._maker_orders[token] = order_ids
+
+    def update_market(self, token: str, price: float):
+        """Re-centre the simulated liquidity on a fresh market price"""
+        if price and price > 0:
+            self.reference_prices[token] = price
+            self._quote_liquidity(token, price)
+
+    def _apply_fills(self, fills: List[Fill]):
+        """Settle fills for every user order involved (the market maker has no account)"""
+        for fill in fills:
+            for book_order in (fill.maker, fill.taker):
+                order = self.orders.get(book_order.id)
+                if order is not None:
+                    self._apply_fill(order, fill.price, fill.size)
+                    self._sync_status(order, book_order)
+                    self._log_order(order)
+
+    def _apply_fill(self, order: Dict, price: float, size: float):
+        """Move balances and grow the order's position by one fill"""
+        wallet_address = order["wallet_address"]
+        token = order["token"]
+        filled = order["filled_size"] + size
+        order["avg_fill_price"] = (order["avg_fill_price"] * order["filled_size"] + price * size) / filled
+        order["filled_size"] = filled
+
+        balances = self.balances.setdefault(wallet_address, {})
+        cost = size * price
+        if order["side"] == "BUY":
+            balances["USDT"] = balances.get("USDT", 0.0) - cost
+            balances[token] = balances.get(token, 0.0) + size
+        else:
+            balances["USDT"] = balances.get("USDT", 0.0) + cost
+            balances[token] = balances.get(token, 0.0) - size
+
+        position_id = order.get("position_id")
+        if position_id is None:
+            position = self._open_position(
+                wallet_address, token, order["side"], filled, order["avg_fill_price"], order["leverage"],
+                order.get("user_id")
+            )
+            order["position_id"] = position["id"]
+            self._arm_triggers(position, order.get("stop_loss"), order.get("take_profit"))
+        else:
+            position = self.positions[position_id]
+            position["size"] = filled
+            position["entry_price"] = order["avg_fill_price"]
+            position["liquidation_price"] = self._liquidation_price(order["side"], order["avg_fill_price"])
+            self.mark_engine.update(position)
+        self._log_position(position)
+        self._log_balances(wallet_address)
+
+    def _open_position(self, wallet_address: str, token: str, side: str, size: float,
+                       entry_price: float, leverage: float, user_id: Optional[str] = None) -> Dict:
+        """Create a position and add it to the wallet and token indexes"""
+        self._position_seq += 1
+        position_id = f"pos_{self._position_seq}"
+        position = {
+            "id": position_id,
+            "wallet_address": wallet_address,
+            "user_id": user_id or wallet_address,
+            "token": token,
+            "side": side,
+            "size": size,
+            "entry_price": entry_price,
+            "leverage": leverage,
+            "liquidation_price": self._liquidation_price(side, entry_price),
+            "pnl": 0,
+            "timestamp": datetime.utcnow()
+        }
+        self.positions[position_id] = position
+        self._wallet_positions[wallet_address][position_id] = position
+        self._token_open_positions[token][position_id] = position
+        self.mark_engine.track(position)
+        return position
+
+    def _retire_position(self, position: Dict, status: str):
+        """Mark a position closed or liquidated and drop it from the open index"""
+        position["status"] = status
+        position["closed_at"] = datetime.utcnow()
+        self._token_open_positions[position["token"]].pop(position["id"], None)
+        self.mark_engine.untrack(position)
+        self.trigger_engine.disarm(position["id"])
+        self._log_position(position)
+
+    def mark_to_market(self, token: str, price: float) -> List[Dict]:
+        """Revalue every open position on `token` and liquidate the ones past their price.
+
+        Returns the positions whose PnL or status changed.
+        """
+        changed, liquidated = self.mark_engine.mark(token, price)
+        for position in liquidated:
+            position["final_pnl"] = -position["size"] * position["entry_price"]  # Total loss
+            position["current_price"] = price
+            self._retire_position(position, "LIQUIDATED")
+        self._closed_by_chain.extend(liquidated)
+        if liquidated:
+            logger.info(f"Liquidated {len(liquidated)} {token} positions at {price}")
+            seen = {position["id"] for position in changed}
+            changed.extend(position for position in liquidated if position["id"] not in seen)
+        return changed
+
+    def _arm_triggers(self, position: Dict, stop_loss: Optional[float], take_profit: Optional[float]):
+        for kind, field, price in ((STOP_LOSS, "stop_loss", stop_loss), (TAKE_PROFIT, "take_profit", take_profit)):
+            if price:
+                self.trigger_engine.arm(position, kind, price)
+                position[field] = price
+
+    async def set_triggers(self, wallet_address: str, position_id: str,
+                           stop_loss: Optional[float] = None, take_profit: Optional[float] = None) -> Dict:
+        """Set or replace a position's stop-loss and/or take-profit price"""
+        if position_id not in self.positions:
+            raise ValueError("Position not found")
+        
+        position = self.positions[position_id]
+        if position["wallet_address"] != wallet_address:
+            raise ValueError("Unauthorized")
+        if position.get("status") in ("CLOSED", "LIQUIDATED"):
+            raise ValueError(f"Position already {position['status'].lower()}")
+        
+        # A trigger already past the mark would fire on the next tick
+        mark = position.get("current_price") or self.reference_prices.get(position["token"]) or position["entry_price"]
+        long = position.get("side") != "SELL"
+        if stop_loss and (stop_loss >= mark if long else stop_loss <= mark):
+            raise ValueError(f"Stop-loss must be {'below' if long else 'above'} the current price {mark}")
+        if take_profit and (take_profit <= mark if long else take_profit >= mark):
+            raise ValueError(f"Take-profit must be {'above' if long else 'below'} the current price {mark}")
+        
+        self._arm_triggers(position, stop_loss, take_profit)
+        self._log_position(position)
+        await self._commit()
+        return position
+
+    async def restore_triggers(self, position_id: str, stop_loss: Optional[float], take_profit: Optional[float]):
+        """Put back triggers replaced by set_triggers; None disarms that kind"""
+        position = self.positions[position_id]
+        if position.get("status") in ("CLOSED", "LIQUIDATED"):
+            return
+        for kind, field, price in ((STOP_LOSS, "stop_loss", stop_loss), (TAKE_PROFIT, "take_profit", take_profit)):
+            if price:
+                self.trigger_engine.arm(position, kind, price)
+            else:
+                self.trigger_engine.disarm(position_id, kind)
+            position[field] = price
+        self._log_position(position)
+        await self._commit()
+
+    def _close_at_price(self, position: Dict, price: float, reason: str):
+        """Close a position at a given market price"""
+        direction = -1 if position.get("side") == "SELL" else 1
+        pnl = (price - position["entry_price"]) * direction * position["size"] * position["leverage"]
+        balances = self.balances.setdefault(position["wallet_address"], {})
+        balances["USDT"] = balances.get("USDT", 0.0) + position["size"] * position["entry_price"] + pnl
+        position["pnl"] = pnl
+        position["final_pnl"] = pnl
+        position["current_price"] = price
+        position["close_reason"] = reason
+        self._retire_position(position, "CLOSED")
+        self._log_balances(position["wallet_address"])
+
+    def run_triggers(self, token: str, price: float, tick_received: float) -> List[Dict]:
+        """Execute the stop-loss/take-profit triggers this tick crossed.
+
+        `tick_received` is the perf_counter time the tick arrived, for the
+        tick-to-trigger latency metric. Returns the closed positions.
+        """
+        closed = []
+        for trigger in self.trigger_engine.crossed(token, price):
+            position = self.positions.get(trigger.position_id)
+            if position is None or position.get("status") in ("CLOSED", "LIQUIDATED"):
+                continue
+            self._close_at_price(position, price, trigger.kind)
+            self.trigger_engine.record_latency(tick_received)
+            closed.append(position)
+        if closed:
+            logger.info(f"Triggered {len(closed)} {token} stop-loss/take-profit orders at {price}")
+            self._closed_by_chain.extend(closed)
+        return closed
+
+    def report_closed(self, positions: List[Dict]):
+        """Hand closed positions whose trades failed to save back for settlement"""
+        self._closed_by_chain.extend(positions)
+
+    def drain_closed_by_chain(self) -> List[Dict]:
+        """Take the positions the chain closed by itself since the last call"""
+        positions, self._closed_by_chain = self._closed_by_chain, []
+        return positions
+
+    def open_positions_for_token(self, token: str) -> Dict[str, Dict]:
+        """Open positions on one token, without scanning everyone else's"""
+        return self._token_open_positions.get(token, {})
+
+    def _sync_status(self, order: Dict, book_order: Order):
+        if book_order.cancelled:
+            order["status"] = "CANCELLED"
+        elif book_order.remaining <= EPSILON:
+            order["status"] = "FILLED"
+        elif order["filled_size"] > 0:
+            order["status"] = "PARTIALLY_FILLED"
+        else:
+            order["status"] = "OPEN"
+
+    async def submit_order(self, wallet_address: str, order_data: Dict) -> Dict:
+        """Send an order to the chain and return it PENDING without waiting.
+
+        The order settles in the background once the latency model lets it
+        through; use wait_for_order to get the settled record. ``type`` is
+        "MARKET" (the default; unfilled size is dropped) or "LIMIT" (the rest
+        stays on the book at ``price``). A market order's ``price`` is the
+        reference price used to quote liquidity before the first feed tick.
+
+        With a ``client_order_id``, a retry from the same wallet returns the
+        original order (settled or still pending) instead of placing another,
+        unless that order FAILED without filling anything.
+        """
+        client_order_id = order_data.get("client_order_id")
+        if client_order_id:
+            existing = self._client_orders.get((wallet_address, client_order_id))
+            if existing is not None and self.orders[existing]["status"] != "FAILED":
+                order = self.orders[existing]
+                for field in ("token", "side", "size"):
+                    if order[field] != order_data[field]:
+                        raise ValueError(f"client_order_id {client_order_id} was used for a different order")
+                return order
+
+        self._order_seq += 1
+        order_id = f"order_{self._order_seq}"
         order = {
             "id": order_id,
+            "client_order_id": client_order_id,
             "wallet_address": wallet_address,
+            "user_id": order_data.get("user_id", wallet_address),
             "token": order_data["token"],
+            "type": order_data.get("type", "MARKET").upper(),
             "side": order_data["side"],
             "size": order_data["size"],
             "price": order_data["price"],
             "leverage": order_data.get("leverage", 1),
+            "stop_loss": order_data.get("stop_loss"),
+            "take_profit": order_data.get("take_profit"),
             "status": "PENDING",
+            "filled_size": 0.0,
+            "avg_fill_price": 0.0,
             "timestamp": datetime.utcnow(),
         }
-        
-        # Simulate order processing delay
-        await asyncio.sleep(1)
-        
-        # Random success/failure
-        if random.random() > 0.1:  # 90% success rate
-            order["status"] = "FILLED"
-            # Update balances
-            token = order_data["token"]
-            size = order_data["size"]
-            price = order_data["price"]
-            cost = size * price
+        self.orders[order_id] = order
+        self._wallet_orders[wallet_address][order_id] = order
+        if client_order_id:
+            self._client_orders.put((wallet_address, client_order_id), order_id)
+        self._log_order(order)
+        self._settlements[order_id] = asyncio.create_task(self._settle_order(order))
+        await self._commit()
+        return order
+
+    async def _settle_order(self, order: Dict):
+        """Wait for the chain, then match the order on its token's book"""
+        try:
+            await self.latency.wait()
+            
+            token = order["token"]
+            if token not in self.reference_prices and order["price"]:
+                self.update_market(token, order["price"])
             
-            if order_data["side"] == "BUY":
-                self.balances[wallet_address]["USDT"] -= cost
-                self.balances[wallet_address][token] += size
+            book = self.matching_engine.book(token)
+            if order["type"] == "LIMIT":
+                book_order, fills = book.limit(
+                    order["id"], order["side"], order["price"], order["size"], order["wallet_address"]
+                )
             else:
-                self.balances[wallet_address]["USDT"] += cost
-                self.balances[wallet_address][token] -= size
-                
-            # Create position
-            position_id = f"pos_{len(self.positions) + 1}"
-            self.positions[position_id] = {
-                "id": position_id,
-                "wallet_address": wallet_address,
-                "token": token,
-                "size": size,
-                "entry_price": price,
-                "leverage": order_data.get("leverage", 1),
-                "liquidation_price": price * (0.8 if order_data["side"] == "BUY" else 1.2),
-                "pnl": 0,
-                "timestamp": datetime.utcnow()
-            }
-            order["position_id"] = position_id
-        else:
-            order["status"] = "FAILED"
-            order["error"] = "Insufficient liquidity"
+                book_order, fills = book.market(
+                    order["id"], order["side"], order["size"], order["wallet_address"]
+                )
+            self._apply_fills(fills)
+            self._sync_status(order, book_order)
             
-        self.orders[order_id] = order
+            if order["type"] != "LIMIT" and book_order.remaining > EPSILON:
+                order["unfilled_size"] = book_order.remaining
+                if not fills:
+                    order["status"] = "FAILED"
+                    order["error"] = "Insufficient liquidity"
+        except Exception as e:
+            logger.error(f"Error settling order {order['id']}: {str(e)}")
+            order["status"] = "FAILED"
+            order["error"] = str(e)
+        finally:
+            self._log_order(order)
+            self._settlements.pop(order["id"], None)
+
+    async def wait_for_order(self, order_id: str) -> Dict:
+        """Wait until a submitted order has settled"""
+        settlement = self._settlements.get(order_id)
+        if settlement is not None:
+            # A cancelled request must not cancel the settlement itself
+            await asyncio.shield(settlement)
+        await self._commit()
+        return self.orders[order_id]
+
+    def forget_client_order(self, wallet_address: str, client_order_id: str):
+        """Let a retry with this client_order_id place a new order"""
+        self._client_orders.discard((wallet_address, client_order_id))
+
+    async def place_order(self, wallet_address: str, order_data: Dict) -> Dict:
+        """Submit an order and wait for it to settle"""
+        order = await self.submit_order(wallet_address, order_data)
+        return await self.wait_for_order(order["id"])
+
+    async def cancel_order(self, wallet_address: str, order_id: str) -> Dict:
+        """Take a resting limit order off the book"""
+        if order_id not in self.orders:
+            raise ValueError("Order not found")
+        
+        order = self.orders[order_id]
+        if order["wallet_address"] != wallet_address:
+            raise ValueError("Unauthorized")
+        
+        book_order = self.matching_engine.cancel(order["token"], order_id)
+        if book_order is None:
+            raise ValueError(f"Order is {order['status']}")
+        self._sync_status(order, book_order)
+        self._log_order(order)
+        await self._commit()
         return order
+
+    async def get_order_book(self, token: str, levels: int = 10) -> Dict:
+        """Aggregated depth of a token's order book"""
+        return self.matching_engine.book(token).depth(levels)
     
     async def close_position(self, wallet_address: str, position_id: str) -> Dict:
         """Simulate closing a position"""
@@ -106,9 +570,13 @@ class MockChainService:
         position = self.positions[position_id]
         if position["wallet_address"] != wallet_address:
             raise ValueError("Unauthorized")
+        if position.get("status") in ("CLOSED", "LIQUIDATED"):
+            raise ValueError(f"Position already {position['status'].lower()}")
             
-        # Simulate processing delay
-        await asyncio.sleep(1)
+        await self.latency.wait()
+        # A trigger or liquidation may have closed it while the chain settled
+        if position.get("status") in ("CLOSED", "LIQUIDATED"):
+            raise ValueError(f"Position already {position['status'].lower()}")
         
         # Calculate PnL (random for simulation)
         pnl = random.uniform(-0.1, 0.2) * position["size"] * position["entry_price"]
@@ -117,25 +585,23 @@ class MockChainService:
         self.balances[wallet_address]["USDT"] += position["size"] * position["entry_price"] + pnl
         
         # Mark position as closed
-        position["closed_at"] = datetime.utcnow()
         position["final_pnl"] = pnl
-        position["status"] = "CLOSED"
+        self._retire_position(position, "CLOSED")
+        self._log_balances(wallet_address)
+        await self._commit()
         
         return position
     
     async def get_positions(self, wallet_address: str) -> Dict[str, Dict]:
         """Get all positions for a wallet"""
         return {
-            pos_id: pos for pos_id, pos in self.positions.items()
-            if pos["wallet_address"] == wallet_address and pos.get("status") != "CLOSED"
+            pos_id: pos for pos_id, pos in self._wallet_positions.get(wallet_address, {}).items()
+            if pos.get("status") not in ("CLOSED", "LIQUIDATED")
         }
     
     async def get_orders(self, wallet_address: str) -> Dict[str, Dict]:
         """Get all orders for a wallet"""
-        return {
-            order_id: order for order_id, order in self.orders.items()
-            if order["wallet_address"] == wallet_address
-        }
+        return dict(self._wallet_orders.get(wallet_address, {}))
     
     async def update_position_pnl(self, position_id: str, current_price: float) -> Optional[Dict]:
         """Update position PnL based on current price"""
@@ -143,7 +609,7 @@ class MockChainService:
             return None
             
         position = self.positions[position_id]
-        if position.get("status") == "CLOSED":
+        if position.get("status") in ("CLOSED", "LIQUIDATED"):
             return position
             
         entry_price = position["entry_price"]
@@ -151,15 +617,19 @@ class MockChainService:
         leverage = position["leverage"]
         
         # Calculate PnL
+        direction = -1 if position.get("side") == "SELL" else 1
         price_diff = current_price - entry_price
-        pnl = price_diff * size * leverage
+        pnl = price_diff * direction * size * leverage
         position["pnl"] = pnl
+        position["current_price"] = current_price
+        self.mark_engine.update(position)
         
         # Check liquidation
-        if current_price <= position["liquidation_price"]:
-            position["status"] = "LIQUIDATED"
+        if (current_price <= position["liquidation_price"] if direction > 0
+                else current_price >= position["liquidation_price"]):
             position["final_pnl"] = -size * entry_price  # Total loss
-            position["closed_at"] = datetime.utcnow()
+            self._retire_position(position, "LIQUIDATED")
+            self._closed_by_chain.append(position)
             
         return position
 
@@ -0,0 +1,227 @@
+from typing import Deque, Dict, List, Optional, Tuple
+from collections import deque
+import heapq
+import logging
+
+logger = logging.getLogger(__name__)
+
+BUY = "BUY"
+SELL = "SELL"
+EPSILON = 1e-12  # sizes below this count as filled (float rounding dust)
+
+class Order:
+    """A resting or incoming order; `remaining` is the size not yet filled"""
+
+    __slots__ = ("id", "owner", "side", "price", "size", "remaining", "cancelled")
+
+    def __init__(self, order_id: str, owner: Optional[str], side: str,
+                 price: Optional[float], size: float):
+        self.id = order_id
+        self.owner = owner
+        self.side = side
+        self.price = price
+        self.size = size
+        self.remaining = size
+        self.cancelled = False
+
+class Fill:
+    __slots__ = ("maker", "taker", "price", "size")
+
+    def __init__(self, maker: Order, taker: Order, price: float, size: float):
+        self.maker = maker
+        self.taker = taker
+        self.price = price
+        self.size = size
+
+    def to_dict(self) -> Dict:
+        return {
+            "maker_order_id": self.maker.id,
+            "taker_order_id": self.taker.id,
+            "maker": self.maker.owner,
+            "taker": self.taker.owner,
+            "price": self.price,
+            "size": self.size,
+        }
+
+class PriceLevel:
+    """FIFO queue of orders at one price. Cancelled orders are skipped lazily."""
+
+    __slots__ = ("price", "orders", "size", "count")
+
+    def __init__(self, price: float):
+        self.price = price
+        self.orders: Deque[Order] = deque()
+        self.size = 0.0
+        self.count = 0
+
+class _BookSide:
+    """Price levels of one side with the best price always at the top of a heap.
+
+    Bids are stored negated so both sides use a min-heap. A level is pushed
+    once when created; emptied levels are popped from the heap when they
+    reach the top, so the best price is always ``heap[0]``.
+    """
+
+    __slots__ = ("sign", "levels", "heap", "in_heap")
+
+    def __init__(self, side: str):
+        self.sign = -1 if side == BUY else 1
+        self.levels: Dict[float, PriceLevel] = {}
+        self.heap: List[float] = []
+        self.in_heap = set()
+
+    def best(self) -> Optional[PriceLevel]:
+        if not self.heap:
+            return None
+        return self.levels[self.heap[0] * self.sign]
+
+    def level_for(self, price: float) -> PriceLevel:
+        level = self.levels.get(price)
+        if level is None:
+            level = self.levels[price] = PriceLevel(price)
+            if price not in self.in_heap:
+                heapq.heappush(self.heap, price * self.sign)
+                self.in_heap.add(price)
+        return level
+
+    def remove(self, level: PriceLevel):
+        del self.levels[level.price]
+        heap = self.heap
+        while heap and heap[0] * self.sign not in self.levels:
+            self.in_heap.discard(heapq.heappop(heap) * self.sign)
+
+class OrderBook:
+    """Central limit order book for one token with price-time priority.
+
+    Best bid/ask are O(1); adding a new price level or removing an emptied
+    one is O(log n) in the number of levels. Cancels are O(1): the order is
+    flagged and its size taken off the level, and the matcher drops it when
+    it reaches the front of the queue.
+    """
+
+    def __init__(self, token: str):
+        self.token = token
+        self.bids = _BookSide(BUY)
+        self.asks = _BookSide(SELL)
+        self.orders: Dict[str, Order] = {}
+        self.last_price: Optional[float] = None
+
+    def best_bid(self) -> Optional[float]:
+        level = self.bids.best()
+        return level.price if level else None
+
+    def best_ask(self) -> Optional[float]:
+        level = self.asks.best()
+        return level.price if level else None
+
+    def _match(self, taker: Order, limit: Optional[float]) -> List[Fill]:
+        """Fill `taker` against the opposite side up to `limit` (None = any price)"""
+        fills = []
+        if taker.side == BUY:
+            book, crosses = self.asks, (lambda price: limit is None or price <= limit)
+        else:
+            book, crosses = self.bids, (lambda price: limit is None or price >= limit)
+
+        while taker.remaining > EPSILON:
+            level = book.best()
+            if level is None or not crosses(level.price):
+                break
+            queue = level.orders
+            while queue and taker.remaining > EPSILON:
+                maker = queue[0]
+                if maker.cancelled:
+                    queue.popleft()
+                    continue
+                size = min(maker.remaining, taker.remaining)
+                maker.remaining -= size
+                taker.remaining -= size
+                level.size -= size
+                fills.append(Fill(maker, taker, level.price, size))
+                if maker.remaining <= EPSILON:
+                    queue.popleft()
+                    level.count -= 1
+                    del self.orders[maker.id]
+            if level.count <= 0:
+                book.remove(level)
+
+        if fills:
+            self.last_price = fills[-1].price
+        return fills
+
+    def _rest(self, order: Order):
+        book = self.bids if order.side == BUY else self.asks
+        level = book.level_for(order.price)
+        level.orders.append(order)
+        level.size += order.remaining
+        level.count += 1
+        self.orders[order.id] = order
+
+    def limit(self, order_id: str, side: str, price: float, size: float,
+              owner: Optional[str] = None) -> Tuple[Order, List[Fill]]:
+        """Match a limit order, then rest whatever is left at its price"""
+        if order_id in self.orders:
+            raise ValueError(f"Duplicate order id {order_id}")
+        order = Order(order_id, owner, side, price, size)
+        fills = self._match(order, price)
+        if order.remaining > EPSILON:
+            self._rest(order)
+        return order, fills
+
+    def restore(self, order_id: str, side: str, price: float, size: float, remaining: float,
+                owner: Optional[str] = None) -> Order:
+        """Put a previously resting order back on the book without matching it"""
+        order = Order(order_id, owner, side, price, size)
+        order.remaining = remaining
+        self._rest(order)
+        return order
+
+    def market(self, order_id: str, side: str, size: float,
+               owner: Optional[str] = None) -> Tuple[Order, List[Fill]]:
+        """Match against the book at any price; the unfilled rest is dropped"""
+        order = Order(order_id, owner, side, None, size)
+        return order, self._match(order, None)
+
+    def cancel(self, order_id: str) -> Optional[Order]:
+        """Take a resting order off the book"""
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return None
+        book = self.bids if order.side == BUY else self.asks
+        level = book.levels[order.price]
+        level.size -= order.remaining
+        level.count -= 1
+        order.cancelled = True
+        if level.count <= 0:
+            book.remove(level)
+        return order
+
+    def depth(self, levels: int = 10) -> Dict:
+        """Aggregated size at the best `levels` prices of each side"""
+        def side_depth(book: _BookSide, reverse: bool):
+            prices = heapq.nsmallest(levels, book.levels) if not reverse else heapq.nlargest(levels, book.levels)
+            return [
+                {"price": price, "size": book.levels[price].size, "orders": book.levels[price].count}
+                for price in prices
+            ]
+        return {
+            "token": self.token,
+            "bids": side_depth(self.bids, reverse=True),
+            "asks": side_depth(self.asks, reverse=False),
+            "last_price": self.last_price,
+        }
+
+class MatchingEngine:
+    """One order book per token"""
+
+    def __init__(self):
+        self.books: Dict[str, OrderBook] = {}
+
+    def book(self, token: str) -> OrderBook:
+        book = self.books.get(token)
+        if book is None:
+            book = self.books[token] = OrderBook(token)
+        return book
+
+    def cancel(self, token: str, order_id: str) -> Optional[Order]:
+        book = self.books.get(token)
+        return book.cancel(order_id) if book else None
@@ -0,0 +1,117 @@
+from typing import Dict, List, Optional, Tuple
+from bisect import bisect_left, bisect_right, insort
+from sqlalchemy.orm import Session, joinedload
+from app.models.models import Trade
+from app.services.mock_chain import MockChainService, mock_chain
+import logging
+
+logger = logging.getLogger(__name__)
+
+class OpenPositionView:
+    """Open trades per user, denormalized, joined to their live chain positions.
+
+    Built once from a single eager-loaded query, then kept current by the
+    trading service as trades open and close. Rows hold the trade fields;
+    marks (pnl, current price, liquidation price) are read from the chain
+    position at lookup time, which the mark-to-market pass keeps current.
+    Each user's trade ids are kept sorted for cursor pagination.
+    """
+
+    def __init__(self, chain: MockChainService = mock_chain):
+        self.chain = chain
+        self.loaded = False
+        self._rows: Dict[str, Dict[int, Dict]] = {}  # user_id -> trade_id -> row
+        self._ids: Dict[str, List[int]] = {}  # user_id -> sorted trade ids
+
+    def load(self, db: Session):
+        """Rebuild from every open trade, with its token, in one query"""
+        trades = (db.query(Trade)
+                  .options(joinedload(Trade.token))
+                  .filter(Trade.status == "OPEN")
+                  .order_by(Trade.id)
+                  .all())
+        self._rows.clear()
+        self._ids.clear()
+        for trade in trades:
+            self.add(trade, trade.token.symbol)
+        self.loaded = True
+        logger.info(f"Open position view loaded {len(trades)} trades")
+
+    def add(self, trade: Trade, token_symbol: str):
+        """Record a newly opened trade (after its commit, so it has an id)"""
+        user_id = str(trade.user_id)
+        rows = self._rows.setdefault(user_id, {})
+        if trade.id not in rows:
+            insort(self._ids.setdefault(user_id, []), trade.id)
+        rows[trade.id] = {
+            "trade_id": trade.id,
+            "position_id": trade.position_id,
+            "token": token_symbol,
+            "side": "BUY" if trade.is_long else "SELL",
+            "size": trade.position_size,
+            "entry_price": trade.entry_price,
+            "leverage": trade.leverage,
+            "timestamp": trade.created_at,
+        }
+
+    def remove(self, user_id: str, trade_id: int):
+        user_id = str(user_id)
+        rows = self._rows.get(user_id)
+        if rows is None or rows.pop(trade_id, None) is None:
+            return
+        ids = self._ids[user_id]
+        del ids[bisect_left(ids, trade_id)]
+        if not rows:
+            del self._rows[user_id]
+            del self._ids[user_id]
+
+    def _position(self, row: Dict, wallet_address: str) -> Optional[Dict]:
+        """The row with its current marks, or None if the chain position is gone"""
+        position = self.chain.positions.get(row["position_id"])
+        if (position is None or position["wallet_address"] != wallet_address
+                or position.get("status") in ("CLOSED", "LIQUIDATED")):
+            return None
+        return {
+            "trade_id": row["trade_id"],
+            "token": row["token"],
+            "side": row["side"],
+            "size": row["size"],
+            "entry_price": row["entry_price"],
+            "current_price": position.get("current_price", position["entry_price"]),
+            "leverage": row["leverage"],
+            "pnl": position["pnl"],
+            "liquidation_price": position["liquidation_price"],
+            "timestamp": row["timestamp"],
+        }
+
+    def page(self, user_id: str, wallet_address: str, cursor: Optional[int] = None,
+             limit: Optional[int] = None) -> Tuple[List[Dict], Optional[int]]:
+        """A user's open positions in trade id order after `cursor`.
+
+        Returns (positions, next_cursor); next_cursor is None on the last page.
+        """
+        user_id = str(user_id)
+        rows = self._rows.get(user_id)
+        if not rows:
+            return [], None
+        ids = self._ids[user_id]
+        start = bisect_right(ids, cursor) if cursor is not None else 0
+
+        positions = []
+        for index in range(start, len(ids)):
+            if limit is not None and len(positions) == limit:
+                return positions, positions[-1]["trade_id"]
+            position = self._position(rows[ids[index]], wallet_address)
+            if position is not None:
+                positions.append(position)
+        return positions, None
+
+    def get_metrics(self) -> Dict:
+        return {
+            "loaded": self.loaded,
+            "users": len(self._rows),
+            "open_trades": sum(len(rows) for rows in self._rows.values()),
+        }
+
+# Global open position view
+position_view = OpenPositionView()
@@ -1,17 +1,43 @@
 import asyncio
-import aiohttp
+import os
+import time
+from typing import Dict, List, Optional
 from datetime import datetime
+from sqlalchemy import case, update
 from sqlalchemy.orm import Session
-from app.models.models import Token, MarketData
+from app.models.models import Token
 from app.models.database import SessionLocal
 from app.services.websocket import ws_manager
+from app.services.candles import candle_aggregator
+from app.services.price_sources import PriceSource, create_price_source, FETCH_CHUNK_SIZE
+from app.services.feed_scheduler import PollScheduler
+from app.services.mock_chain import mock_chain
+from app.services.mark_to_market import push_position_updates
+from app.services.trading import trading_service
+from app.services.price_snapshot import (
+    PriceSnapshotReader,
+    PriceSnapshotWriter,
+    read_worker_demand,
+    write_worker_demand,
+)
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-COINGECKO_API_URL = "https://api.coingecko.com/api/v3"
-UPDATE_INTERVAL = 60  # seconds
+UPDATE_INTERVAL = int(os.getenv("PRICE_FEED_INTERVAL", "60"))  # seconds, for a quiet unwatched token
+MIN_UPDATE_INTERVAL = int(os.getenv("PRICE_FEED_MIN_INTERVAL", "5"))  # seconds
+MAX_UPDATE_INTERVAL = int(os.getenv("PRICE_FEED_MAX_INTERVAL", "300"))  # seconds
+REQUEST_BUDGET_PER_MINUTE = float(os.getenv("PRICE_FEED_REQUEST_BUDGET", "30"))  # upstream requests
+# "embedded" runs the feed inside the app; "external" follows `python -m app.services.price_feed`
+PRICE_FEED_MODE = os.getenv("PRICE_FEED_MODE", "embedded").lower()
+# Relative price move below which a token is left out of the broadcast
+BROADCAST_MIN_CHANGE = float(os.getenv("PRICE_BROADCAST_MIN_CHANGE", "0.0005"))
+SNAPSHOT_POLL_INTERVAL = 0.25  # seconds between snapshot checks in app workers
+DEMAND_REPORT_INTERVAL = 10  # seconds between worker demand reports to the feed process
+UNKNOWN_TOKEN_TTL = 60  # seconds before a symbol missing from the tokens table is looked up again
+# Rows per multi-row UPDATE; each binds ~9 parameters, so 100 stays under SQLite's 999 limit
+PRICE_UPDATE_CHUNK_SIZE = 100
 
 # Map our tokens to CoinGecko IDs
 TOKEN_MAP = {
@@ -20,99 +46,279 @@ TOKEN_MAP = {
     "DOGE": "dogecoin",
 }
 
-async def fetch_token_data(session: aiohttp.ClientSession, token_id: str):
-    """Fetch token price data from CoinGecko"""
-    try:
-        url = f"{COINGECKO_API_URL}/simple/price"
-        params = {
-            "ids": token_id,
-            "vs_currencies": "usd",
-            "include_24hr_vol": True,
-            "include_24hr_change": True,
-            "include_market_cap": True,
-        }
-        
-        async with session.get(url, params=params) as response:
-            if response.status == 200:
-                data = await response.json()
-                return data.get(token_id, {})
+_price_source: Optional[PriceSource] = None
+_snapshot_writer: Optional[PriceSnapshotWriter] = None
+_dispatch_locally = True  # False in the standalone feed process
+
+def get_price_source() -> PriceSource:
+    """Price source used by the feed, built from the environment on first use"""
+    global _price_source
+    if _price_source is None:
+        _price_source = create_price_source(TOKEN_MAP, poll_interval=UPDATE_INTERVAL)
+    return _price_source
+
+def set_price_source(source: PriceSource):
+    """Swap the feed's price source, e.g. for a replay or load test"""
+    global _price_source
+    _price_source = source
+
+_token_ids: Dict[str, int] = {}  # symbol -> tokens.id
+_unknown_symbols: Dict[str, float] = {}  # Symbols looked up and missing -> when to look again
+
+def get_token_ids(db: Session, symbols: List[str]) -> Dict[str, int]:
+    """Resolve symbols to token ids, loading the whole map in one query on a miss"""
+    now = time.monotonic()
+    missing = [
+        symbol for symbol in symbols
+        if symbol not in _token_ids and _unknown_symbols.get(symbol, 0) <= now
+    ]
+    if missing:
+        _token_ids.clear()
+        _token_ids.update(dict(db.query(Token.symbol, Token.id).all()))
+        for symbol in missing:
+            if symbol in _token_ids:
+                _unknown_symbols.pop(symbol, None)
             else:
-                logger.error(f"Error fetching price for {token_id}: {response.status}")
-                return None
-    except Exception as e:
-        logger.error(f"Exception fetching price for {token_id}: {str(e)}")
-        return None
+                _unknown_symbols[symbol] = now + UNKNOWN_TOKEN_TTL
+    return {symbol: _token_ids[symbol] for symbol in symbols if symbol in _token_ids}
+
+def invalidate_token_id_cache():
+    """Forget cached token ids, e.g. after tokens are added or removed"""
+    _token_ids.clear()
+    _unknown_symbols.clear()
+
+def write_price_updates(db: Session, price_updates: Dict[str, Dict],
+                        timestamp: Optional[datetime] = None) -> List[Dict]:
+    """Write one tick of CoinGecko payloads (keyed by symbol) with bulk statements"""
+    token_ids = get_token_ids(db, list(price_updates))
+    timestamp = timestamp or datetime.utcnow()
+    
+    rows = []
+    for symbol, price_data in price_updates.items():
+        token_id = token_ids.get(symbol)
+        if token_id is None:
+            continue
+        rows.append({
+            "id": token_id,
+            "symbol": symbol,
+            "price": price_data.get("usd", 0),
+            "price_change_24h": price_data.get("usd_24h_change", 0),
+            "volume_24h": price_data.get("usd_24h_vol", 0),
+            "market_cap": price_data.get("usd_market_cap", 0),
+        })
+    
+    if not rows:
+        return rows
+    
+    # Multi-row UPDATEs: each column is a CASE over the token id
+    for start in range(0, len(rows), PRICE_UPDATE_CHUNK_SIZE):
+        chunk = rows[start:start + PRICE_UPDATE_CHUNK_SIZE]
+        
+        def by_id(field: str):
+            return case({row["id"]: row[field] for row in chunk}, value=Token.id)
+        
+        db.execute(
+            update(Token)
+            .where(Token.id.in_([row["id"] for row in chunk]))
+            .values(
+                current_price=by_id("price"),
+                price_change_24h=by_id("price_change_24h"),
+                volume_24h=by_id("volume_24h"),
+                market_cap=by_id("market_cap"),
+            )
+            .execution_options(synchronize_session=False)
+        )
+    
+    # Fold ticks into OHLCV candles; closed bars go out in one multi-row INSERT
+    for row in rows:
+        candle_aggregator.add_tick(row["id"], row["price"], row["volume_24h"], timestamp)
+    candle_aggregator.flush(db, now=timestamp)
+    
+    return rows
+
+_last_broadcast: Dict[str, float] = {}  # symbol -> last price sent to clients
+
+def _price_changed(symbol: str, price: float) -> bool:
+    """Whether a price moved enough since the last broadcast to be worth sending"""
+    last = _last_broadcast.get(symbol)
+    if last is None or last == 0:
+        return last != price
+    return abs(price - last) / abs(last) >= BROADCAST_MIN_CHANGE
+
+async def dispatch_price_updates(rows: List[Dict]):
+    """Push fresh prices to everything in this process that follows them"""
+    tick_received = time.perf_counter()
+    changed = []
+    positions = []
+    for row in rows:
+        # Keep the simulated order book's liquidity centred on the market
+        mock_chain.update_market(row["symbol"], row["price"])
+        # Stops and take-profits fire before the liquidation check below
+        positions.extend(mock_chain.run_triggers(row["symbol"], row["price"], tick_received))
+        positions.extend(mock_chain.mark_to_market(row["symbol"], row["price"]))
+        if not _price_changed(row["symbol"], row["price"]):
+            continue
+        _last_broadcast[row["symbol"]] = row["price"]
+        changed.append({
+            "symbol": row["symbol"],
+            "price": row["price"],
+            "price_change_24h": row["price_change_24h"],
+            "volume_24h": row["volume_24h"],
+            "market_cap": row["market_cap"]
+        })
+    
+    # One batched frame per tick instead of one frame per token
+    await ws_manager.broadcast_price_updates(changed)
+    await push_position_updates(positions)
+    # Triggered and liquidated positions still have OPEN trades in the database
+    await trading_service.settle_chain_closes(mock_chain.drain_closed_by_chain())
 
-async def update_token_prices():
+async def update_token_prices(symbols: Optional[List[str]] = None) -> List[Dict]:
     """Update token prices in the database and broadcast via WebSocket"""
     db = SessionLocal()
+    rows: List[Dict] = []
     try:
-        async with aiohttp.ClientSession() as session:
-            for symbol, coingecko_id in TOKEN_MAP.items():
-                price_data = await fetch_token_data(session, coingecko_id)
-                
-                if price_data:
-                    token = db.query(Token).filter(Token.symbol == symbol).first()
-                    if token:
-                        # Update token data
-                        token.current_price = price_data.get("usd", 0)
-                        token.price_change_24h = price_data.get("usd_24h_change", 0)
-                        token.volume_24h = price_data.get("usd_24h_vol", 0)
-                        token.market_cap = price_data.get("usd_market_cap", 0)
-                        
-                        # Create market data entry
-                        market_data = MarketData(
-                            token_id=token.id,
-                            price=token.current_price,
-                            volume=token.volume_24h,
-                            timestamp=datetime.utcnow(),
-                            open=token.current_price,  # Simplified for now
-                            high=token.current_price,
-                            low=token.current_price,
-                            close=token.current_price
-                        )
-                        db.add(market_data)
-                        
-                        # Broadcast update via WebSocket
-                        await ws_manager.broadcast_price_update({
-                            "symbol": symbol,
-                            "price": token.current_price,
-                            "price_change_24h": token.price_change_24h,
-                            "volume_24h": token.volume_24h,
-                            "market_cap": token.market_cap
-                        })
-                        
-                        logger.info(f"Updated price for {symbol}: ${token.current_price}")
-                    
-            db.commit()
+        source = get_price_source()
+        price_updates = await source.fetch_prices(symbols or list(TOKEN_MAP))
+        
+        rows = write_price_updates(db, price_updates, source.current_time())
+        db.commit()
+        
+        if _snapshot_writer is not None:
+            updated_at = time.time()
+            _snapshot_writer.publish({
+                row["symbol"]: {
+                    **row,
+                    "interval": scheduler.get_interval(row["symbol"]),
+                    "updated_at": updated_at,
+                }
+                for row in rows
+            })
+        if _dispatch_locally:
+            await dispatch_price_updates(rows)
+        
+        logger.info(f"Updated prices for {len(rows)} tokens")
     except Exception as e:
         logger.error(f"Error updating prices: {str(e)}")
         db.rollback()
     finally:
         db.close()
+    return rows
+
+def _token_demand() -> Dict[str, Dict[str, int]]:
+    """How many price subscribers and open positions each token has"""
+    subscribers = ws_manager.manager.subscriber_counts("price_feed", list(TOKEN_MAP))
+    return {
+        symbol: {
+            "subscribers": subscribers[symbol],
+            "open_positions": len(mock_chain.open_positions_for_token(symbol))
+        }
+        for symbol in TOKEN_MAP
+    }
+
+scheduler = PollScheduler(
+    list(TOKEN_MAP),
+    base_interval=UPDATE_INTERVAL,
+    min_interval=MIN_UPDATE_INTERVAL,
+    max_interval=MAX_UPDATE_INTERVAL,
+    request_budget_per_minute=REQUEST_BUDGET_PER_MINUTE,
+    symbols_per_request=FETCH_CHUNK_SIZE,
+    demand_provider=_token_demand,
+)
 
 async def price_feed_loop():
     """Main loop to continuously update prices"""
+    source = get_price_source()
+    while not source.exhausted:
+        if source.poll_interval == 0:
+            # Self-paced sources (replays) deliver every token on each tick
+            due = list(TOKEN_MAP)
+        else:
+            due = scheduler.due()
+        
+        if due:
+            try:
+                rows = await update_token_prices(due)
+                scheduler.mark_polled(due)
+                for row in rows:
+                    scheduler.record_price(row["symbol"], row["price"])
+            except Exception as e:
+                logger.error(f"Error in price feed loop: {str(e)}")
+        
+        if source.poll_interval == 0:
+            await asyncio.sleep(0)
+        else:
+            await asyncio.sleep(max(scheduler.next_wakeup(), 0.1))
+    logger.info("Price source exhausted, price feed stopped")
+
+async def snapshot_watch_loop():
+    """Follow the external feed process through its shared price snapshot"""
+    reader = PriceSnapshotReader()
+    last_seq = 0
+    last_updated: Dict[str, float] = {}
+    last_demand_report = 0.0
     while True:
         try:
-            await update_token_prices()
+            seq = reader.sequence()
+            if seq != last_seq and seq % 2 == 0:
+                last_seq, rows = reader.read()
+                changed = [
+                    row for symbol, row in rows.items()
+                    if last_updated.get(symbol) != row["updated_at"]
+                ]
+                for row in changed:
+                    last_updated[row["symbol"]] = row["updated_at"]
+                if changed:
+                    await dispatch_price_updates(changed)
+            
+            if time.monotonic() - last_demand_report >= DEMAND_REPORT_INTERVAL:
+                write_worker_demand(_token_demand())
+                last_demand_report = time.monotonic()
         except Exception as e:
-            logger.error(f"Error in price feed loop: {str(e)}")
+            logger.error(f"Error reading price snapshot: {str(e)}")
         
-        await asyncio.sleep(UPDATE_INTERVAL)
+        await asyncio.sleep(SNAPSHOT_POLL_INTERVAL)
+
+def get_feed_status() -> Dict[str, Dict]:
+    """Effective refresh interval per token, wherever the feed runs"""
+    if PRICE_FEED_MODE == "external":
+        _, rows = PriceSnapshotReader().read()
+        return {
+            symbol: {"interval": row["interval"], "price": row["price"], "updated_at": row["updated_at"]}
+            for symbol, row in rows.items()
+        }
+    return scheduler.get_status()
 
 def start_price_feed():
-    """Start the price feed service"""
+    """Start the price feed, or follow the external one, in this app process"""
     loop = asyncio.get_event_loop()
     try:
-        loop.create_task(price_feed_loop())
-        logger.info("Price feed service started")
+        if PRICE_FEED_MODE == "external":
+            loop.create_task(snapshot_watch_loop())
+            logger.info("Following external price feed snapshot")
+        else:
+            loop.create_task(price_feed_loop())
+            logger.info("Price feed service started")
     except Exception as e:
         logger.error(f"Failed to start price feed: {str(e)}")
 
-if __name__ == "__main__":
-    start_price_feed()
+def run_feed_process():
+    """Run the feed standalone: the only DB writer, publishing to the snapshot"""
+    global _snapshot_writer, _dispatch_locally
+    _snapshot_writer = PriceSnapshotWriter()
+    _dispatch_locally = False  # App workers dispatch from the snapshot
+    scheduler.demand_provider = read_worker_demand
+    
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.create_task(price_feed_loop())
+    logger.info(f"Price feed process publishing to {_snapshot_writer.path}")
     try:
-        asyncio.get_event_loop().run_forever()
+        loop.run_forever()
     except KeyboardInterrupt:
         logger.info("Price feed service stopped")
+    finally:
+        _snapshot_writer.close()
+
+if __name__ == "__main__":
+    run_feed_process()
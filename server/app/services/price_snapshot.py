@@ -0,0 +1,188 @@
+from typing import Dict, Optional, Tuple
+import glob
+import json
+import mmap
+import os
+import struct
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATH = os.getenv("PRICE_SNAPSHOT_PATH", "/tmp/memefi_prices.snapshot")
+SNAPSHOT_CAPACITY = 1024  # max tokens in the snapshot
+
+# Header: magic, version, sequence, token count
+_HEADER = struct.Struct("<4sIQI12x")
+# Record: symbol, price, 24h change, 24h volume, market cap, poll interval, updated at (epoch)
+_RECORD = struct.Struct("<16s6d")
+_MAGIC = b"MFPS"
+_VERSION = 1
+_SEQ_OFFSET = 8
+
+def _snapshot_size(capacity: int) -> int:
+    return _HEADER.size + capacity * _RECORD.size
+
+class PriceSnapshotWriter:
+    """Publishes the latest token prices into a memory-mapped file.
+
+    Only the feed process writes. The header carries a sequence number used
+    as a seqlock: it is odd while a write is in progress, so readers retry
+    instead of seeing a torn snapshot.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_PATH, capacity: int = SNAPSHOT_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        self._slots: Dict[str, int] = {}
+        self._seq = 0
+
+        size = _snapshot_size(capacity)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(b"\0" * size)
+        os.replace(tmp_path, path)
+
+        self._file = open(path, "r+b")
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        _HEADER.pack_into(self._mmap, 0, _MAGIC, _VERSION, 0, 0)
+
+    def publish(self, rows: Dict[str, Dict]):
+        """Write changed token rows (keyed by symbol) into the snapshot"""
+        self._seq += 1  # Odd: write in progress
+        struct.pack_into("<Q", self._mmap, _SEQ_OFFSET, self._seq)
+
+        for symbol, row in rows.items():
+            slot = self._slots.get(symbol)
+            if slot is None:
+                if len(self._slots) >= self.capacity:
+                    logger.error(f"Price snapshot full, dropping {symbol}")
+                    continue
+                slot = self._slots[symbol] = len(self._slots)
+            _RECORD.pack_into(
+                self._mmap,
+                _HEADER.size + slot * _RECORD.size,
+                symbol.encode()[:16],
+                row.get("price", 0.0),
+                row.get("price_change_24h", 0.0),
+                row.get("volume_24h", 0.0),
+                row.get("market_cap", 0.0),
+                row.get("interval", 0.0),
+                row.get("updated_at", time.time()),
+            )
+
+        self._seq += 1  # Even: snapshot consistent
+        _HEADER.pack_into(self._mmap, 0, _MAGIC, _VERSION, self._seq, len(self._slots))
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+class PriceSnapshotReader:
+    """Reads the feed's price snapshot without any network or DB access"""
+
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        self.path = path
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._inode: Optional[int] = None
+
+    def _open(self) -> bool:
+        if self._mmap is not None:
+            return True
+        try:
+            self._file = open(self.path, "rb")
+            self._inode = os.fstat(self._file.fileno()).st_ino
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            # Feed process has not created the snapshot yet
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            return False
+        magic, version, _, _ = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or version != _VERSION:
+            logger.error(f"Unrecognised price snapshot at {self.path}")
+            self.close()
+            return False
+        return True
+
+    def _reopen_if_replaced(self):
+        """A restarted feed process writes a fresh file; follow it"""
+        try:
+            if self._mmap is not None and os.stat(self.path).st_ino != self._inode:
+                self.close()
+        except FileNotFoundError:
+            self.close()
+
+    def sequence(self) -> int:
+        """Current snapshot sequence; cheap to poll for changes"""
+        self._reopen_if_replaced()
+        if not self._open():
+            return 0
+        return struct.unpack_from("<Q", self._mmap, _SEQ_OFFSET)[0]
+
+    def read(self, retries: int = 100) -> Tuple[int, Dict[str, Dict]]:
+        """Read a consistent copy of every token row"""
+        self._reopen_if_replaced()
+        if not self._open():
+            return 0, {}
+        for _ in range(retries):
+            _, _, seq, count = _HEADER.unpack_from(self._mmap, 0)
+            if seq % 2:
+                time.sleep(0)
+                continue
+            data = self._mmap[_HEADER.size:_HEADER.size + count * _RECORD.size]
+            if struct.unpack_from("<Q", self._mmap, _SEQ_OFFSET)[0] != seq:
+                continue
+
+            rows = {}
+            for symbol, price, change, volume, market_cap, interval, updated_at in _RECORD.iter_unpack(data):
+                symbol = symbol.rstrip(b"\0").decode()
+                rows[symbol] = {
+                    "symbol": symbol,
+                    "price": price,
+                    "price_change_24h": change,
+                    "volume_24h": volume,
+                    "market_cap": market_cap,
+                    "interval": interval,
+                    "updated_at": updated_at,
+                }
+            return seq, rows
+        logger.warning("Price snapshot kept changing while reading")
+        return 0, {}
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def write_worker_demand(demand: Dict[str, Dict[str, int]], path: str = SNAPSHOT_PATH):
+    """Share this worker's per-token demand with the feed process"""
+    directory = f"{path}.demand"
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, f"{os.getpid()}.json")
+    with open(f"{target}.tmp", "w") as f:
+        json.dump(demand, f)
+    os.replace(f"{target}.tmp", target)
+
+def read_worker_demand(path: str = SNAPSHOT_PATH, max_age: float = 60) -> Dict[str, Dict[str, int]]:
+    """Sum the demand reported by every worker seen within max_age seconds"""
+    total: Dict[str, Dict[str, int]] = {}
+    now = time.time()
+    for demand_file in glob.glob(os.path.join(f"{path}.demand", "*.json")):
+        try:
+            if now - os.path.getmtime(demand_file) > max_age:
+                continue
+            with open(demand_file) as f:
+                demand = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for symbol, counts in demand.items():
+            merged = total.setdefault(symbol, {})
+            for key, value in counts.items():
+                merged[key] = merged.get(key, 0) + value
+    return total
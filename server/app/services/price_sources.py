@@ -0,0 +1,252 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+import asyncio
+import csv
+import json
+import os
+import time
+import aiohttp
+import logging
+
+logger = logging.getLogger(__name__)
+
+COINGECKO_API_URL = "https://api.coingecko.com/api/v3"
+FETCH_CHUNK_SIZE = 100  # ids per /simple/price request
+MAX_CONCURRENT_REQUESTS = 4  # connection pool size for chunk requests
+
+class PriceSource(ABC):
+    """Where the price feed gets its ticks from.
+
+    `fetch_prices` returns CoinGecko-shaped payloads keyed by symbol
+    (``usd``, ``usd_24h_change``, ``usd_24h_vol``, ``usd_market_cap``).
+    """
+
+    # Seconds the feed loop waits between fetches; 0 lets the source pace itself
+    poll_interval: float = 60
+
+    @abstractmethod
+    async def fetch_prices(self, symbols: List[str]) -> Dict[str, Dict]:
+        """Fetch the latest prices for the given symbols"""
+
+    def current_time(self) -> datetime:
+        """Time the last fetched tick belongs to"""
+        return datetime.utcnow()
+
+    @property
+    def exhausted(self) -> bool:
+        """Whether the source has no more ticks to give"""
+        return False
+
+    async def close(self):
+        """Release any resources held by the source"""
+
+class CoinGeckoPriceSource(PriceSource):
+    """Live prices from CoinGecko /simple/price in concurrent multi-id chunks"""
+
+    def __init__(self, token_map: Dict[str, str], poll_interval: float = 60,
+                 chunk_size: int = FETCH_CHUNK_SIZE,
+                 max_concurrent_requests: int = MAX_CONCURRENT_REQUESTS):
+        self.token_map = token_map
+        self.poll_interval = poll_interval
+        self.chunk_size = chunk_size
+        self.max_concurrent_requests = max_concurrent_requests
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def get_http_session(self) -> aiohttp.ClientSession:
+        """Shared HTTP session so every tick and chunk reuses one connection pool"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrent_requests)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def fetch_chunk(self, token_ids: List[str]) -> Optional[Dict[str, Dict]]:
+        """Fetch price data for a chunk of tokens from CoinGecko in one request"""
+        started = time.perf_counter()
+        try:
+            url = f"{COINGECKO_API_URL}/simple/price"
+            params = {
+                "ids": ",".join(token_ids),
+                "vs_currencies": "usd",
+                "include_24hr_vol": "true",
+                "include_24hr_change": "true",
+                "include_market_cap": "true",
+            }
+
+            async with self.get_http_session().get(url, params=params) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    return {token_id: data[token_id] for token_id in token_ids if token_id in data}
+                else:
+                    logger.error(f"Error fetching prices for {len(token_ids)} tokens: {response.status}")
+                    return None
+        except Exception as e:
+            logger.error(f"Exception fetching prices for {len(token_ids)} tokens: {str(e)}")
+            return None
+        finally:
+            logger.info(
+                f"Price chunk of {len(token_ids)} tokens took "
+                f"{(time.perf_counter() - started) * 1000:.1f}ms"
+            )
+
+    async def fetch_prices(self, symbols: List[str]) -> Dict[str, Dict]:
+        """Fetch every symbol in concurrent chunks of chunk_size ids"""
+        token_ids = [self.token_map[symbol] for symbol in symbols if symbol in self.token_map]
+        chunks = [
+            token_ids[i:i + self.chunk_size]
+            for i in range(0, len(token_ids), self.chunk_size)
+        ]
+        results = await asyncio.gather(*(self.fetch_chunk(chunk) for chunk in chunks))
+
+        prices: Dict[str, Dict] = {}
+        for chunk_data in results:
+            if chunk_data:
+                prices.update(chunk_data)
+        return {
+            symbol: prices[self.token_map[symbol]]
+            for symbol in symbols
+            if self.token_map.get(symbol) in prices
+        }
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+def _parse_timestamp(value) -> datetime:
+    """Parse epoch seconds/millis or an ISO string into naive UTC"""
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+    try:
+        epoch = float(value)
+    except (TypeError, ValueError):
+        return _parse_timestamp(datetime.fromisoformat(str(value).replace("Z", "+00:00")))
+    if epoch > 1e11:  # Milliseconds
+        epoch /= 1000
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).replace(tzinfo=None)
+
+def _to_float(value) -> float:
+    if value is None or value == "":
+        return 0.0
+    return float(value)
+
+class ReplayPriceSource(PriceSource):
+    """Replays recorded ticks from a CSV, NDJSON or Parquet file.
+
+    Each record needs ``timestamp``, ``symbol`` and ``price`` (or ``usd``);
+    ``price_change_24h``, ``volume_24h`` and ``market_cap`` are optional.
+    Records sharing a timestamp form one tick. ``speed`` scales the recorded
+    gaps between ticks (2.0 replays twice as fast); ``speed=0`` replays as
+    fast as the pipeline can consume. With ``loop`` each pass is shifted
+    forward by the recording's span, so timestamps keep increasing.
+    """
+
+    poll_interval = 0
+
+    def __init__(self, path: str, speed: float = 1.0, loop: bool = False):
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self.ticks = self._load_ticks(path)
+        self._position = 0
+        self._wall_start: Optional[float] = None
+        self._recorded_start: Optional[datetime] = None
+        self._pass_offset = timedelta(0)
+        self._current_time = self.ticks[0][0] if self.ticks else datetime.utcnow()
+        logger.info(f"Loaded {len(self.ticks)} ticks for replay from {path}")
+
+    def _read_records(self, path: str) -> Iterator[Dict]:
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".csv":
+            with open(path, newline="") as f:
+                yield from csv.DictReader(f)
+        elif extension in (".ndjson", ".jsonl"):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        elif extension == ".parquet":
+            try:
+                import pandas as pd
+            except ImportError:
+                raise ValueError("Replaying Parquet files requires pandas and pyarrow")
+            yield from pd.read_parquet(path).to_dict("records")
+        else:
+            raise ValueError(f"Unsupported replay file type: {extension}")
+
+    def _load_ticks(self, path: str) -> List[Tuple[datetime, Dict[str, Dict]]]:
+        ticks: Dict[datetime, Dict[str, Dict]] = {}
+        for record in self._read_records(path):
+            timestamp = _parse_timestamp(record["timestamp"])
+            ticks.setdefault(timestamp, {})[str(record["symbol"]).upper()] = {
+                "usd": _to_float(record.get("price", record.get("usd"))),
+                "usd_24h_change": _to_float(record.get("price_change_24h")),
+                "usd_24h_vol": _to_float(record.get("volume_24h")),
+                "usd_market_cap": _to_float(record.get("market_cap")),
+            }
+        return sorted(ticks.items(), key=lambda tick: tick[0])
+
+    @property
+    def exhausted(self) -> bool:
+        return self._position >= len(self.ticks) and not self.loop
+
+    async def _wait_for(self, timestamp: datetime):
+        """Sleep until the recorded tick is due at the configured speed"""
+        if self.speed <= 0:
+            # Still yield so other tasks (broadcasts, handlers) keep running
+            await asyncio.sleep(0)
+            return
+        if self._wall_start is None:
+            self._wall_start = time.monotonic()
+            self._recorded_start = timestamp
+        due = (timestamp - self._recorded_start).total_seconds() / self.speed
+        delay = due - (time.monotonic() - self._wall_start)
+        await asyncio.sleep(max(delay, 0))
+
+    def _pass_length(self) -> timedelta:
+        """Time from a pass's first tick to the next pass's first tick"""
+        span = self.ticks[-1][0] - self.ticks[0][0]
+        # Leave the recording's last gap between passes (a second if there is none)
+        gap = self.ticks[-1][0] - self.ticks[-2][0] if len(self.ticks) > 1 else timedelta(0)
+        return span + (gap or timedelta(seconds=1))
+
+    async def next_tick(self) -> Optional[Tuple[datetime, Dict[str, Dict]]]:
+        """Wait for and return the next recorded tick, or None when done"""
+        if not self.ticks:
+            return None
+        if self._position >= len(self.ticks):
+            if not self.loop:
+                return None
+            self._position = 0
+            self._pass_offset += self._pass_length()
+        timestamp, prices = self.ticks[self._position]
+        timestamp += self._pass_offset
+        self._position += 1
+        await self._wait_for(timestamp)
+        self._current_time = timestamp
+        return timestamp, prices
+
+    async def fetch_prices(self, symbols: List[str]) -> Dict[str, Dict]:
+        tick = await self.next_tick()
+        if tick is None:
+            return {}
+        wanted = set(symbols)
+        return {symbol: data for symbol, data in tick[1].items() if symbol in wanted}
+
+    def current_time(self) -> datetime:
+        return self._current_time
+
+def create_price_source(token_map: Dict[str, str], poll_interval: float = 60) -> PriceSource:
+    """Build the price source selected by the PRICE_SOURCE environment variable"""
+    kind = os.getenv("PRICE_SOURCE", "coingecko").lower()
+    if kind == "replay":
+        path = os.getenv("PRICE_REPLAY_PATH")
+        if not path:
+            raise ValueError("PRICE_REPLAY_PATH must be set when PRICE_SOURCE=replay")
+        return ReplayPriceSource(
+            path,
+            speed=float(os.getenv("PRICE_REPLAY_SPEED", "1.0")),
+            loop=os.getenv("PRICE_REPLAY_LOOP", "false").lower() == "true",
+        )
+    if kind != "coingecko":
+        raise ValueError(f"Unknown price source: {kind}")
+    return CoinGeckoPriceSource(token_map, poll_interval=poll_interval)
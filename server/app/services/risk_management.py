@@ -1,6 +1,7 @@
 from typing import Dict, List, Optional
 import random
 from datetime import datetime, timedelta
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from app.models.models import User, Trade, Token, MarketData
 from app.models.database import SessionLocal
@@ -74,6 +75,7 @@ class RiskManager:
         self.max_leverage = 10           # 10x max leverage
         self.max_daily_loss = 0.25       # 25% max daily loss
         self.volatility_threshold = 0.5   # 50% volatility threshold
+        self.volatility_interval = "1h"   # Candle interval used for volatility
         
     def calculate_volatility(self, prices: List[float]) -> float:
         """Calculate price volatility using standard deviation"""
@@ -87,70 +89,94 @@ class RiskManager:
         z_score = 1.645  # 95% confidence level
         return position_value * volatility * z_score
     
+    def load_markets(self, db: Session, token_symbols: List[str]) -> Dict[str, Dict]:
+        """Tokens and their recent closes for risk checks, in two queries for any number of symbols"""
+        tokens = db.query(Token).filter(Token.symbol.in_(set(token_symbols))).all()
+        markets = {token.symbol: {"token": token, "prices": []} for token in tokens}
+        if not tokens:
+            return markets
+        
+        # Last 24 closed candles of every token at once
+        recent = (db.query(
+                      MarketData.token_id,
+                      MarketData.close,
+                      func.row_number().over(
+                          partition_by=MarketData.token_id,
+                          order_by=MarketData.timestamp.desc()
+                      ).label("age"))
+                  .filter(MarketData.token_id.in_([token.id for token in tokens]))
+                  .filter(MarketData.interval == self.volatility_interval)
+                  .subquery())
+        rows = (db.query(recent.c.token_id, recent.c.close)
+                .filter(recent.c.age <= 24)
+                .order_by(recent.c.token_id, recent.c.age.desc())
+                .all())
+        
+        symbols = {token.id: token.symbol for token in tokens}
+        for token_id, close in rows:
+            markets[symbols[token_id]]["prices"].append(close)
+        return markets
+    
+    async def evaluate_position_risk(self, user_id: str, token_symbol: str, market: Optional[Dict],
+                                     position_size: float, leverage: float = 1.0) -> Dict:
+        """Check a position against risk limits using a market from load_markets"""
+        if market is None:
+            return {"allowed": False, "reason": "Token not found"}
+        
+        # Calculate risk metrics
+        volatility = self.calculate_volatility(market["prices"])
+        position_value = position_size * market["token"].current_price
+        var = self.calculate_var(position_value, volatility)
+        
+        # Check risk limits
+        risk_checks = {
+            "position_size": position_value <= self.max_position_size,
+            "leverage": leverage <= self.max_leverage,
+            "volatility": volatility <= self.volatility_threshold
+        }
+        
+        # Calculate risk score (0-100)
+        risk_score = (
+            (position_value / self.max_position_size) * 30 +
+            (leverage / self.max_leverage) * 40 +
+            (volatility / self.volatility_threshold) * 30
+        )
+        
+        risk_data = {
+            "allowed": all(risk_checks.values()),
+            "risk_score": min(risk_score, 100),
+            "metrics": {
+                "position_value": position_value,
+                "volatility": volatility,
+                "var_95": var,
+                "leverage": leverage
+            },
+            "limits": {
+                "position_size": self.max_position_size,
+                "leverage": self.max_leverage,
+                "volatility": self.volatility_threshold
+            }
+        }
+        
+        # Send risk alert if score is high
+        if risk_score > 70:
+            await ws_manager.send_risk_alert(user_id, {
+                "level": "high",
+                "score": risk_score,
+                "message": f"High risk position detected for {token_symbol}",
+                "details": risk_data
+            })
+        
+        return risk_data
+    
     async def check_position_risk(self, db: Session, user_id: str, token_symbol: str, 
                                 position_size: float, leverage: float = 1.0) -> Dict:
         """Check if a position meets risk requirements"""
         try:
-            # Get token data
-            token = db.query(Token).filter(Token.symbol == token_symbol).first()
-            if not token:
-                return {"allowed": False, "reason": "Token not found"}
-            
-            # Get recent market data
-            market_data = (db.query(MarketData)
-                         .filter(MarketData.token_id == token.id)
-                         .order_by(MarketData.timestamp.desc())
-                         .limit(24)  # Last 24 data points
-                         .all())
-            
-            prices = [data.price for data in market_data]
-            
-            # Calculate risk metrics
-            volatility = self.calculate_volatility(prices)
-            position_value = position_size * token.current_price
-            var = self.calculate_var(position_value, volatility)
-            
-            # Check risk limits
-            risk_checks = {
-                "position_size": position_value <= self.max_position_size,
-                "leverage": leverage <= self.max_leverage,
-                "volatility": volatility <= self.volatility_threshold
-            }
-            
-            # Calculate risk score (0-100)
-            risk_score = (
-                (position_value / self.max_position_size) * 30 +
-                (leverage / self.max_leverage) * 40 +
-                (volatility / self.volatility_threshold) * 30
+            markets = self.load_markets(db, [token_symbol])
+            return await self.evaluate_position_risk(
+                user_id, token_symbol, markets.get(token_symbol), position_size, leverage
             )
-            
-            risk_data = {
-                "allowed": all(risk_checks.values()),
-                "risk_score": min(risk_score, 100),
-                "metrics": {
-                    "position_value": position_value,
-                    "volatility": volatility,
-                    "var_95": var,
-                    "leverage": leverage
-                },
-                "limits": {
-                    "position_size": self.max_position_size,
-                    "leverage": self.max_leverage,
-                    "volatility": self.volatility_threshold
-                }
-            }
-            
-            # Send risk alert if score is high
-            if risk_score > 70:
-                await ws_manager.send_risk_alert(user_id, {
-                    "level": "high",
-                    "score": risk_score,
-                    "message": f"High risk position detected for {token_symbol}",
-                    "details": risk_data
-                })
-            
-            return risk_data
-            
         except Exception as e:
             logger.error(f"Error checking position risk: {str(e)}")
             return {"allowed": False, "reason": f"Error checking risk: {str(e)}"}
@@ -1,14 +1,44 @@
-from typing import Dict, List, Optional
+from typing import Awaitable, Callable, Dict, List, Optional
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from app.models.models import Trade, Token, User
+from app.models.database import SessionLocal
+from app.services.idempotency import IdempotencyCache
 from app.services.mock_chain import mock_chain
+from app.services.position_view import position_view
 from app.services.websocket import ws_manager
 from app.services.risk_management import risk_manager
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# (user_id, client_order_id) -> the place_trade call, shared by its retries
+_trade_requests = IdempotencyCache()
+# (user_id, client_batch_id, index) -> result of a batch item that succeeded
+_batch_item_results = IdempotencyCache()
+
+def _succeeded(result: Dict) -> bool:
+    return result.get("success", False)
+
+def _trade_record(trade: Trade, token_symbol: str) -> Dict:
+    """A trade as plain fields, for JSON results that outlive its session"""
+    return {
+        "trade_id": trade.id,
+        "position_id": trade.position_id,
+        "token": token_symbol,
+        "side": "BUY" if trade.is_long else "SELL",
+        "size": trade.position_size,
+        "entry_price": trade.entry_price,
+        "leverage": trade.leverage,
+        "stop_loss": trade.stop_loss,
+        "take_profit": trade.take_profit,
+        "status": trade.status,
+        "pnl": trade.pnl,
+        "timestamp": trade.created_at,
+        "closed_at": trade.closed_at,
+    }
+
 class TradingService:
     async def place_trade(
         self,
@@ -19,9 +49,56 @@ class TradingService:
         side: str,
         size: float,
         price: float,
-        leverage: float = 1.0
+        leverage: float = 1.0,
+        stop_loss: Optional[float] = None,
+        take_profit: Optional[float] = None,
+        client_order_id: Optional[str] = None
+    ) -> Dict:
+        """Place a new trade.
+
+        Retries carrying the same ``client_order_id`` get the first successful
+        result; one still in flight is awaited rather than placed again. A
+        failed attempt is not remembered, so a retry places the trade again.
+        """
+        if not client_order_id:
+            return await self._place_trade(
+                db, user_id, wallet_address, token_symbol, side, size, price, leverage, stop_loss, take_profit
+            )
+        return await _trade_requests.run(
+            (user_id, client_order_id),
+            lambda: self._with_own_session(lambda own_db: self._place_trade(
+                own_db, user_id, wallet_address, token_symbol, side, size, price, leverage, stop_loss, take_profit,
+                client_order_id
+            )),
+            keep=_succeeded
+        )
+
+    async def _with_own_session(self, call: Callable[[Session], Awaitable[Dict]]) -> Dict:
+        """Run work shared by a request's retries on a session of its own.
+
+        The caller's session is closed when its request ends, possibly
+        while a retry is still waiting on the shared work.
+        """
+        db = SessionLocal()
+        try:
+            return await call(db)
+        finally:
+            db.close()
+
+    async def _place_trade(
+        self,
+        db: Session,
+        user_id: str,
+        wallet_address: str,
+        token_symbol: str,
+        side: str,
+        size: float,
+        price: float,
+        leverage: float,
+        stop_loss: Optional[float],
+        take_profit: Optional[float],
+        client_order_id: Optional[str] = None
     ) -> Dict:
-        """Place a new trade"""
         try:
             # Get token
             token = db.query(Token).filter(Token.symbol == token_symbol).first()
@@ -37,29 +114,40 @@ class TradingService:
             
             # Place order on chain
             order_data = {
+                "user_id": user_id,
                 "token": token_symbol,
                 "side": side,
                 "size": size,
                 "price": price,
-                "leverage": leverage
+                "leverage": leverage,
+                "stop_loss": stop_loss,
+                "take_profit": take_profit,
+                "client_order_id": client_order_id
             }
             order = await mock_chain.place_order(wallet_address, order_data)
             
-            if order["status"] == "FILLED":
+            if order.get("position_id"):
+                # The order book decides the actual fill price and, for a
+                # partly filled market order, the size actually opened
+                price = order["avg_fill_price"]
+                size = order["filled_size"]
                 # Create trade record
                 trade = Trade(
                     user_id=user_id,
                     token_id=token.id,
-                    side=side,
-                    size=size,
-                    price=price,
+                    position_size=size,
+                    entry_price=price,
                     leverage=leverage,
+                    is_long=side == "BUY",
+                    stop_loss=stop_loss,
+                    take_profit=take_profit,
                     position_id=order["position_id"],
                     status="OPEN",
-                    timestamp=datetime.utcnow()
+                    created_at=datetime.utcnow()
                 )
                 db.add(trade)
                 db.commit()
+                position_view.add(trade, token_symbol)
                 
                 # Broadcast trade update
                 await ws_manager.broadcast_trade_update({
@@ -77,6 +165,7 @@ class TradingService:
                     "success": True,
                     "trade": trade,
                     "order": order,
+                    "unfilled_size": order.get("unfilled_size", 0.0),
                     "risk_data": risk_check
                 }
             else:
@@ -117,11 +206,17 @@ class TradingService:
             
             # Update trade record
             trade.status = "CLOSED"
-            trade.close_price = position["entry_price"]  # Using entry price as close price for demo
-            trade.realized_pnl = position["final_pnl"]
-            trade.close_timestamp = datetime.utcnow()
+            trade.pnl = position["final_pnl"]
+            trade.closed_at = position["closed_at"]
             
-            db.commit()
+            try:
+                db.commit()
+            except Exception:
+                db.rollback()
+                # The chain already closed it; settle the row from the next tick
+                mock_chain.report_closed([position])
+                raise
+            position_view.remove(user_id, trade.id)
             
             # Broadcast trade update
             await ws_manager.broadcast_trade_update({
@@ -145,6 +240,334 @@ class TradingService:
                 "error": str(e)
             }
     
+    async def place_trades(
+        self,
+        db: Session,
+        user_id: str,
+        wallet_address: str,
+        trades: List[Dict],
+        client_batch_id: Optional[str] = None
+    ) -> Dict:
+        """Place several trades at once.
+
+        Each item takes place_trade's arguments (token, side, size, price,
+        leverage, stop_loss, take_profit). Risk checks share one market
+        lookup, the orders go to the chain concurrently, and the filled ones
+        are saved in one commit and broadcast in one trade_update. Results
+        come back in input order.
+
+        Retries with the same ``client_batch_id`` share a call still in
+        flight and get back a batch that fully succeeded. After a partial
+        failure, a retry returns the items that succeeded and places only
+        the others again.
+        """
+        if not client_batch_id:
+            return await self._place_trades(db, user_id, wallet_address, trades)
+        return await _trade_requests.run(
+            (user_id, f"batch:{client_batch_id}"),
+            lambda: self._with_own_session(
+                lambda own_db: self._place_trades(own_db, user_id, wallet_address, trades, client_batch_id)
+            ),
+            keep=_succeeded
+        )
+
+    async def _place_trades(
+        self,
+        db: Session,
+        user_id: str,
+        wallet_address: str,
+        trades: List[Dict],
+        client_batch_id: Optional[str] = None
+    ) -> Dict:
+        results: List[Dict] = [{"success": False} for _ in trades]
+        try:
+            markets = risk_manager.load_markets(db, [trade["token"] for trade in trades])
+            
+            submitted = []
+            for index, trade in enumerate(trades):
+                if client_batch_id:
+                    placed = _batch_item_results.get((user_id, client_batch_id, index))
+                    if placed is not None:
+                        # Placed by an earlier attempt at this batch
+                        results[index] = placed
+                        continue
+                risk_check = await risk_manager.evaluate_position_risk(
+                    user_id, trade["token"], markets.get(trade["token"]), trade["size"], trade.get("leverage", 1.0)
+                )
+                results[index]["risk_data"] = risk_check
+                if not risk_check["allowed"]:
+                    results[index]["error"] = f"Risk check failed: {risk_check.get('reason')}"
+                    continue
+                submitted.append(index)
+            
+            orders = await asyncio.gather(*(
+                mock_chain.place_order(wallet_address, {
+                    "user_id": user_id,
+                    "token": trades[index]["token"],
+                    "side": trades[index]["side"],
+                    "size": trades[index]["size"],
+                    "price": trades[index]["price"],
+                    "leverage": trades[index].get("leverage", 1.0),
+                    "stop_loss": trades[index].get("stop_loss"),
+                    "take_profit": trades[index].get("take_profit"),
+                    "client_order_id": f"{client_batch_id}:{index}" if client_batch_id else None
+                })
+                for index in submitted
+            ), return_exceptions=True)
+            
+            filled = []
+            for index, order in zip(submitted, orders):
+                if isinstance(order, Exception):
+                    results[index]["error"] = str(order)
+                    continue
+                results[index]["order"] = order
+                if not order.get("position_id"):
+                    results[index]["error"] = order.get("error", "Order failed")
+                    continue
+                results[index]["unfilled_size"] = order.get("unfilled_size", 0.0)
+                trade = trades[index]
+                # The order book decides the actual fill price and filled size
+                record = Trade(
+                    user_id=user_id,
+                    token_id=markets[trade["token"]]["token"].id,
+                    position_size=order["filled_size"],
+                    entry_price=order["avg_fill_price"],
+                    leverage=trade.get("leverage", 1.0),
+                    is_long=trade["side"] == "BUY",
+                    stop_loss=trade.get("stop_loss"),
+                    take_profit=trade.get("take_profit"),
+                    position_id=order["position_id"],
+                    status="OPEN",
+                    created_at=datetime.utcnow()
+                )
+                filled.append((index, record))
+            
+            try:
+                db.add_all([record for _, record in filled])
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                await self._unwind_orders(wallet_address, [results[index]["order"] for index, _ in filled])
+                for index, _ in filled:
+                    results[index]["error"] = f"Trade not saved, position closed: {str(e)}"
+                raise
+            
+            updates = []
+            for index, record in filled:
+                position_view.add(record, trades[index]["token"])
+                results[index].update(success=True, trade=_trade_record(record, trades[index]["token"]))
+                if client_batch_id:
+                    _batch_item_results.put((user_id, client_batch_id, index), results[index])
+                updates.append({
+                    "trade_id": record.id,
+                    "user_id": user_id,
+                    "token": trades[index]["token"],
+                    "side": trades[index]["side"],
+                    "size": record.position_size,
+                    "price": record.entry_price,
+                    "leverage": record.leverage,
+                    "status": "OPEN"
+                })
+            await ws_manager.broadcast_trade_updates(updates)
+            
+            return {
+                "success": all(result["success"] for result in results),
+                "results": results
+            }
+            
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error placing trades: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "results": results
+            }
+    
+    async def _unwind_orders(self, wallet_address: str, orders: List[Dict]):
+        """Close the chain positions of filled orders whose trades failed to save.
+
+        Without a Trade row nothing would ever close or settle them. Their
+        client_order_ids are released so a retry places them again.
+        """
+        logger.error(f"Closing {len(orders)} chain positions left without a trade record")
+        closes = await asyncio.gather(*(
+            mock_chain.close_position(wallet_address, order["position_id"]) for order in orders
+        ), return_exceptions=True)
+        for order, closed in zip(orders, closes):
+            if isinstance(closed, Exception):
+                logger.error(f"Could not close chain position {order['position_id']}: {str(closed)}")
+            if order.get("client_order_id"):
+                mock_chain.forget_client_order(wallet_address, order["client_order_id"])
+    
+    async def close_trades(
+        self,
+        db: Session,
+        user_id: str,
+        wallet_address: str,
+        trade_ids: List[int]
+    ) -> Dict:
+        """Close several trades at once.
+
+        The trades are loaded in one query, their positions close on the
+        chain concurrently, and the updates are saved in one commit and
+        broadcast in one trade_update. Results come back in input order.
+        """
+        results: List[Dict] = [{"success": False, "trade_id": trade_id} for trade_id in trade_ids]
+        try:
+            trades = {
+                trade.id: trade for trade in db.query(Trade)
+                .options(joinedload(Trade.token))
+                .filter(
+                    Trade.id.in_(set(trade_ids)),
+                    Trade.user_id == user_id,
+                    Trade.status == "OPEN"
+                ).all()
+            }
+            
+            closing, seen = [], set()
+            for index, trade_id in enumerate(trade_ids):
+                if trade_id not in trades or trade_id in seen:
+                    results[index]["error"] = "Trade not found or already closed"
+                    continue
+                seen.add(trade_id)
+                closing.append(index)
+            
+            positions = await asyncio.gather(*(
+                mock_chain.close_position(wallet_address, trades[trade_ids[index]].position_id)
+                for index in closing
+            ), return_exceptions=True)
+            
+            closed = []
+            for index, position in zip(closing, positions):
+                if isinstance(position, Exception):
+                    results[index]["error"] = str(position)
+                    continue
+                trade = trades[trade_ids[index]]
+                trade.status = "CLOSED"
+                trade.pnl = position["final_pnl"]
+                trade.closed_at = position["closed_at"]
+                results[index].update(position=position)
+                closed.append((index, trade, position))
+            
+            try:
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                # The chain already closed these; settle the rows from the next tick
+                mock_chain.report_closed([position for _, _, position in closed])
+                for index, _, _ in closed:
+                    results[index]["error"] = f"Position closed, trade will be settled later: {str(e)}"
+                raise
+            
+            updates = []
+            for index, trade, position in closed:
+                position_view.remove(user_id, trade.id)
+                results[index].update(success=True, trade=_trade_record(trade, trade.token.symbol))
+                updates.append({
+                    "trade_id": trade.id,
+                    "user_id": user_id,
+                    "token": trade.token.symbol,
+                    "status": "CLOSED",
+                    "pnl": position["final_pnl"]
+                })
+            await ws_manager.broadcast_trade_updates(updates)
+            
+            return {
+                "success": all(result["success"] for result in results),
+                "results": results
+            }
+            
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error closing trades: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "results": results
+            }
+    
+    async def set_position_triggers(
+        self,
+        db: Session,
+        wallet_address: str,
+        position_id: str,
+        stop_loss: Optional[float] = None,
+        take_profit: Optional[float] = None
+    ) -> Dict:
+        """Set a stop-loss and/or take-profit on the chain and on the position's trade.
+
+        Raises ValueError if the chain rejects it. If the trade can't be
+        saved, the chain gets its previous triggers back.
+        """
+        current = mock_chain.positions.get(position_id, {})
+        previous = (current.get("stop_loss"), current.get("take_profit"))
+        position = await mock_chain.set_triggers(wallet_address, position_id, stop_loss, take_profit)
+        
+        values = {}
+        if stop_loss:
+            values["stop_loss"] = stop_loss
+        if take_profit:
+            values["take_profit"] = take_profit
+        if values:
+            try:
+                db.query(Trade).filter(
+                    Trade.position_id == position_id,
+                    Trade.status == "OPEN"
+                ).update(values, synchronize_session=False)
+                db.commit()
+            except Exception:
+                db.rollback()
+                await mock_chain.restore_triggers(position_id, *previous)
+                raise
+        
+        return position
+    
+    async def settle_chain_closes(self, positions: List[Dict]):
+        """Close the Trade rows of positions the chain closed by itself.
+
+        Liquidations and stop-loss/take-profit closes happen on price ticks,
+        not through close_trade, so the tick dispatcher hands them here. Each
+        OPEN trade takes its position's status and final PnL, and all of them
+        go out in one trade_update with the close reason.
+        """
+        if not positions:
+            return
+        by_id = {position["id"]: position for position in positions}
+        db = SessionLocal()
+        try:
+            trades = (db.query(Trade)
+                      .options(joinedload(Trade.token))
+                      .filter(Trade.position_id.in_(list(by_id)), Trade.status == "OPEN")
+                      .all())
+            for trade in trades:
+                position = by_id[trade.position_id]
+                trade.status = position["status"]
+                trade.pnl = position["final_pnl"]
+                trade.closed_at = position.get("closed_at", datetime.utcnow())
+            db.commit()
+            
+            updates = []
+            for trade in trades:
+                position = by_id[trade.position_id]
+                position_view.remove(trade.user_id, trade.id)
+                updates.append({
+                    "trade_id": trade.id,
+                    "user_id": trade.user_id,
+                    "token": trade.token.symbol,
+                    "status": trade.status,
+                    "reason": position.get("close_reason", trade.status),
+                    "close_price": position.get("current_price", position["entry_price"]),
+                    "pnl": trade.pnl
+                })
+            await ws_manager.broadcast_trade_updates(updates)
+            
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error settling {len(positions)} positions closed by the chain: {str(e)}")
+        finally:
+            db.close()
+    
     async def get_user_positions(
         self,
         db: Session,
@@ -152,38 +575,30 @@ class TradingService:
         wallet_address: str
     ) -> List[Dict]:
         """Get all open positions for a user"""
+        page = await self.get_user_positions_page(db, user_id, wallet_address)
+        return page["positions"]
+    
+    async def get_user_positions_page(
+        self,
+        db: Session,
+        user_id: str,
+        wallet_address: str,
+        cursor: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> Dict:
+        """Get a page of a user's open positions with current marks.
+
+        Pass the returned ``next_cursor`` back to get the following page.
+        """
         try:
-            # Get positions from chain
-            chain_positions = await mock_chain.get_positions(wallet_address)
-            
-            # Get trades from database
-            trades = db.query(Trade).filter(
-                Trade.user_id == user_id,
-                Trade.status == "OPEN"
-            ).all()
-            
-            positions = []
-            for trade in trades:
-                if trade.position_id in chain_positions:
-                    position = chain_positions[trade.position_id]
-                    positions.append({
-                        "trade_id": trade.id,
-                        "token": trade.token.symbol,
-                        "side": trade.side,
-                        "size": trade.size,
-                        "entry_price": trade.price,
-                        "current_price": position["entry_price"],  # In real impl, get from price feed
-                        "leverage": trade.leverage,
-                        "pnl": position["pnl"],
-                        "liquidation_price": position["liquidation_price"],
-                        "timestamp": trade.timestamp
-                    })
-            
-            return positions
+            if not position_view.loaded:
+                position_view.load(db)
+            positions, next_cursor = position_view.page(user_id, wallet_address, cursor, limit)
+            return {"positions": positions, "next_cursor": next_cursor}
             
         except Exception as e:
             logger.error(f"Error getting positions: {str(e)}")
-            return []
+            return {"positions": [], "next_cursor": None}
     
     async def get_user_orders(
         self,
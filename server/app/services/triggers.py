@@ -0,0 +1,146 @@
+from typing import Deque, Dict, List, Optional
+from collections import deque
+import heapq
+import itertools
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+STOP_LOSS = "STOP_LOSS"
+TAKE_PROFIT = "TAKE_PROFIT"
+
+class Trigger:
+    __slots__ = ("id", "position_id", "token", "kind", "price", "fires_below", "active")
+
+    def __init__(self, trigger_id: int, position_id: str, token: str, kind: str,
+                 price: float, fires_below: bool):
+        self.id = trigger_id
+        self.position_id = position_id
+        self.token = token
+        self.kind = kind
+        self.price = price
+        self.fires_below = fires_below
+        self.active = True
+
+class TriggerBook:
+    """One token's triggers in two heaps keyed by trigger price.
+
+    ``below`` holds triggers that fire when the price falls to them (long
+    stop-loss, short take-profit), highest first; ``above`` holds the ones
+    that fire when it rises to them, lowest first. A tick pops only what it
+    crossed. Cancelled triggers stay in the heap, inactive, until they reach
+    the top.
+    """
+
+    def __init__(self):
+        self.below: List = []
+        self.above: List = []
+
+    def compact(self):
+        """Drop cancelled triggers buried in the heaps"""
+        self.below = [entry for entry in self.below if entry[2].active]
+        self.above = [entry for entry in self.above if entry[2].active]
+        heapq.heapify(self.below)
+        heapq.heapify(self.above)
+
+    def add(self, trigger: Trigger):
+        if trigger.fires_below:
+            heapq.heappush(self.below, (-trigger.price, trigger.id, trigger))
+        else:
+            heapq.heappush(self.above, (trigger.price, trigger.id, trigger))
+
+    def crossed(self, price: float) -> List[Trigger]:
+        fired = []
+        below, above = self.below, self.above
+        while below and -below[0][0] >= price:
+            trigger = heapq.heappop(below)[2]
+            if trigger.active:
+                fired.append(trigger)
+        while above and above[0][0] <= price:
+            trigger = heapq.heappop(above)[2]
+            if trigger.active:
+                fired.append(trigger)
+        return fired
+
+    def __len__(self) -> int:
+        return len(self.below) + len(self.above)
+
+class TriggerEngine:
+    """Stop-loss and take-profit triggers for open positions, evaluated per price tick"""
+
+    def __init__(self, latency_samples: int = 1000):
+        self.books: Dict[str, TriggerBook] = {}
+        self.by_position: Dict[str, Dict[str, Trigger]] = {}
+        self._ids = itertools.count(1)
+        self._cancelled = 0
+        self.fired = 0
+        # Tick-to-trigger latency (seconds) of recent executions
+        self.latencies: Deque[float] = deque(maxlen=latency_samples)
+
+    def arm(self, position: Dict, kind: str, price: float) -> Trigger:
+        """Set (or replace) a position's stop-loss or take-profit"""
+        self.disarm(position["id"], kind)
+        is_long = position.get("side") != "SELL"
+        # Long stops and short take-profits fire on the way down
+        fires_below = (kind == STOP_LOSS) == is_long
+        trigger = Trigger(next(self._ids), position["id"], position["token"], kind, price, fires_below)
+        book = self.books.get(trigger.token)
+        if book is None:
+            book = self.books[trigger.token] = TriggerBook()
+        book.add(trigger)
+        self.by_position.setdefault(position["id"], {})[kind] = trigger
+        return trigger
+
+    def disarm(self, position_id: str, kind: Optional[str] = None):
+        """Cancel one kind of trigger, or all of them, for a position"""
+        triggers = self.by_position.get(position_id)
+        if not triggers:
+            return
+        for trigger_kind in ([kind] if kind else list(triggers)):
+            trigger = triggers.pop(trigger_kind, None)
+            if trigger is not None:
+                trigger.active = False
+                self._cancelled += 1
+        if not triggers:
+            del self.by_position[position_id]
+        if self._cancelled > 1024 and self._cancelled > len(self.by_position):
+            for book in self.books.values():
+                book.compact()
+            self._cancelled = 0
+
+    def triggers_for(self, position_id: str) -> Dict[str, float]:
+        return {kind: trigger.price for kind, trigger in self.by_position.get(position_id, {}).items()}
+
+    def crossed(self, token: str, price: float) -> List[Trigger]:
+        """Pop the triggers this price crossed; each position fires at most once"""
+        book = self.books.get(token)
+        if book is None:
+            return []
+        fired = []
+        for trigger in book.crossed(price):
+            if trigger.active:
+                # A position's other trigger is cancelled when it closes
+                self.disarm(trigger.position_id)
+                fired.append(trigger)
+        return fired
+
+    def record_latency(self, tick_received: float):
+        """Note that a trigger from the tick received at `tick_received` (perf_counter) has executed"""
+        self.fired += 1
+        self.latencies.append(time.perf_counter() - tick_received)
+
+    def get_metrics(self) -> Dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(fraction: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000, 3)
+
+        return {
+            "armed": sum(len(triggers) for triggers in self.by_position.values()),
+            "heap_entries": sum(len(book) for book in self.books.values()),
+            "fired": self.fired,
+            "tick_to_trigger_ms": {"p50": percentile(0.5), "p99": percentile(0.99), "max": percentile(1.0)},
+        }
@@ -1,100 +1,620 @@
 from fastapi import WebSocket
-from typing import Dict, List, Optional
-import json
+from typing import Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Set, Tuple, Union
+from collections import defaultdict, deque
+import asyncio
+import os
+import random
+import time
 import logging
 from datetime import datetime
+from app.services.ws_codec import encode_message, JSON
+from app.services.ws_backplane import Backplane, InMemoryBackplane
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# What to do when a client's outbound queue is full:
+# "conflate" merges further updates by key until the queue drains, "disconnect" drops the client
+SLOW_CONSUMER_POLICIES = {
+    "price_feed": "conflate",
+    "positions": "conflate",
+    "trades": "disconnect",
+    "risk": "disconnect",
+}
+# Field identifying an item in a conflated channel's ``data`` list
+CONFLATION_KEYS = {
+    "price_feed": "symbol",
+    "positions": "position_id",
+}
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "100"))  # messages per connection
+PRICE_REPLAY_BUFFER_SIZE = int(os.getenv("WS_PRICE_REPLAY_BUFFER", "1000"))  # price batches kept for resume
+HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", "20"))  # seconds between pings
+HEARTBEAT_TIMEOUT = float(os.getenv("WS_HEARTBEAT_TIMEOUT", "60"))  # seconds of silence before eviction
+ALL_SYMBOLS = "*"  # subscribe/unsubscribe wildcard
+# Each worker numbers price batches from its own random multiple of this, so a
+# resume `since` issued by another worker (or before a restart) is recognised
+PRICE_SEQ_RANGE = 1 << 21
+
+class ClientConnection:
+    """A WebSocket with its own bounded outbound queue and sender task"""
+
+    def __init__(self, websocket: WebSocket, client_id: str, channel: str,
+                 manager: "ConnectionManager", queue_size: int = SEND_QUEUE_SIZE,
+                 encoding: str = JSON):
+        self.websocket = websocket
+        self.encoding = encoding
+        self.client_id = client_id
+        self.channel = channel
+        self.manager = manager
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.sender_task: Optional[asyncio.Task] = None
+        # Updates that arrived while the queue was full, latest per key, and
+        # the newest message they came in (its type, seq and timestamp are kept)
+        self.backlog: Dict[Hashable, dict] = {}
+        self.backlog_message: Optional[dict] = None
+        # Symbols this client follows; None means every symbol
+        self.symbols: Optional[Set[str]] = None
+        # Heartbeat bookkeeping: last frame from the client, start of a pending send
+        self.last_seen = time.monotonic()
+        self.send_started: Optional[float] = None
+
+    def start(self):
+        self.sender_task = asyncio.create_task(self._send_loop())
+
+    def stop(self):
+        if self.sender_task is not None and self.sender_task is not asyncio.current_task():
+            self.sender_task.cancel()
+
+    async def _send_loop(self):
+        try:
+            while True:
+                if self.backlog and self.queue.empty():
+                    message = self._take_backlog()
+                else:
+                    message = await self.queue.get()
+                self.send_started = time.monotonic()
+                if isinstance(message, bytes):
+                    await self.websocket.send_bytes(message)
+                else:
+                    await self.websocket.send_text(message)
+                self.send_started = None
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Error sending message to client {self.client_id}: {str(e)}")
+            self.manager.disconnect(self.client_id, self.channel, self.websocket)
+
+    def _take_backlog(self) -> Union[str, bytes]:
+        """One frame holding the latest value of every backlogged key"""
+        message = dict(self.backlog_message, data=list(self.backlog.values()))
+        self.backlog = {}
+        self.backlog_message = None
+        return encode_message(message, self.encoding)
+
+    def _merge(self, raw: Optional[dict], key_field: Optional[str]) -> bool:
+        """Fold a message's items into the backlog; False if it has no keyed items"""
+        items = raw.get("data") if raw is not None and key_field else None
+        if not isinstance(items, list) or not all(isinstance(item, dict) and key_field in item for item in items):
+            return False
+        for item in items:
+            self.backlog[item[key_field]] = item
+        self.backlog_message = raw
+        return True
+
+    def enqueue(self, message: Union[str, bytes], policy: str,
+                raw: Optional[dict] = None, key_field: Optional[str] = None) -> bool:
+        """Queue a message without waiting; False if the client must be dropped.
+
+        Under "conflate", once the queue is full, keyed updates (``raw`` with a
+        ``data`` list of items carrying ``key_field``) are merged into a backlog
+        that keeps each key's newest value and goes out as one frame when the
+        queue drains. Unkeyed frames (pings) are dropped instead.
+        """
+        if self.backlog and self._merge(raw, key_field):
+            # Already backlogged: merge so this update can't overtake older ones
+            return True
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self.manager.dropped_messages[self.channel] += 1
+            if policy != "conflate":
+                return False
+            self._merge(raw, key_field)
+            return True
+
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, policies: Optional[Dict[str, str]] = None, queue_size: int = SEND_QUEUE_SIZE):
         # All active connections
-        self.active_connections: Dict[str, Dict[str, WebSocket]] = {
+        self.active_connections: Dict[str, Dict[str, ClientConnection]] = {
             "price_feed": {},  # Price updates
             "trades": {},      # Trade updates
             "positions": {},   # Position updates
             "risk": {}        # Risk alerts
         }
+        self.policies = policies or SLOW_CONSUMER_POLICIES
+        self.queue_size = queue_size
+        self.dropped_messages: Dict[str, int] = defaultdict(int)
+        self.slow_consumer_disconnects: Dict[str, int] = defaultdict(int)
+        # channel -> symbol -> client_id -> connection, for symbol-filtered channels
+        self.symbol_subscribers: Dict[str, Dict[str, Dict[str, ClientConnection]]] = defaultdict(dict)
+        # channel -> client_id -> connection, for clients following every symbol
+        self.all_symbol_subscribers: Dict[str, Dict[str, ClientConnection]] = defaultdict(dict)
+        # Churn gauges
+        self.connects_total: Dict[str, int] = defaultdict(int)
+        self.disconnects_total: Dict[str, int] = defaultdict(int)
+        self.reaped_total: Dict[str, int] = defaultdict(int)
+        self._recent_connects: Dict[str, Deque[float]] = defaultdict(deque)
+        self._recent_disconnects: Dict[str, Deque[float]] = defaultdict(deque)
 
-    async def connect(self, websocket: WebSocket, client_id: str, channel: str):
-        await websocket.accept()
+    async def connect(self, websocket: WebSocket, client_id: str, channel: str,
+                      encoding: str = JSON, subprotocol: Optional[str] = None):
+        await websocket.accept(subprotocol=subprotocol)
         if channel not in self.active_connections:
             self.active_connections[channel] = {}
-        self.active_connections[channel][client_id] = websocket
+        previous = self.active_connections[channel].get(client_id)
+        if previous is not None:
+            self.disconnect(client_id, channel)
+        connection = ClientConnection(websocket, client_id, channel, self, self.queue_size, encoding)
+        connection.start()
+        self.active_connections[channel][client_id] = connection
+        self.all_symbol_subscribers[channel][client_id] = connection
+        self.connects_total[channel] += 1
+        self._recent_connects[channel].append(time.monotonic())
         logger.info(f"Client {client_id} connected to {channel} channel")
 
-    def disconnect(self, client_id: str, channel: str):
-        if channel in self.active_connections and client_id in self.active_connections[channel]:
-            del self.active_connections[channel][client_id]
-            logger.info(f"Client {client_id} disconnected from {channel} channel")
+    def disconnect(self, client_id: str, channel: str, websocket: Optional[WebSocket] = None):
+        connections = self.active_connections.get(channel, {})
+        connection = connections.get(client_id)
+        if connection is None:
+            return
+        if websocket is not None and connection.websocket is not websocket:
+            # A newer socket has taken over this client id
+            return
+        connection.stop()
+        self.unsubscribe(client_id, channel, [ALL_SYMBOLS])
+        del connections[client_id]
+        self.disconnects_total[channel] += 1
+        self._recent_disconnects[channel].append(time.monotonic())
+        logger.info(f"Client {client_id} disconnected from {channel} channel")
+
+    def touch(self, client_id: str, channel: str):
+        """Record that a client just sent us something (pong or any message)"""
+        connection = self.active_connections.get(channel, {}).get(client_id)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+
+    def reap(self, timeout: float) -> int:
+        """Evict connections that went quiet or have a send stuck for `timeout` seconds"""
+        now = time.monotonic()
+        reaped = 0
+        for channel, connections in self.active_connections.items():
+            for client_id, connection in list(connections.items()):
+                idle = now - connection.last_seen > timeout
+                stuck = connection.send_started is not None and now - connection.send_started > timeout
+                if idle or stuck:
+                    logger.info(f"Reaping {'idle' if idle else 'stuck'} client {client_id} from {channel} channel")
+                    self.disconnect(client_id, channel, connection.websocket)
+                    asyncio.create_task(self._close(connection.websocket, code=1001))
+                    self.reaped_total[channel] += 1
+                    reaped += 1
+        return reaped
+
+    def subscribe(self, client_id: str, channel: str, symbols: List[str]) -> Optional[Set[str]]:
+        """Narrow a client to updates for the given symbols; "*" follows every symbol.
+
+        Returns the client's symbols afterwards, None meaning every symbol.
+        """
+        connection = self.active_connections.get(channel, {}).get(client_id)
+        if connection is None:
+            return set()
+        if ALL_SYMBOLS in symbols:
+            self._drop_symbols(connection, channel)
+            connection.symbols = None
+            self.all_symbol_subscribers[channel][client_id] = connection
+            return None
+        if connection.symbols is None:
+            connection.symbols = set()
+            self.all_symbol_subscribers[channel].pop(client_id, None)
+        index = self.symbol_subscribers[channel]
+        for symbol in symbols:
+            symbol = symbol.upper()
+            connection.symbols.add(symbol)
+            index.setdefault(symbol, {})[client_id] = connection
+        return connection.symbols
+
+    def unsubscribe(self, client_id: str, channel: str, symbols: List[str]) -> Optional[Set[str]]:
+        """Stop sending a client updates for the given symbols; "*" stops all of them.
+
+        Dropping a client's last symbol leaves it following none.
+        """
+        connection = self.active_connections.get(channel, {}).get(client_id)
+        if connection is None:
+            return set()
+        if ALL_SYMBOLS in symbols:
+            self._drop_symbols(connection, channel)
+            connection.symbols = set()
+            self.all_symbol_subscribers[channel].pop(client_id, None)
+            return connection.symbols
+        if connection.symbols is None:
+            # There is no list of "every symbol" to remove these from
+            return None
+        self._drop_symbols(connection, channel, [symbol.upper() for symbol in symbols])
+        return connection.symbols
+
+    def _drop_symbols(self, connection: ClientConnection, channel: str, symbols: Optional[List[str]] = None):
+        if not connection.symbols:
+            return
+        index = self.symbol_subscribers[channel]
+        for symbol in list(connection.symbols) if symbols is None else symbols:
+            connection.symbols.discard(symbol)
+            subscribers = index.get(symbol)
+            if subscribers is not None:
+                subscribers.pop(connection.client_id, None)
+                if not subscribers:
+                    del index[symbol]
+
+    def subscriber_counts(self, channel: str, symbols: List[str]) -> Dict[str, int]:
+        """Clients receiving each symbol, counting those that follow every symbol"""
+        index = self.symbol_subscribers[channel]
+        followers = len(self.all_symbol_subscribers[channel])
+        return {symbol: followers + len(index.get(symbol, {})) for symbol in symbols}
+
+    def _enqueue(self, connection: ClientConnection, message: Union[str, bytes], channel: str,
+                 raw: Optional[dict] = None):
+        policy = self.policies.get(channel, "disconnect")
+        if not connection.enqueue(message, policy, raw, CONFLATION_KEYS.get(channel)):
+            logger.warning(f"Dropping slow client {connection.client_id} from {channel} channel")
+            self.slow_consumer_disconnects[channel] += 1
+            self.disconnect(connection.client_id, channel, connection.websocket)
+            asyncio.create_task(self._close(connection.websocket))
+
+    async def _close(self, websocket: WebSocket, code: int = 1008):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
 
     async def broadcast_to_channel(self, message: dict, channel: str):
-        """Broadcast message to all connections in a channel"""
-        if channel not in self.active_connections:
+        """Queue a message for every connection in a channel; never waits on a client"""
+        if not self.active_connections.get(channel):
             return
         
-        dead_connections = []
-        for client_id, connection in self.active_connections[channel].items():
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error sending message to client {client_id}: {str(e)}")
-                dead_connections.append(client_id)
-        
-        # Clean up dead connections
-        for client_id in dead_connections:
-            self.disconnect(client_id, channel)
+        # Serialize once per encoding; subscribers share the encoded frame
+        encoded: Dict[str, Union[str, bytes]] = {}
+        for connection in list(self.active_connections[channel].values()):
+            if connection.encoding not in encoded:
+                encoded[connection.encoding] = encode_message(message, connection.encoding)
+            self._enqueue(connection, encoded[connection.encoding], channel, message)
+
+    async def broadcast_symbol_updates(self, updates: List[dict], build_message, channel: str):
+        """Send each client only the updates for symbols it follows.
+
+        ``build_message`` turns a list of updates into a frame. Clients that
+        follow every symbol get every update; the rest are found through the
+        symbol index, so the cost scales with the subscribers of the changed
+        symbols. Clients are grouped by the exact set of updates they get, so
+        each distinct frame is still encoded once.
+        """
+        if not updates:
+            return
+        index = self.symbol_subscribers[channel]
+
+        per_client: Dict[str, List[int]] = defaultdict(list)
+        subscribers: Dict[str, ClientConnection] = {}
+        for position, update in enumerate(updates):
+            for client_id, connection in index.get(update["symbol"], {}).items():
+                per_client[client_id].append(position)
+                subscribers[client_id] = connection
+
+        frames: Dict[tuple, List[ClientConnection]] = defaultdict(list)
+        everyone = list(self.all_symbol_subscribers[channel].values())
+        if everyone:
+            frames[tuple(range(len(updates)))] = everyone
+        for client_id, positions in per_client.items():
+            frames[tuple(positions)].append(subscribers[client_id])
+
+        for positions, recipients in frames.items():
+            message = build_message([updates[i] for i in positions])
+            encoded: Dict[str, Union[str, bytes]] = {}
+            for connection in recipients:
+                if connection.encoding not in encoded:
+                    encoded[connection.encoding] = encode_message(message, connection.encoding)
+                self._enqueue(connection, encoded[connection.encoding], channel, message)
 
     async def send_personal_message(self, message: dict, client_id: str, channel: str):
-        """Send a message to a specific client in a channel"""
-        if (channel in self.active_connections and 
-            client_id in self.active_connections[channel]):
-            try:
-                await self.active_connections[channel][client_id].send_json(message)
-            except Exception as e:
-                logger.error(f"Error sending personal message to client {client_id}: {str(e)}")
-                self.disconnect(client_id, channel)
+        """Queue a message for a specific client in a channel"""
+        connection = self.active_connections.get(channel, {}).get(client_id)
+        if connection is not None:
+            self._enqueue(connection, encode_message(message, connection.encoding), channel, message)
+
+    def _count_recent(self, events: Deque[float], window: float = 60) -> int:
+        cutoff = time.monotonic() - window
+        while events and events[0] < cutoff:
+            events.popleft()
+        return len(events)
+
+    def get_metrics(self) -> Dict[str, Dict]:
+        """Connection count, churn, queue depth and drops per channel"""
+        metrics = {}
+        for channel, connections in self.active_connections.items():
+            depths = [connection.queue.qsize() for connection in connections.values()]
+            metrics[channel] = {
+                "connections": len(connections),
+                "connects_total": self.connects_total[channel],
+                "disconnects_total": self.disconnects_total[channel],
+                "connects_last_minute": self._count_recent(self._recent_connects[channel]),
+                "disconnects_last_minute": self._count_recent(self._recent_disconnects[channel]),
+                "reaped_total": self.reaped_total[channel],
+                "queued_messages": sum(depths),
+                "backlogged_updates": sum(len(connection.backlog) for connection in connections.values()),
+                "max_queue_depth": max(depths, default=0),
+                "dropped_messages": self.dropped_messages[channel],
+                "slow_consumer_disconnects": self.slow_consumer_disconnects[channel],
+                "policy": self.policies.get(channel, "disconnect"),
+            }
+        return metrics
+
+class Conflator:
+    """Keeps only the latest item per key inside a time window, then flushes them together"""
+
+    def __init__(self, window: float, flush: Callable[[Dict[Hashable, dict]], Awaitable[int]]):
+        self.window = window
+        self.flush = flush
+        self.pending: Dict[Hashable, dict] = {}
+        self.updates_in = 0
+        self.frames_out = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, key: Hashable, item: dict):
+        self.updates_in += 1
+        self.pending[key] = item
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_after_window())
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.window)
+        items, self.pending = self.pending, {}
+        self._task = None
+        try:
+            self.frames_out += await self.flush(items)
+        except Exception as e:
+            logger.error(f"Error flushing conflated updates: {str(e)}")
+
+    def get_metrics(self) -> Dict:
+        return {
+            "window_ms": self.window * 1000,
+            "updates_in": self.updates_in,
+            "frames_out": self.frames_out,
+            "reduction": round(self.updates_in / self.frames_out, 2) if self.frames_out else None,
+        }
+
+def _parse_conflation_windows(value: str) -> Dict[str, float]:
+    """Parse "price_feed=100,positions=100" into seconds per channel"""
+    windows = {}
+    for item in value.split(","):
+        if "=" in item:
+            channel, window_ms = item.split("=", 1)
+            windows[channel.strip()] = float(window_ms) / 1000
+    return windows
+
+# Conflation window per channel, e.g. WS_CONFLATION_WINDOWS="price_feed=100,positions=100" (ms)
+CONFLATION_WINDOWS = _parse_conflation_windows(
+    os.getenv("WS_CONFLATION_WINDOWS", "price_feed=100,positions=100")
+)
 
 class WebSocketManager:
-    def __init__(self):
+    def __init__(self, backplane: Optional[Backplane] = None):
         self.manager = ConnectionManager()
+        self.backplane = backplane or InMemoryBackplane()
+        # Last-value cache and replay buffer for the price feed
+        self.price_cache: Dict[str, dict] = {}
+        self.price_seq_start = random.randrange(1, 1 << 31) * PRICE_SEQ_RANGE  # stays below 2**53 for JS clients
+        self.price_seq = self.price_seq_start
+        self.price_history: Deque[Tuple[int, List[dict]]] = deque(maxlen=PRICE_REPLAY_BUFFER_SIZE)
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        # Per-channel conflation windows; channels without one send immediately
+        self.conflators: Dict[str, Conflator] = {}
+        for channel, window in CONFLATION_WINDOWS.items():
+            self.configure_conflation(channel, window)
+
+    def configure_conflation(self, channel: str, window: float):
+        """Conflate a channel over `window` seconds; 0 turns conflation off"""
+        flushers = {
+            "price_feed": self._flush_price_updates,
+            "positions": self._flush_position_updates,
+        }
+        if channel not in flushers:
+            raise ValueError(f"Conflation is not supported on {channel} channel")
+        if window <= 0:
+            self.conflators.pop(channel, None)
+        else:
+            self.conflators[channel] = Conflator(window, flushers[channel])
+
+    def get_conflation_metrics(self) -> Dict[str, Dict]:
+        return {channel: conflator.get_metrics() for channel, conflator in self.conflators.items()}
+
+    async def start(self, backplane: Optional[Backplane] = None):
+        """Attach to the cross-worker backplane and start the heartbeat"""
+        if backplane is not None:
+            self.backplane = backplane
+        await self.backplane.start(self._deliver)
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        await self.backplane.close()
+
+    async def _heartbeat_loop(self):
+        """Ping every client and evict the ones that stopped answering"""
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                ping = {"type": "ping", "timestamp": datetime.utcnow()}
+                for channel in list(self.manager.active_connections):
+                    await self.manager.broadcast_to_channel(ping, channel)
+                reaped = self.manager.reap(HEARTBEAT_TIMEOUT)
+                if reaped:
+                    logger.info(f"Heartbeat reaped {reaped} dead connections")
+            except Exception as e:
+                logger.error(f"Error in WebSocket heartbeat: {str(e)}")
+
+    async def _deliver(self, envelope: Dict):
+        """Fan a backplane publish out to this worker's sockets"""
+        if envelope.get("client_id") is None:
+            await self.manager.broadcast_to_channel(envelope["message"], envelope["channel"])
+        else:
+            await self.manager.send_personal_message(
+                envelope["message"], envelope["client_id"], envelope["channel"]
+            )
+
+    async def _publish(self, message: dict, channel: str, client_id: Optional[str] = None):
+        envelope = {"channel": channel, "client_id": client_id, "message": message}
+        if self.backplane.deliver is None:
+            # Backplane not started (scripts, tests): deliver in-process only
+            await self._deliver(envelope)
+        else:
+            await self.backplane.publish(envelope)
 
     async def broadcast_price_update(self, token_data: dict):
-        """Broadcast price updates to all connected clients"""
+        """Broadcast one token's price; like batches, its data is a list"""
+        await self.broadcast_price_updates([token_data])
+
+    async def broadcast_price_updates(self, token_updates: List[dict]):
+        """Broadcast one batched frame per client with the changed tokens it follows.
+
+        Every batch gets the next sequence number and is kept in a bounded
+        replay buffer. Prices stay on this worker: every worker runs or
+        follows the feed itself.
+        """
+        if not token_updates:
+            return
+        conflator = self.conflators.get("price_feed")
+        if conflator is not None:
+            for update in token_updates:
+                conflator.add(update["symbol"], update)
+        else:
+            await self._flush_price_updates({update["symbol"]: update for update in token_updates})
+
+    async def _flush_price_updates(self, updates_by_symbol: Dict[Hashable, dict]) -> int:
+        token_updates = list(updates_by_symbol.values())
+        if not token_updates:
+            return 0
+        self.price_seq += 1
+        seq = self.price_seq
+        for update in token_updates:
+            self.price_cache[update["symbol"]] = update
+        self.price_history.append((seq, token_updates))
+        
+        timestamp = datetime.utcnow()
+        await self.manager.broadcast_symbol_updates(
+            token_updates,
+            lambda updates: {
+                "type": "price_update",
+                "data": updates,
+                "seq": seq,
+                "timestamp": timestamp
+            },
+            "price_feed"
+        )
+        return 1
+
+    def _missed_updates(self, since: int) -> Optional[List[dict]]:
+        """Latest value of every token changed after `since`, if still buffered"""
+        if not self.price_seq_start <= since <= self.price_seq:
+            # Issued by another worker or before a restart: it says nothing about this buffer
+            return None
+        if since == self.price_seq:
+            return []
+        if not self.price_history or self.price_history[0][0] > since + 1:
+            return None
+        latest: Dict[str, dict] = {}
+        for seq, updates in self.price_history:
+            if seq > since:
+                for update in updates:
+                    latest[update["symbol"]] = update
+        return list(latest.values())
+
+    async def send_price_snapshot(self, client_id: str, symbols: Optional[List[str]] = None,
+                                  since: Optional[int] = None):
+        """Bring a price client up to date: a resume delta if possible, else a snapshot"""
+        missed = self._missed_updates(since) if since is not None else None
+        if missed is not None:
+            message_type, updates = "price_update", missed
+        else:
+            message_type, updates = "snapshot", list(self.price_cache.values())
+        if symbols:
+            wanted = {symbol.upper() for symbol in symbols}
+            updates = [update for update in updates if update["symbol"] in wanted]
+        
         message = {
-            "type": "price_update",
-            "data": token_data,
-            "timestamp": datetime.utcnow().isoformat()
+            "type": message_type,
+            "data": updates,
+            "seq": self.price_seq,
+            "timestamp": datetime.utcnow()
         }
-        await self.manager.broadcast_to_channel(message, "price_feed")
+        if since is not None:
+            message["resumed_from"] = since if missed is not None else None
+        await self.manager.send_personal_message(message, client_id, "price_feed")
 
     async def broadcast_trade_update(self, trade_data: dict):
-        """Broadcast trade updates to all connected clients"""
+        """Broadcast one trade update; like batches, its data is a list"""
+        await self.broadcast_trade_updates([trade_data])
+
+    async def broadcast_trade_updates(self, trades: List[dict]):
+        """Broadcast trade updates as one trade_update frame.
+
+        ``data`` is always a list of trades, one entry for a single trade.
+        """
+        if not trades:
+            return
         message = {
             "type": "trade_update",
-            "data": trade_data,
-            "timestamp": datetime.utcnow().isoformat()
+            "data": trades,
+            "timestamp": datetime.utcnow()
         }
-        await self.manager.broadcast_to_channel(message, "trades")
+        await self._publish(message, "trades")
 
     async def send_position_update(self, client_id: str, position_data: dict):
-        """Send position update to specific client"""
-        message = {
-            "type": "position_update",
-            "data": position_data,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        await self.manager.send_personal_message(message, client_id, "positions")
+        """Send position update to specific client.
+
+        Frames carry a list of positions; with conflation on, a client gets
+        one frame per window holding the latest state of each position.
+        """
+        conflator = self.conflators.get("positions")
+        if conflator is not None:
+            position_key = position_data.get("position_id", position_data.get("id"))
+            conflator.add((client_id, position_key), position_data)
+        else:
+            await self._flush_position_updates({(client_id, None): position_data})
+
+    async def _flush_position_updates(self, updates: Dict[Hashable, dict]) -> int:
+        by_client: Dict[str, List[dict]] = defaultdict(list)
+        for (client_id, _), position_data in updates.items():
+            by_client[client_id].append(position_data)
+        
+        timestamp = datetime.utcnow()
+        for client_id, positions in by_client.items():
+            message = {
+                "type": "position_update",
+                "data": positions,
+                "timestamp": timestamp
+            }
+            await self._publish(message, "positions", client_id)
+        return len(by_client)
 
     async def send_risk_alert(self, client_id: str, risk_data: dict):
         """Send risk alert to specific client"""
         message = {
             "type": "risk_alert",
             "data": risk_data,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": datetime.utcnow()
         }
-        await self.manager.send_personal_message(message, client_id, "risk")
+        await self._publish(message, "risk", client_id)
 
 # Global WebSocket manager instance
 ws_manager = WebSocketManager()
@@ -0,0 +1,173 @@
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List, Optional
+from datetime import datetime
+import asyncio
+import glob
+import json
+import os
+import socket
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[Dict], Awaitable[None]]
+
+class Backplane(ABC):
+    """Carries WebSocket publishes between app processes.
+
+    Every publish is delivered to this process and to every other process on
+    the same backplane; each process then fans out to its own sockets.
+    """
+
+    def __init__(self):
+        self.deliver: Optional[Deliver] = None
+        self.published = 0
+        self.received = 0
+
+    async def start(self, deliver: Deliver):
+        self.deliver = deliver
+
+    @abstractmethod
+    async def publish(self, envelope: Dict):
+        """Send an envelope to every process, including this one"""
+
+    async def close(self):
+        pass
+
+    def get_metrics(self) -> Dict:
+        return {
+            "backend": type(self).__name__,
+            "published": self.published,
+            "received": self.received,
+        }
+
+class InMemoryBackplane(Backplane):
+    """Single-process backplane: publishes are delivered straight back"""
+
+    async def publish(self, envelope: Dict):
+        self.published += 1
+        if self.deliver is not None:
+            await self.deliver(envelope)
+
+def _encode_envelope(envelope: Dict) -> bytes:
+    def default(value):
+        if isinstance(value, datetime):
+            return {"__datetime__": value.isoformat()}
+        return str(value)
+    return json.dumps(envelope, separators=(",", ":"), default=default).encode()
+
+def _decode_envelope(data: bytes) -> Dict:
+    def object_hook(value):
+        if "__datetime__" in value and len(value) == 1:
+            return datetime.fromisoformat(value["__datetime__"])
+        return value
+    return json.loads(data, object_hook=object_hook)
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, backplane: "UnixSocketBackplane"):
+        self.backplane = backplane
+
+    def datagram_received(self, data: bytes, addr):
+        self.backplane._received(data)
+
+    def error_received(self, exc: Exception):
+        logger.error(f"Backplane socket error: {str(exc)}")
+
+class UnixSocketBackplane(Backplane):
+    """Multi-worker backplane over Unix datagram sockets in a shared directory.
+
+    Each worker binds ``<directory>/<pid>.sock`` and sends every publish to
+    the other sockets it finds there. Datagrams go straight to the peer's
+    receive buffer, so the added latency is one local send; peers whose
+    sockets are gone are pruned, and a full peer buffer drops the message.
+    """
+
+    PEER_REFRESH_INTERVAL = 1.0  # seconds between directory scans
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+        self.path = os.path.join(directory, f"{os.getpid()}.sock")
+        self.dropped = 0
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        self._sender: Optional[socket.socket] = None
+        self._peers: List[str] = []
+        self._peers_refreshed = 0.0
+
+    async def start(self, deliver: Deliver):
+        await super().start(deliver)
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _DatagramProtocol(self), local_addr=self.path, family=socket.AF_UNIX
+        )
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+        logger.info(f"WebSocket backplane listening on {self.path}")
+
+    def _refresh_peers(self):
+        now = time.monotonic()
+        if now - self._peers_refreshed >= self.PEER_REFRESH_INTERVAL:
+            self._peers = [
+                path for path in glob.glob(os.path.join(self.directory, "*.sock"))
+                if path != self.path
+            ]
+            self._peers_refreshed = now
+
+    def _received(self, data: bytes):
+        self.received += 1
+        try:
+            envelope = _decode_envelope(data)
+        except ValueError as e:
+            logger.error(f"Bad backplane message: {str(e)}")
+            return
+        if self.deliver is not None:
+            asyncio.create_task(self.deliver(envelope))
+
+    async def publish(self, envelope: Dict):
+        self.published += 1
+        if self._sender is not None:
+            data = _encode_envelope(envelope)
+            self._refresh_peers()
+            for peer in list(self._peers):
+                try:
+                    self._sender.sendto(data, peer)
+                except (FileNotFoundError, ConnectionRefusedError):
+                    # Worker exited; forget its socket
+                    self._peers.remove(peer)
+                    try:
+                        os.unlink(peer)
+                    except OSError:
+                        pass
+                except (BlockingIOError, OSError) as e:
+                    self.dropped += 1
+                    logger.warning(f"Backplane dropped message to {peer}: {str(e)}")
+        if self.deliver is not None:
+            await self.deliver(envelope)
+
+    async def close(self):
+        if self._transport is not None:
+            self._transport.close()
+        if self._sender is not None:
+            self._sender.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def get_metrics(self) -> Dict:
+        metrics = super().get_metrics()
+        metrics.update({"peers": len(self._peers), "dropped": self.dropped})
+        return metrics
+
+def create_backplane() -> Backplane:
+    """Build the backplane selected by the WS_BACKPLANE environment variable"""
+    kind = os.getenv("WS_BACKPLANE", "memory").lower()
+    if kind == "unix":
+        return UnixSocketBackplane(os.getenv("WS_BACKPLANE_DIR", "/tmp/memefi-ws-backplane"))
+    if kind != "memory":
+        raise ValueError(f"Unknown WebSocket backplane: {kind}")
+    return InMemoryBackplane()
@@ -0,0 +1,101 @@
+from typing import Optional, Tuple, Union
+from datetime import datetime
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+# Compact field names used by the MessagePack encoding
+SHORT_KEYS = {
+    "type": "t",
+    "data": "d",
+    "timestamp": "ts",
+    "symbol": "s",
+    "price": "p",
+    "price_change_24h": "c",
+    "volume_24h": "v",
+    "market_cap": "m",
+    "symbols": "ss",
+    "trade_id": "tid",
+    "user_id": "uid",
+    "token": "tk",
+    "side": "sd",
+    "size": "sz",
+    "leverage": "lv",
+    "status": "st",
+    "pnl": "pl",
+    "entry_price": "ep",
+    "liquidation_price": "lp",
+    "position_id": "pid",
+    "level": "lvl",
+    "score": "sc",
+    "message": "msg",
+    "seq": "q",
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def _compact(value):
+    """Shorten keys and turn datetimes into integer epoch millis"""
+    if isinstance(value, dict):
+        return {SHORT_KEYS.get(key, key): _compact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_compact(item) for item in value]
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.replace(tzinfo=None) - value.utcoffset()
+        return int((value - _EPOCH).total_seconds() * 1000)
+    return value
+
+def encode_message(message: dict, encoding: str = JSON) -> Union[str, bytes]:
+    """Encode an outgoing message once for every client using the same encoding.
+
+    JSON (the default) is text with ISO timestamps. MessagePack is binary
+    with short keys (see SHORT_KEYS) and integer epoch-millis timestamps.
+    """
+    if encoding == MSGPACK:
+        return msgpack.packb(_compact(message), default=str)
+    if orjson is not None:
+        return orjson.dumps(
+            message, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        ).decode()
+    return json.dumps(message, separators=(",", ":"), default=_json_default)
+
+def negotiate_encoding(websocket) -> Tuple[str, Optional[str]]:
+    """Pick the client's encoding from ``?encoding=`` or the WebSocket subprotocol.
+
+    Returns the encoding and the subprotocol to echo back on accept, if any.
+    Falls back to JSON when MessagePack is requested but not installed.
+    """
+    requested = websocket.query_params.get("encoding", "").lower()
+    offered = [
+        protocol.strip().lower()
+        for protocol in websocket.headers.get("sec-websocket-protocol", "").split(",")
+        if protocol.strip()
+    ]
+    subprotocol = MSGPACK if MSGPACK in offered else None
+
+    if MSGPACK in (requested, subprotocol):
+        if msgpack is None:
+            logger.warning("Client asked for MessagePack but msgpack is not installed")
+            return JSON, None
+        return MSGPACK, subprotocol
+    return JSON, None
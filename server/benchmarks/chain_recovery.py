@@ -0,0 +1,112 @@
+"""Mock chain journal: group-commit write throughput and restart time.
+
+Journals synthetic trades (order, position and balances events, with some
+positions closed later), takes a snapshot part-way through, then times how
+long a fresh MockChainService takes to load the snapshot and replay the
+tail of the log:
+
+    python -m benchmarks.chain_recovery --events 3000000 --snapshot-at 0.8
+
+Pass --snapshot-at 0 to time a replay of the whole log instead.
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from app.services.chain_latency import ZeroLatency
+from app.services.mock_chain import MockChainService
+
+TOKENS = ["INJ", "PEPE", "DOGE"]
+
+def trade(chain: MockChainService, rng: random.Random, wallets: int):
+    """One filled market order: order, position and balances events"""
+    wallet = f"wallet_{rng.randrange(wallets)}"
+    token = rng.choice(TOKENS)
+    side = rng.choice(("BUY", "SELL"))
+    price = rng.uniform(1, 100)
+    order_id = f"order_{len(chain.orders) + 1}"
+    order = {
+        "id": order_id, "wallet_address": wallet, "user_id": wallet, "token": token, "type": "MARKET",
+        "side": side, "size": 10.0, "price": price, "leverage": 1, "stop_loss": None, "take_profit": None,
+        "status": "FILLED", "filled_size": 10.0, "avg_fill_price": price, "timestamp": datetime.utcnow(),
+    }
+    chain.orders[order_id] = order
+    chain._wallet_orders[wallet][order_id] = order
+    position = chain._open_position(wallet, token, side, 10.0, price, 1)
+    order["position_id"] = position["id"]
+    chain.balances.setdefault(wallet, {"USDT": 10000.0})["USDT"] -= 10.0 * price
+    chain._log_order(order)
+    chain._log_position(position)
+    chain._log_balances(wallet)
+
+async def write(chain: MockChainService, args) -> float:
+    rng = random.Random(args.seed)
+    snapshot_lsn = int(args.events * args.snapshot_at)
+    journal = chain.journal
+    steps = 0
+    started = time.perf_counter()
+    while journal.lsn < args.events:
+        steps += 1
+        if args.close_ratio and rng.random() < args.close_ratio and chain.positions:
+            position = chain.positions[f"pos_{rng.randrange(len(chain.positions)) + 1}"]
+            if position.get("status") is None:
+                chain._retire_position(position, "CLOSED")
+        else:
+            trade(chain, rng, args.wallets)
+        if snapshot_lsn and journal.lsn >= snapshot_lsn and not journal.snapshots:
+            await chain._snapshot()
+        if steps % args.batch == 0:
+            # Let the flusher commit what this burst of requests produced
+            await asyncio.sleep(0)
+    await journal.sync()
+    return time.perf_counter() - started
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+async def run(args):
+    directory = args.dir or tempfile.mkdtemp(prefix="memefi-chain-bench-")
+    try:
+        chain = MockChainService(ZeroLatency())
+        await chain.start(directory)
+        chain.journal.snapshot_every = args.events * 10  # snapshots are placed by --snapshot-at
+        elapsed = await write(chain, args)
+        metrics = chain.journal.get_metrics()
+        await chain.stop()
+        print(f"journaled {metrics['lsn']:,} events in {elapsed:.1f}s ({metrics['lsn'] / elapsed:,.0f} events/s), "
+              f"{metrics['fsyncs']:,} fsyncs ({metrics['events_per_fsync']} events each), "
+              f"{directory_size(directory) / 1e6:,.0f} MB on disk")
+        positions = len(chain.positions)
+        del chain
+
+        restarted = MockChainService(ZeroLatency())
+        started = time.perf_counter()
+        stats = await restarted.start(directory)
+        elapsed = time.perf_counter() - started
+        await restarted.stop()
+        print(f"restart: {elapsed:.2f}s total, {stats['seconds']:.2f}s reading "
+              f"({stats['snapshot_records']:,} snapshot records + {stats['replayed_events']:,} replayed events), "
+              f"{elapsed - stats['seconds']:.2f}s rebuilding indexes")
+        assert len(restarted.positions) == positions
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=3000000)
+    parser.add_argument("--wallets", type=int, default=100000)
+    parser.add_argument("--snapshot-at", type=float, default=0.8, help="fraction of the events before the snapshot")
+    parser.add_argument("--close-ratio", type=float, default=0.2, help="share of steps that close a position")
+    parser.add_argument("--batch", type=int, default=300, help="steps between event loop yields")
+    parser.add_argument("--dir", default="", help="journal directory to keep (default: a temporary one)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Order book throughput: limit, market and cancel operations per second.
+
+Replays a random order flow against one OrderBook on a single core; prices
+random-walk around a mid so levels are constantly created and emptied:
+
+    python -m benchmarks.order_book --operations 1000000
+"""
+import argparse
+import random
+import time
+from app.services.order_book import BUY, SELL, OrderBook
+
+def generate_flow(operations: int, seed: int, levels: int, market_share: float, cancel_share: float):
+    """Pre-generate the operations so only the book is timed"""
+    rng = random.Random(seed)
+    flow = []
+    mid = 100.0
+    live = []
+    for i in range(operations):
+        mid = max(mid + rng.choice((-0.01, 0, 0.01)), 1.0)
+        roll = rng.random()
+        if roll < cancel_share and live:
+            index = rng.randrange(len(live))
+            live[index], live[-1] = live[-1], live[index]
+            flow.append(("cancel", live.pop()))
+        elif roll < cancel_share + market_share:
+            flow.append(("market", f"o{i}", rng.choice((BUY, SELL)), rng.randint(1, 20)))
+        else:
+            side = rng.choice((BUY, SELL))
+            offset = rng.randint(0, levels) * 0.01
+            price = round(mid - offset if side == BUY else mid + offset, 2)
+            flow.append(("limit", f"o{i}", side, price, rng.randint(1, 20)))
+            live.append(f"o{i}")
+    return flow
+
+def run(flow) -> float:
+    book = OrderBook("BENCH")
+    limit, market, cancel = book.limit, book.market, book.cancel
+    started = time.perf_counter()
+    for operation in flow:
+        kind = operation[0]
+        if kind == "limit":
+            limit(operation[1], operation[2], operation[3], operation[4])
+        elif kind == "market":
+            market(operation[1], operation[2], operation[3])
+        else:
+            cancel(operation[1])
+    elapsed = time.perf_counter() - started
+    print(f"  resting orders at end: {len(book.orders)}, "
+          f"levels: {len(book.bids.levels)} bids / {len(book.asks.levels)} asks")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--operations", type=int, default=1000000)
+    parser.add_argument("--levels", type=int, default=50, help="limit prices spread over this many ticks")
+    parser.add_argument("--market-share", type=float, default=0.1)
+    parser.add_argument("--cancel-share", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    flow = generate_flow(args.operations, args.seed, args.levels, args.market_share, args.cancel_share)
+    counts = {}
+    for operation in flow:
+        counts[operation[0]] = counts.get(operation[0], 0) + 1
+    print(f"{args.operations} operations: " + ", ".join(f"{n} {kind}" for kind, n in sorted(counts.items())))
+    elapsed = run(flow)
+    print(f"  {elapsed:.2f}s, {args.operations / elapsed:,.0f} operations/s "
+          f"({elapsed / args.operations * 1e6:.2f} us each)")
+
+if __name__ == "__main__":
+    main()
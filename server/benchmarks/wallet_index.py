@@ -0,0 +1,96 @@
+"""Per-wallet lookups on the mock chain: full scans vs wallet indexes.
+
+Fills a MockChainService with synthetic positions and orders, then times
+get_positions/get_orders for random wallets against the original scan
+over every position and order in the process:
+
+    python -m benchmarks.wallet_index --positions 1000000 --wallets 100000
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime
+from app.services.chain_latency import ZeroLatency
+from app.services.mock_chain import MockChainService
+
+TOKENS = ["INJ", "PEPE", "DOGE"]
+
+def populate(chain: MockChainService, positions: int, wallets: int, seed: int):
+    rng = random.Random(seed)
+    for i in range(positions):
+        wallet = f"wallet_{rng.randrange(wallets)}"
+        token = rng.choice(TOKENS)
+        side = rng.choice(("BUY", "SELL"))
+        position = chain._open_position(wallet, token, side, 10.0, 1.0, 1)
+        # One order per position, as the order flow would leave behind
+        order_id = f"order_{i + 1}"
+        order = {
+            "id": order_id, "wallet_address": wallet, "token": token, "side": side,
+            "status": "FILLED", "position_id": position["id"], "timestamp": datetime.utcnow(),
+        }
+        chain.orders[order_id] = order
+        chain._wallet_orders[wallet][order_id] = order
+
+def scan_positions(chain: MockChainService, wallet_address: str):
+    """The original get_positions"""
+    return {
+        pos_id: pos for pos_id, pos in chain.positions.items()
+        if pos["wallet_address"] == wallet_address and pos.get("status") != "CLOSED"
+    }
+
+def scan_orders(chain: MockChainService, wallet_address: str):
+    """The original get_orders"""
+    return {
+        order_id: order for order_id, order in chain.orders.items()
+        if order["wallet_address"] == wallet_address
+    }
+
+def time_lookups(lookup, wallets, repeat: int) -> float:
+    started = time.perf_counter()
+    for wallet in wallets[:repeat]:
+        lookup(wallet)
+    return (time.perf_counter() - started) / repeat
+
+async def run(args):
+    chain = MockChainService(ZeroLatency())
+    started = time.perf_counter()
+    populate(chain, args.positions, args.wallets, args.seed)
+    print(f"{args.positions} positions and orders over {args.wallets} wallets "
+          f"(built in {time.perf_counter() - started:.1f}s)")
+
+    rng = random.Random(args.seed + 1)
+    wallets = [f"wallet_{rng.randrange(args.wallets)}" for _ in range(args.lookups)]
+
+    scan = time_lookups(lambda wallet: scan_positions(chain, wallet), wallets, args.scans)
+    started = time.perf_counter()
+    for wallet in wallets:
+        await chain.get_positions(wallet)
+    indexed = (time.perf_counter() - started) / len(wallets)
+    print(f"  get_positions: scan {scan * 1000:9.3f} ms   indexed {indexed * 1000:9.4f} ms"
+          f"   ({scan / indexed:,.0f}x)")
+
+    scan = time_lookups(lambda wallet: scan_orders(chain, wallet), wallets, args.scans)
+    started = time.perf_counter()
+    for wallet in wallets:
+        await chain.get_orders(wallet)
+    indexed = (time.perf_counter() - started) / len(wallets)
+    print(f"  get_orders:    scan {scan * 1000:9.3f} ms   indexed {indexed * 1000:9.4f} ms"
+          f"   ({scan / indexed:,.0f}x)")
+
+    started = time.perf_counter()
+    counts = {token: len(chain.open_positions_for_token(token)) for token in TOKENS}
+    print(f"  open positions per token: {counts} in {(time.perf_counter() - started) * 1e6:.1f} us")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--positions", type=int, default=1000000)
+    parser.add_argument("--wallets", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=10000, help="indexed lookups to time")
+    parser.add_argument("--scans", type=int, default=20, help="full-scan lookups to time")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""CPU per broadcast with and without serialize-once encoding.
+
+Fans a batched price_update frame out to in-process fake sockets, so only
+the server-side cost (encoding, queueing, sender tasks) is measured:
+
+    python -m benchmarks.ws_broadcast --connections 10000 --broadcasts 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from app.services.websocket import ConnectionManager
+
+class NullWebSocket:
+    """Accepts frames and throws them away, like an infinitely fast client"""
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, data: str):
+        pass
+
+    async def send_json(self, data: dict):
+        # What Starlette's send_json does before sending
+        json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+def make_message(tokens: int) -> dict:
+    return {
+        "type": "price_update",
+        "data": [
+            {
+                "symbol": f"TKN{i}",
+                "price": 0.000123 * (i + 1),
+                "price_change_24h": 1.5,
+                "volume_24h": 1234567.0,
+                "market_cap": 987654321.0,
+            }
+            for i in range(tokens)
+        ],
+        "timestamp": datetime.utcnow().isoformat(),
+    }
+
+async def drain(manager: ConnectionManager, channel: str):
+    while any(c.queue.qsize() for c in manager.active_connections[channel].values()):
+        await asyncio.sleep(0)
+
+async def per_client_encoding(sockets, message, broadcasts: int) -> float:
+    """The original fan-out: send_json re-encodes the message for every client"""
+    started = time.process_time()
+    for _ in range(broadcasts):
+        for websocket in sockets:
+            await websocket.send_json(message)
+    return (time.process_time() - started) / broadcasts
+
+async def encode_once(manager: ConnectionManager, message, broadcasts: int) -> float:
+    started = time.process_time()
+    for _ in range(broadcasts):
+        await manager.broadcast_to_channel(message, "price_feed")
+        await drain(manager, "price_feed")
+    return (time.process_time() - started) / broadcasts
+
+async def run(connections: int, broadcasts: int, tokens: int):
+    manager = ConnectionManager()
+    sockets = [NullWebSocket() for _ in range(connections)]
+    for i, websocket in enumerate(sockets):
+        await manager.connect(websocket, f"client-{i}", "price_feed")
+    message = make_message(tokens)
+
+    before = await per_client_encoding(sockets, message, broadcasts)
+    after = await encode_once(manager, message, broadcasts)
+    print(f"{connections} connections, {tokens} tokens per frame, {broadcasts} broadcasts")
+    print(f"  per-client json.dumps: {before * 1000:8.1f} ms CPU per broadcast")
+    print(f"  encode once + queues:  {after * 1000:8.1f} ms CPU per broadcast")
+    print(f"  speedup: {before / after:.1f}x")
+
+    for i in range(connections):
+        manager.disconnect(f"client-{i}", "price_feed")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--broadcasts", type=int, default=20)
+    parser.add_argument("--tokens", type=int, default=20)
+    args = parser.parse_args()
+    logging.getLogger("app.services.websocket").setLevel(logging.WARNING)
+    asyncio.run(run(args.connections, args.broadcasts, args.tokens))
+
+if __name__ == "__main__":
+    main()
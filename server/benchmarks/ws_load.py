@@ -0,0 +1,378 @@
+"""WebSocket fan-out under load: thousands of clients across every channel.
+
+Serves the WebSocket routes from a uvicorn child process, connects clients
+spread over the four channels from one or more client processes, and drives
+synthetic price ticks, trades, position updates and risk alerts from inside
+the server while the clients measure what arrives:
+
+    python -m benchmarks.ws_load --clients 5000 --duration 30
+    python -m benchmarks.ws_load --clients 20000 --client-processes 4
+
+Reports delivery latency percentiles and messages per second per channel,
+server memory per connection and dropped messages. Every payload carries the
+time the driver produced it, so latency includes conflation and queueing.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import random
+import resource
+import time
+from typing import Dict, List, Optional
+import aiohttp
+
+CHANNELS = ("price_feed", "trades", "positions", "risk")
+PATHS = {
+    "price_feed": "/ws/price-feed",
+    "trades": "/ws/trades/{user}",
+    "positions": "/ws/positions/{user}",
+    "risk": "/ws/risk/{user}",
+}
+PONG = json.dumps({"type": "pong"})
+
+def raise_fd_limit():
+    """Thousands of sockets need more file descriptors than the usual 1024"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def rss_bytes() -> int:
+    """Resident memory of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # Not Linux: peak RSS is the best we have (KiB on Linux, bytes on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+# Server side
+
+async def drive(users: List[str], tokens: int, tick_interval: float, duration: float,
+                trades_per_second: float, positions_per_second: float, risk_per_second: float):
+    """Publish synthetic traffic through the real WebSocketManager"""
+    from app.services.websocket import ws_manager
+
+    symbols = [f"TKN{i}" for i in range(tokens)]
+    prices = {symbol: 1.0 for symbol in symbols}
+    owed = {"trades": 0.0, "positions": 0.0, "risk": 0.0}
+    deadline = time.monotonic() + duration
+    trade_id = 0
+
+    while time.monotonic() < deadline:
+        sent_at = time.time()
+        rows = []
+        for symbol in symbols:
+            prices[symbol] *= 1 + random.gauss(0, 0.002)
+            rows.append({
+                "symbol": symbol,
+                "price": prices[symbol],
+                "price_change_24h": 0.0,
+                "volume_24h": 0.0,
+                "market_cap": 0.0,
+                "sent_at": sent_at,
+            })
+        await ws_manager.broadcast_price_updates(rows)
+
+        owed["trades"] += trades_per_second * tick_interval
+        owed["positions"] += positions_per_second * tick_interval
+        owed["risk"] += risk_per_second * tick_interval
+        while owed["trades"] >= 1:
+            owed["trades"] -= 1
+            trade_id += 1
+            await ws_manager.broadcast_trade_update({
+                "trade_id": trade_id,
+                "user_id": random.choice(users),
+                "token": random.choice(symbols),
+                "side": random.choice(("long", "short")),
+                "size": 100.0,
+                "sent_at": sent_at,
+            })
+        while owed["positions"] >= 1:
+            owed["positions"] -= 1
+            await ws_manager.send_position_update(random.choice(users), {
+                "position_id": random.randrange(10),
+                "token": random.choice(symbols),
+                "pnl": random.uniform(-50, 50),
+                "sent_at": sent_at,
+            })
+        while owed["risk"] >= 1:
+            owed["risk"] -= 1
+            await ws_manager.send_risk_alert(random.choice(users), {
+                "level": "warning",
+                "message": "Synthetic load-test alert",
+                "sent_at": sent_at,
+            })
+        await asyncio.sleep(max(tick_interval - (time.time() - sent_at), 0))
+
+def serve(host: str, port: int, users: List[str], options: Dict):
+    """Child process: the app's WebSocket routes plus load-test control endpoints"""
+    import uvicorn
+    from fastapi import FastAPI
+    from app.api.v1 import websocket
+    from app.services.websocket import ws_manager
+
+    raise_fd_limit()
+    logging.getLogger("app.services.websocket").setLevel(logging.WARNING)
+    app = FastAPI()
+    app.include_router(websocket.router)
+
+    @app.on_event("startup")
+    async def startup():
+        await ws_manager.start()
+
+    @app.get("/load/stats")
+    async def stats():
+        return {
+            "rss": rss_bytes(),
+            "channels": ws_manager.manager.get_metrics(),
+            "conflation": ws_manager.get_conflation_metrics(),
+        }
+
+    @app.post("/load/drive")
+    async def start_driving():
+        await drive(users, **options)
+        return {"status": "done"}
+
+    uvicorn.run(app, host=host, port=port, log_level="warning", backlog=8192)
+
+# Client side
+
+class ChannelStats:
+    def __init__(self):
+        self.connected = 0
+        self.failed = 0
+        self.closed_by_server = 0
+        self.messages = 0
+        self.seq_gaps = 0
+        self.latencies: List[float] = []
+
+    def merge(self, other: "ChannelStats"):
+        self.connected += other.connected
+        self.failed += other.failed
+        self.closed_by_server += other.closed_by_server
+        self.messages += other.messages
+        self.seq_gaps += other.seq_gaps
+        self.latencies.extend(other.latencies)
+
+async def run_client(session: aiohttp.ClientSession, url: str, stats: ChannelStats,
+                     recording: asyncio.Event, stopping: asyncio.Event):
+    try:
+        ws = await session.ws_connect(url, autoping=True, max_msg_size=0)
+    except (aiohttp.ClientError, OSError, asyncio.TimeoutError):
+        stats.failed += 1
+        return
+    stats.connected += 1
+    last_seq: Optional[int] = None
+    async for frame in ws:
+        if frame.type != aiohttp.WSMsgType.TEXT:
+            break
+        received = time.time()
+        message = json.loads(frame.data)
+        kind = message.get("type")
+        if kind == "ping":
+            await ws.send_str(PONG)
+            continue
+        if not recording.is_set() or stopping.is_set():
+            last_seq = message.get("seq", last_seq)
+            continue
+
+        if kind == "price_update":
+            seq = message.get("seq")
+            if last_seq is not None and seq is not None and seq > last_seq + 1:
+                stats.seq_gaps += seq - last_seq - 1
+            last_seq = seq
+        items = message.get("data")
+        items = items if isinstance(items, list) else [items]
+        for item in items:
+            if isinstance(item, dict) and "sent_at" in item:
+                stats.latencies.append(received - item["sent_at"])
+        stats.messages += 1
+    if not stopping.is_set():
+        stats.closed_by_server += 1
+    await ws.close()
+
+async def client_main(base_url: str, assignments: List[tuple], connect_concurrency: int,
+                      events: "multiprocessing.Queue", go, stop) -> Dict[str, ChannelStats]:
+    stats = {channel: ChannelStats() for channel in CHANNELS}
+    recording, stopping = asyncio.Event(), asyncio.Event()
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=None, connect=60)
+    loop = asyncio.get_running_loop()
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        tasks = []
+        for start in range(0, len(assignments), connect_concurrency):
+            for channel, user in assignments[start:start + connect_concurrency]:
+                url = base_url + PATHS[channel].format(user=user)
+                tasks.append(asyncio.create_task(
+                    run_client(session, url, stats[channel], recording, stopping)
+                ))
+            # Let this batch finish its handshakes before opening the next
+            while sum(s.connected + s.failed for s in stats.values()) < len(tasks):
+                await asyncio.sleep(0.01)
+        events.put(("connected", sum(s.connected for s in stats.values())))
+
+        await loop.run_in_executor(None, go.wait)
+        recording.set()
+        await loop.run_in_executor(None, stop.wait)
+        stopping.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return stats
+
+def client_process(base_url: str, assignments: List[tuple], connect_concurrency: int,
+                   events, go, stop, results):
+    raise_fd_limit()
+    stats = asyncio.run(client_main(base_url, assignments, connect_concurrency, events, go, stop))
+    results.put(stats)
+
+# Orchestration
+
+async def fetch_json(url: str, method: str = "GET", retries: int = 100) -> Dict:
+    for _ in range(retries):
+        try:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None)) as session:
+                async with session.request(method, url) as response:
+                    return await response.json()
+        except aiohttp.ClientConnectionError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"Load-test server did not answer at {url}")
+
+def plan_clients(clients: int, mix: Dict[str, float]) -> List[tuple]:
+    """(channel, user id) per client; user channels are keyed by user id"""
+    total = sum(mix.values())
+    assignments = []
+    for channel in CHANNELS:
+        count = round(clients * mix.get(channel, 0) / total)
+        assignments.extend((channel, f"load-{i}") for i in range(count))
+    random.shuffle(assignments)
+    return assignments
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parse "price_feed=70,trades=10,positions=10,risk=10" into channel weights"""
+    mix = {}
+    for item in value.split(","):
+        channel, weight = item.split("=", 1)
+        if channel.strip() not in CHANNELS:
+            raise argparse.ArgumentTypeError(f"Unknown channel: {channel}")
+        mix[channel.strip()] = float(weight)
+    return mix
+
+def report(args, stats: Dict[str, ChannelStats], server_before: Dict, server_connected: Dict,
+           server_after: Dict, elapsed: float):
+    connected = sum(s.connected for s in stats.values())
+    print(f"{connected} clients connected ({sum(s.failed for s in stats.values())} failed), "
+          f"{args.tokens} tokens every {args.tick_interval * 1000:.0f} ms, {elapsed:.1f}s recorded")
+    print(f"{'channel':<11}{'clients':>8}{'msgs/s':>11}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'p99 ms':>9}{'max ms':>9}{'gaps':>7}{'dropped':>9}{'closed':>8}")
+    for channel in CHANNELS:
+        s = stats[channel]
+        latencies = sorted(s.latencies)
+        server = server_after["channels"].get(channel, {})
+        dropped = server.get("dropped_messages", 0)
+        print(f"{channel:<11}{s.connected:>8}{s.messages / elapsed:>11.0f}"
+              f"{percentile(latencies, 0.50) * 1000:>9.1f}{percentile(latencies, 0.95) * 1000:>9.1f}"
+              f"{percentile(latencies, 0.99) * 1000:>9.1f}{(latencies[-1] if latencies else 0) * 1000:>9.1f}"
+              f"{s.seq_gaps:>7}{dropped:>9}{s.closed_by_server:>8}")
+
+    total_messages = sum(s.messages for s in stats.values())
+    print(f"total: {total_messages / elapsed:.0f} msgs/s delivered")
+    if connected:
+        per_connection = (server_connected["rss"] - server_before["rss"]) / connected
+        print(f"server memory: {per_connection / 1024:.1f} KiB per connection "
+              f"({server_after['rss'] / 2 ** 20:.0f} MiB RSS after the run)")
+    slow = sum(c.get("slow_consumer_disconnects", 0) for c in server_after["channels"].values())
+    print(f"slow-consumer disconnects: {slow}")
+    for channel, metrics in server_after.get("conflation", {}).items():
+        print(f"conflation {channel}: {metrics['updates_in']} updates -> {metrics['frames_out']} frames")
+
+async def run(args):
+    assignments = plan_clients(args.clients, parse_mix(args.mix))
+    # Only address users that have sockets, so every publish reaches someone
+    users = sorted({user for channel, user in assignments if channel != "price_feed"}) or ["load-0"]
+    base_url = f"http://{args.host}:{args.port}"
+    options = {
+        "tokens": args.tokens,
+        "tick_interval": args.tick_interval,
+        "duration": args.duration,
+        "trades_per_second": args.trades_per_second,
+        "positions_per_second": args.positions_per_second,
+        "risk_per_second": args.risk_per_second,
+    }
+    context = multiprocessing.get_context("spawn")
+    server = context.Process(target=serve, args=(args.host, args.port, users, options), daemon=True)
+    server.start()
+    try:
+        server_before = await fetch_json(f"{base_url}/load/stats")
+
+        events, results = context.Queue(), context.Queue()
+        go, stop = context.Event(), context.Event()
+        workers = []
+        for i in range(args.client_processes):
+            share = assignments[i::args.client_processes]
+            worker = context.Process(
+                target=client_process,
+                args=(f"ws://{args.host}:{args.port}", share, args.connect_concurrency,
+                      events, go, stop, results),
+                daemon=True,
+            )
+            worker.start()
+            workers.append(worker)
+        loop = asyncio.get_running_loop()
+        for _ in workers:
+            await loop.run_in_executor(None, events.get)
+        await asyncio.sleep(1)  # let snapshots and handshakes settle
+        server_connected = await fetch_json(f"{base_url}/load/stats")
+
+        go.set()
+        started = time.monotonic()
+        await fetch_json(f"{base_url}/load/drive", method="POST")
+        await asyncio.sleep(args.drain)
+        elapsed = time.monotonic() - started
+        server_after = await fetch_json(f"{base_url}/load/stats")
+        stop.set()
+
+        stats = {channel: ChannelStats() for channel in CHANNELS}
+        for _ in workers:
+            process_stats = await loop.run_in_executor(None, results.get)
+            for channel in CHANNELS:
+                stats[channel].merge(process_stats[channel])
+        for worker in workers:
+            worker.join()
+        report(args, stats, server_before, server_connected, server_after, elapsed)
+    finally:
+        server.terminate()
+        server.join()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--client-processes", type=int, default=1)
+    parser.add_argument("--mix", default="price_feed=70,trades=10,positions=10,risk=10",
+                        help="relative share of clients per channel")
+    parser.add_argument("--connect-concurrency", type=int, default=200,
+                        help="handshakes in flight per client process")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of synthetic traffic")
+    parser.add_argument("--drain", type=float, default=1,
+                        help="seconds to keep recording after the driver stops")
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--tick-interval", type=float, default=0.1, help="seconds between price ticks")
+    parser.add_argument("--trades-per-second", type=float, default=50)
+    parser.add_argument("--positions-per-second", type=float, default=200)
+    parser.add_argument("--risk-per-second", type=float, default=10)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    raise_fd_limit()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
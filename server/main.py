@@ -1,9 +1,12 @@
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from app.api.v1 import trading
+from app.api.v1 import trading, websocket
 from app.models.database import get_db, engine, Base
+from app.services.mock_chain import mock_chain
 from app.services.price_feed import start_price_feed
+from app.services.websocket import ws_manager
+from app.services.ws_backplane import create_backplane
 import uvicorn
 
 # Create database tables
@@ -22,6 +25,7 @@ app.add_middleware(
 
 # Include routers
 app.include_router(trading.router, prefix="/api/v1/trading", tags=["trading"])
+app.include_router(websocket.router, tags=["websocket"])
 
 # Health check endpoint
 @app.get("/health")
@@ -31,7 +35,14 @@ async def health_check(db: Session = Depends(get_db)):
 @app.on_event("startup")
 async def startup_event():
     """Start the price feed service when the application starts"""
+    await mock_chain.start()
+    await ws_manager.start(create_backplane())
     start_price_feed()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await ws_manager.stop()
+    await mock_chain.stop()
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,67 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.api.v1 import trading as trading_api
+from app.models.database import Base, get_db
+from app.models.models import Token, TokenType, User
+from app.services import trading
+from app.services.chain_latency import ZeroLatency
+from app.services.mock_chain import MockChainService
+from app.services.position_view import OpenPositionView
+
+WALLET = "0xwallet"
+
+def batch(*sides: str) -> dict:
+    """A batch request body of 10 PEPE per side"""
+    return {
+        "user_id": "1",
+        "wallet_address": WALLET,
+        "trades": [{"token": "PEPE", "side": side, "size": 10, "price": 10.0} for side in sides],
+    }
+
+@pytest.fixture
+def session_factory():
+    """Sessions on a fresh in-memory SQLite database with every table"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    session.add(User(id=1, wallet_address=WALLET))
+    session.add(Token(
+        id=1, symbol="PEPE", name="Pepe", token_type=TokenType.MEME,
+        contract_address="0xpepe", decimals=18, current_price=10.0
+    ))
+    session.commit()
+    yield session
+    session.close()
+
+@pytest.fixture
+def chain(monkeypatch, session_factory):
+    """A private mock chain and position view wired into the trading service"""
+    chain = MockChainService(latency=ZeroLatency())
+    chain.update_market("PEPE", 10.0)
+    view = OpenPositionView(chain)
+    view.loaded = True
+    monkeypatch.setattr(trading, "mock_chain", chain)
+    monkeypatch.setattr(trading, "position_view", view)
+    monkeypatch.setattr(trading, "SessionLocal", session_factory)
+    return chain
+
+@pytest.fixture
+def client(db, chain):
+    """An HTTP client for the trading API on the test database and chain"""
+    app = FastAPI()
+    app.include_router(trading_api.router, prefix="/api/v1/trading")
+    app.dependency_overrides[get_db] = lambda: db
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
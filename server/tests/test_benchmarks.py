@@ -0,0 +1,7 @@
+from benchmarks import ws_broadcast
+
+async def test_ws_broadcast_benchmark_runs(capsys):
+    await ws_broadcast.run(connections=3, broadcasts=2, tokens=2)
+    output = capsys.readouterr().out
+    assert "3 connections, 2 tokens per frame, 2 broadcasts" in output
+    assert "speedup" in output
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+from app.models.models import MarketData
+from app.services import price_feed
+from app.services.candles import CandleAggregator
+
+def tick(price: float, volume: float) -> dict:
+    return {"PEPE": {"usd": price, "usd_24h_change": 0.0, "usd_24h_vol": volume, "usd_market_cap": 0.0}}
+
+def test_replayed_ticks_flush_on_the_replay_clock(db, monkeypatch):
+    aggregator = CandleAggregator({"1m": 60})
+    monkeypatch.setattr(price_feed, "candle_aggregator", aggregator)
+    price_feed.invalidate_token_id_cache()
+
+    # A recording from long ago, ten ticks inside one minute, then the next minute
+    start = datetime(2024, 3, 1, 12, 0, 0)
+    for second in range(10):
+        price_feed.write_price_updates(db, tick(1.0 + second, 1000.0 + second), start + timedelta(seconds=second * 5))
+    assert db.query(MarketData).count() == 0
+
+    price_feed.write_price_updates(db, tick(20.0, 1100.0), start + timedelta(minutes=1))
+
+    bars = db.query(MarketData).all()
+    assert len(bars) == 1
+    bar = bars[0]
+    assert bar.timestamp == start
+    assert (bar.open, bar.high, bar.low, bar.close) == (1.0, 10.0, 1.0, 10.0)
+    assert bar.volume == 9.0
+    assert aggregator.get_open_bar(1, "1m")["timestamp"] == start + timedelta(minutes=1)
+
+def test_close_expired_without_new_ticks():
+    aggregator = CandleAggregator({"1m": 60})
+    start = datetime(2024, 3, 1, 12, 0, 0)
+    aggregator.add_tick(1, 1.0, 0.0, start)
+
+    aggregator.close_expired(start + timedelta(seconds=59))
+    assert aggregator.drain_closed() == []
+    aggregator.close_expired(start + timedelta(seconds=60))
+    assert [bar["timestamp"] for bar in aggregator.drain_closed()] == [start]
+
+def test_bar_volume_is_traded_volume_not_the_24h_total():
+    aggregator = CandleAggregator({"1m": 60})
+    start = datetime(2024, 3, 1, 12, 0, 0)
+    for second, volume in ((0, 1000.0), (10, 1030.0), (20, 1010.0), (30, 1050.0)):
+        aggregator.add_tick(1, 1.0, volume, start + timedelta(seconds=second))
+    aggregator.add_tick(1, 1.0, 1060.0, start + timedelta(minutes=1))
+
+    first, = aggregator.drain_closed()
+    # Rises of 30 and 40; the fall is trades leaving the 24h window
+    assert first["volume"] == 70.0
+    assert aggregator.get_open_bar(1, "1m")["volume"] == 10.0
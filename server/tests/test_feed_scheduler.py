@@ -0,0 +1,24 @@
+import pytest
+from app.services.feed_scheduler import PollScheduler
+
+def test_volatility_is_the_deviation_of_tick_returns():
+    scheduler = PollScheduler(["PEPE"])
+    for price in (100.0, 110.0, 99.0):
+        scheduler.record_price("PEPE", price)
+    # Returns of +10% and -10%
+    assert scheduler.volatility("PEPE") == pytest.approx(0.1)
+
+def test_volatile_and_watched_tokens_are_polled_more_often():
+    scheduler = PollScheduler(
+        ["PEPE", "DOGE", "INJ"],
+        demand_provider=lambda: {"INJ": {"subscribers": 10}},
+    )
+    for price in (1.0, 1.05, 0.98, 1.04):
+        scheduler.record_price("PEPE", price)
+    for price in (1.0, 1.0, 1.0, 1.0):
+        scheduler.record_price("DOGE", price)
+
+    intervals = scheduler.compute_intervals()
+    assert intervals["DOGE"] == 60
+    assert intervals["PEPE"] < 60 and intervals["INJ"] < 60
+    assert min(intervals.values()) >= scheduler.min_interval
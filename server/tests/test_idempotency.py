@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+from app.services.idempotency import IdempotencyCache
+
+async def test_concurrent_duplicates_share_one_call():
+    cache = IdempotencyCache()
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0)
+        return {"success": True}
+
+    results = await asyncio.gather(*(cache.run("key", call) for _ in range(3)))
+    assert calls == 1 and results == [{"success": True}] * 3
+    assert await cache.run("key", call) == {"success": True} and calls == 1
+
+async def test_failed_results_are_not_remembered():
+    cache = IdempotencyCache()
+    outcomes = iter([{"success": False}, {"success": True}])
+
+    async def call():
+        return next(outcomes)
+
+    def keep(result):
+        return result["success"]
+
+    assert await cache.run("key", call, keep=keep) == {"success": False}
+    assert cache.get("key") is None
+    assert await cache.run("key", call, keep=keep) == {"success": True}
+    assert cache.get("key") is not None
+
+async def test_raised_calls_are_not_remembered():
+    cache = IdempotencyCache()
+
+    async def call():
+        raise RuntimeError("chain down")
+
+    with pytest.raises(RuntimeError):
+        await cache.run("key", call)
+    assert len(cache) == 0
+
+def test_entries_expire_and_oldest_is_evicted(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.services.idempotency.time.monotonic", lambda: now[0])
+    cache = IdempotencyCache(ttl=10, max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.put("c", 3)
+    assert cache.get("a") is None and cache.get("b") == 2
+
+    now[0] += 10
+    assert cache.get("b") is None and len(cache) == 0
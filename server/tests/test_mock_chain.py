@@ -0,0 +1,48 @@
+import pytest
+from app.services.chain_latency import LatencyModel, ZeroLatency
+from app.services.mock_chain import MockChainService
+
+WALLET = "0xwallet"
+
+class TickDuringSettlement(LatencyModel):
+    """Runs a price tick while a transaction waits to settle"""
+
+    def __init__(self):
+        super().__init__()
+        self.tick = None
+
+    async def wait(self):
+        if self.tick is not None:
+            self.tick()
+        self.settled += 1
+
+async def open_long(chain: MockChainService, **triggers) -> dict:
+    chain.update_market("PEPE", 10.0)
+    order = await chain.place_order(WALLET, {"token": "PEPE", "side": "BUY", "size": 10, "price": 10.0, **triggers})
+    return chain.positions[order["position_id"]]
+
+async def test_close_position_loses_race_to_trigger():
+    latency = TickDuringSettlement()
+    chain = MockChainService(latency=latency)
+    position = await open_long(chain, stop_loss=9.0)
+    balance = chain.balances[WALLET]["USDT"]
+
+    latency.tick = lambda: chain.run_triggers("PEPE", 8.5, 0.0)
+    with pytest.raises(ValueError, match="already closed"):
+        await chain.close_position(WALLET, position["id"])
+
+    # Credited once, by the stop-loss
+    assert position["close_reason"] == "STOP_LOSS"
+    assert chain.balances[WALLET]["USDT"] - balance == pytest.approx(
+        position["size"] * position["entry_price"] + position["final_pnl"]
+    )
+
+async def test_set_triggers_rejects_prices_past_the_mark():
+    chain = MockChainService(latency=ZeroLatency())
+    position = await open_long(chain)
+
+    with pytest.raises(ValueError, match="Stop-loss must be below"):
+        await chain.set_triggers(WALLET, position["id"], stop_loss=11.0)
+    with pytest.raises(ValueError, match="Take-profit must be above"):
+        await chain.set_triggers(WALLET, position["id"], take_profit=9.0)
+    assert chain.trigger_engine.triggers_for(position["id"]) == {}
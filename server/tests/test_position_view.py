@@ -0,0 +1,33 @@
+from app.services import trading
+from app.services.position_view import OpenPositionView
+from app.services.trading import trading_service
+from tests.conftest import WALLET, batch
+
+async def test_open_positions_page_through_view(client, db, chain):
+    await trading_service.place_trades(db, "1", WALLET, batch("BUY", "SELL", "BUY")["trades"])
+
+    async with client:
+        url = "/api/v1/trading/positions/user/1/open"
+        first = (await client.get(url, params={"wallet_address": WALLET, "limit": 2})).json()
+        rest = (await client.get(url, params={
+            "wallet_address": WALLET, "limit": 2, "cursor": first["next_cursor"]
+        })).json()
+        everything = (await client.get("/api/v1/trading/positions/user/1", params={"wallet_address": WALLET})).json()
+
+    assert [p["side"] for p in first["positions"]] == ["BUY", "SELL"]
+    assert len(rest["positions"]) == 1 and rest["next_cursor"] is None
+    assert everything == first["positions"] + rest["positions"]
+    assert all(p["size"] == 10 and p["entry_price"] > 0 for p in everything)
+
+async def test_view_loads_open_trades_from_database(db, chain):
+    placed = await trading_service.place_trades(db, "1", WALLET, batch("BUY", "SELL")["trades"])
+    closed_id = placed["results"][0]["trade"]["trade_id"]
+    await trading_service.close_trades(db, "1", WALLET, [closed_id])
+
+    view = OpenPositionView(chain)
+    view.load(db)
+
+    positions, next_cursor = view.page("1", WALLET)
+    assert [p["trade_id"] for p in positions] == [placed["results"][1]["trade"]["trade_id"]]
+    assert positions[0]["side"] == "SELL" and next_cursor is None
+    assert trading.position_view.get_metrics()["open_trades"] == 1
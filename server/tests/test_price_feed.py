@@ -0,0 +1,37 @@
+from app.models.models import Token, TokenType
+from app.services import price_feed
+from app.services.candles import CandleAggregator
+
+def add_tokens(db, *symbols):
+    for symbol in symbols:
+        db.add(Token(symbol=symbol, name=symbol, token_type=TokenType.MEME, contract_address=f"0x{symbol}"))
+    db.commit()
+
+def test_unknown_symbols_are_looked_up_again_after_the_ttl(db, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(price_feed.time, "monotonic", lambda: now[0])
+    price_feed.invalidate_token_id_cache()
+
+    assert price_feed.get_token_ids(db, ["WIF"]) == {}
+    add_tokens(db, "WIF")
+    # Still cached as unknown
+    assert price_feed.get_token_ids(db, ["WIF"]) == {}
+
+    now[0] += price_feed.UNKNOWN_TOKEN_TTL
+    assert list(price_feed.get_token_ids(db, ["WIF"])) == ["WIF"]
+
+def test_price_updates_are_written_in_chunks(db, monkeypatch):
+    monkeypatch.setattr(price_feed, "PRICE_UPDATE_CHUNK_SIZE", 2)
+    monkeypatch.setattr(price_feed, "candle_aggregator", CandleAggregator())
+    price_feed.invalidate_token_id_cache()
+    add_tokens(db, "WIF", "BONK", "FLOKI")
+    symbols = ["PEPE", "WIF", "BONK", "FLOKI"]
+
+    rows = price_feed.write_price_updates(db, {
+        symbol: {"usd": index + 1.0, "usd_24h_vol": 10.0} for index, symbol in enumerate(symbols)
+    })
+    db.commit()
+
+    assert [row["symbol"] for row in rows] == symbols
+    prices = dict(db.query(Token.symbol, Token.current_price).all())
+    assert prices == {"PEPE": 1.0, "WIF": 2.0, "BONK": 3.0, "FLOKI": 4.0}
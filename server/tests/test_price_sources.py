@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+from app.services.price_sources import ReplayPriceSource
+
+RECORDING = """timestamp,symbol,price,volume_24h
+2024-03-01T12:00:00,PEPE,1.0,100
+2024-03-01T12:00:00,doge,2.0,200
+2024-03-01T12:00:05,PEPE,1.5,110
+2024-03-01T12:00:15,PEPE,1.2,120
+"""
+
+def replay(tmp_path, **options) -> ReplayPriceSource:
+    path = tmp_path / "ticks.csv"
+    path.write_text(RECORDING)
+    return ReplayPriceSource(str(path), speed=0, **options)
+
+async def test_replay_groups_records_into_ticks(tmp_path):
+    source = replay(tmp_path)
+
+    prices = await source.fetch_prices(["PEPE", "DOGE"])
+    assert prices == {
+        "PEPE": {"usd": 1.0, "usd_24h_change": 0.0, "usd_24h_vol": 100.0, "usd_market_cap": 0.0},
+        "DOGE": {"usd": 2.0, "usd_24h_change": 0.0, "usd_24h_vol": 200.0, "usd_market_cap": 0.0},
+    }
+    assert source.current_time() == datetime(2024, 3, 1, 12, 0, 0)
+
+    assert len(source.ticks) == 3
+    await source.next_tick()
+    await source.next_tick()
+    assert await source.next_tick() is None and source.exhausted
+
+async def test_looped_replay_keeps_timestamps_increasing(tmp_path):
+    source = replay(tmp_path, loop=True)
+    start = datetime(2024, 3, 1, 12, 0, 0)
+
+    timestamps = [(await source.next_tick())[0] for _ in range(7)]
+    # Each pass is the 15s span plus the last 10s gap later than the one before
+    assert timestamps == [
+        start, start + timedelta(seconds=5), start + timedelta(seconds=15),
+        start + timedelta(seconds=25), start + timedelta(seconds=30), start + timedelta(seconds=40),
+        start + timedelta(seconds=50),
+    ]
+    assert not source.exhausted
@@ -0,0 +1,171 @@
+import pytest
+from app.models.models import Trade
+from app.services import trading
+from app.services.trading import trading_service
+from tests.conftest import WALLET, batch
+
+async def test_batch_place_and_close_round_trip(client, db, chain):
+    async with client:
+        placed = (await client.post("/api/v1/trading/trades/batch", json=batch("BUY", "SELL"))).json()
+        assert placed["success"], placed
+        trade_ids = [result["trade"]["trade_id"] for result in placed["results"]]
+
+        rows = {trade.id: trade for trade in db.query(Trade).all()}
+        assert set(rows) == set(trade_ids)
+        long, short = (rows[trade_id] for trade_id in trade_ids)
+        assert (long.is_long, short.is_long) == (True, False)
+        assert long.position_size == 10 and long.entry_price > 10.0 > short.entry_price
+        assert long.status == "OPEN" and chain.positions[long.position_id]["side"] == "BUY"
+
+        closed = (await client.post("/api/v1/trading/trades/batch/close", json={
+            "user_id": "1", "wallet_address": WALLET, "trade_ids": trade_ids
+        })).json()
+        assert closed["success"], closed
+
+    db.expire_all()
+    for trade in db.query(Trade).all():
+        assert trade.status == "CLOSED"
+        assert trade.pnl == chain.positions[trade.position_id]["final_pnl"]
+        assert trade.closed_at is not None
+
+async def test_single_trade_place_and_close(db, chain):
+    placed = await trading_service.place_trade(db, "1", WALLET, "PEPE", "BUY", 5, 10.0)
+    assert placed["success"], placed
+    trade = placed["trade"]
+    assert trade.position_size == 5 and trade.is_long
+
+    closed = await trading_service.close_trade(db, "1", WALLET, trade.id)
+    assert closed["success"], closed
+    assert trade.status == "CLOSED" and trade.closed_at is not None
+
+async def test_batch_close_commit_failure_hands_position_back(db, chain):
+    placed = await trading_service.place_trades(db, "1", WALLET, batch("BUY")["trades"])
+    trade = placed["results"][0]["trade"]
+
+    def fail():
+        raise RuntimeError("database is gone")
+    db.commit = fail
+    try:
+        closed = await trading_service.close_trades(db, "1", WALLET, [trade["trade_id"]])
+    finally:
+        del db.commit
+    assert not closed["success"]
+
+    # Closed on the chain, so it goes to the tick dispatcher for settlement
+    assert [position["id"] for position in chain.drain_closed_by_chain()] == [trade["position_id"]]
+
+async def test_tick_liquidation_settles_trade(db, chain, monkeypatch):
+    from app.services import price_feed
+    monkeypatch.setattr(price_feed, "mock_chain", chain)
+    placed = await trading_service.place_trades(db, "1", WALLET, batch("BUY")["trades"])
+    trade = placed["results"][0]["trade"]
+
+    # Long positions liquidate 20% below entry
+    await price_feed.dispatch_price_updates([{
+        "symbol": "PEPE", "price": 7.0, "price_change_24h": -30.0, "volume_24h": 0.0, "market_cap": 0.0
+    }])
+
+    db.expire_all()
+    row = db.get(Trade, trade["trade_id"])
+    assert row.status == "LIQUIDATED"
+    assert row.pnl == chain.positions[trade["position_id"]]["final_pnl"]
+    assert row.closed_at is not None
+    assert trading.position_view.get_metrics()["open_trades"] == 0
+
+async def test_failed_close_commit_settles_on_next_tick(db, chain, monkeypatch):
+    placed = await trading_service.place_trades(db, "1", WALLET, batch("BUY")["trades"])
+    trade = placed["results"][0]["trade"]
+
+    def fail():
+        raise RuntimeError("database is gone")
+    db.commit = fail
+    try:
+        await trading_service.close_trades(db, "1", WALLET, [trade["trade_id"]])
+    finally:
+        del db.commit
+
+    await trading_service.settle_chain_closes(chain.drain_closed_by_chain())
+    db.expire_all()
+    assert db.get(Trade, trade["trade_id"]).status == "CLOSED"
+
+async def test_set_position_triggers_saves_trade(db, chain):
+    placed = await trading_service.place_trades(db, "1", WALLET, batch("BUY")["trades"])
+    trade = placed["results"][0]["trade"]
+
+    await trading_service.set_position_triggers(db, WALLET, trade["position_id"], stop_loss=9.0, take_profit=12.0)
+
+    db.expire_all()
+    row = db.get(Trade, trade["trade_id"])
+    assert (row.stop_loss, row.take_profit) == (9.0, 12.0)
+    assert chain.trigger_engine.triggers_for(trade["position_id"]) == {"STOP_LOSS": 9.0, "TAKE_PROFIT": 12.0}
+
+async def test_set_position_triggers_restores_chain_when_save_fails(db, chain):
+    placed = await trading_service.place_trades(db, "1", WALLET, [
+        {"token": "PEPE", "side": "BUY", "size": 10, "price": 10.0, "take_profit": 12.0}
+    ])
+    position_id = placed["results"][0]["trade"]["position_id"]
+
+    def fail():
+        raise RuntimeError("database is gone")
+    db.commit = fail
+    try:
+        with pytest.raises(RuntimeError):
+            await trading_service.set_position_triggers(db, WALLET, position_id, stop_loss=9.0, take_profit=13.0)
+    finally:
+        del db.commit
+
+    assert chain.trigger_engine.triggers_for(position_id) == {"TAKE_PROFIT": 12.0}
+    assert chain.positions[position_id]["stop_loss"] is None
+
+async def test_tick_stop_loss_settles_trade(db, chain, monkeypatch):
+    from app.services import price_feed
+    monkeypatch.setattr(price_feed, "mock_chain", chain)
+    placed = await trading_service.place_trades(db, "1", WALLET, [
+        {"token": "PEPE", "side": "BUY", "size": 10, "price": 10.0, "stop_loss": 9.0}
+    ])
+    trade = placed["results"][0]["trade"]
+    assert trade["stop_loss"] == 9.0
+
+    await price_feed.dispatch_price_updates([{
+        "symbol": "PEPE", "price": 8.9, "price_change_24h": -11.0, "volume_24h": 0.0, "market_cap": 0.0
+    }])
+
+    db.expire_all()
+    row = db.get(Trade, trade["trade_id"])
+    position = chain.positions[trade["position_id"]]
+    assert position["close_reason"] == "STOP_LOSS"
+    assert row.status == "CLOSED"
+    assert row.pnl == pytest.approx(position["final_pnl"]) and row.pnl < 0
+
+async def test_client_order_id_retry_returns_the_first_trade(db, chain):
+    first = await trading_service.place_trade(db, "1", WALLET, "PEPE", "BUY", 5, 10.0, client_order_id="retry-1")
+    again = await trading_service.place_trade(db, "1", WALLET, "PEPE", "BUY", 5, 10.0, client_order_id="retry-1")
+    assert first["success"] and again is first
+    assert db.query(Trade).count() == 1
+
+async def test_batch_retry_places_only_the_items_that_failed(db, chain):
+    items = [
+        {"token": "PEPE", "side": "BUY", "size": 10, "price": 10.0},
+        {"token": "PEPE", "side": "BUY", "size": 10, "price": 10.0, "leverage": 50.0},
+    ]
+    first = await trading_service.place_trades(db, "1", WALLET, items, client_batch_id="retry-batch")
+    assert not first["success"]
+    assert first["results"][0]["success"] and "Risk check failed" in first["results"][1]["error"]
+
+    items[1]["leverage"] = 2.0
+    again = await trading_service.place_trades(db, "1", WALLET, items, client_batch_id="retry-batch")
+    assert again["success"], again
+    assert again["results"][0]["trade"]["trade_id"] == first["results"][0]["trade"]["trade_id"]
+    assert db.query(Trade).count() == 2
+
+async def test_partly_filled_order_records_the_filled_size(db, chain, monkeypatch):
+    from app.services import mock_chain as mock_chain_module
+    # Ten levels of one PEPE each on either side
+    monkeypatch.setattr(mock_chain_module, "LIQUIDITY_LEVEL_NOTIONAL", 10.0)
+    chain.update_market("PEPE", 10.0)
+
+    placed = await trading_service.place_trade(db, "1", WALLET, "PEPE", "BUY", 15, 10.0)
+    assert placed["success"], placed
+    assert placed["order"]["status"] == "PARTIALLY_FILLED"
+    assert placed["trade"].position_size == pytest.approx(10.0)
+    assert placed["unfilled_size"] == pytest.approx(5.0)
@@ -0,0 +1,97 @@
+import asyncio
+import json
+from app.services.websocket import ClientConnection, WebSocketManager
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, data: str):
+        self.frames.append(json.loads(data))
+
+async def test_single_price_update_is_sent_as_a_list():
+    manager = WebSocketManager()
+    manager.configure_conflation("price_feed", 0)
+    websocket = RecordingWebSocket()
+    await manager.manager.connect(websocket, "client", "price_feed")
+
+    await manager.broadcast_price_update({"symbol": "PEPE", "price": 1.0})
+    while not websocket.frames:
+        await asyncio.sleep(0)
+    manager.manager.disconnect("client", "price_feed")
+
+    frame = websocket.frames[0]
+    assert frame["type"] == "price_update"
+    assert frame["data"] == [{"symbol": "PEPE", "price": 1.0}]
+    assert frame["seq"] == manager.price_seq
+
+def test_full_queue_conflates_updates_by_symbol():
+    manager = WebSocketManager()
+    connection = ClientConnection(RecordingWebSocket(), "client", "price_feed", manager.manager, queue_size=1)
+
+    def update(*prices):
+        return {"type": "price_update", "data": [{"symbol": s, "price": p} for s, p in prices], "seq": 1}
+
+    for raw in (update(("PEPE", 1.0)), update(("PEPE", 2.0), ("DOGE", 1.0)), update(("PEPE", 3.0))):
+        assert connection.enqueue(json.dumps(raw), "conflate", raw, "symbol")
+
+    assert connection.queue.qsize() == 1
+    frame = json.loads(connection._take_backlog())
+    assert frame["data"] == [{"symbol": "PEPE", "price": 3.0}, {"symbol": "DOGE", "price": 1.0}]
+
+def test_full_queue_disconnect_policy_rejects():
+    manager = WebSocketManager()
+    connection = ClientConnection(RecordingWebSocket(), "client", "trades", manager.manager, queue_size=1)
+    assert connection.enqueue("first", "disconnect")
+    assert not connection.enqueue("second", "disconnect")
+
+async def connect(manager: WebSocketManager, client_id: str) -> RecordingWebSocket:
+    websocket = RecordingWebSocket()
+    await manager.manager.connect(websocket, client_id, "price_feed")
+    return websocket
+
+async def settle(manager: WebSocketManager):
+    connections = manager.manager.active_connections["price_feed"].values()
+    while any(connection.queue.qsize() for connection in connections):
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+def symbols_in(frames) -> list:
+    return [[update["symbol"] for update in frame["data"]] for frame in frames]
+
+async def test_price_updates_follow_symbol_subscriptions():
+    manager = WebSocketManager()
+    manager.configure_conflation("price_feed", 0)
+    everything, pepe, nothing = [await connect(manager, name) for name in ("all", "pepe", "none")]
+    connections = manager.manager
+    assert connections.subscribe("pepe", "price_feed", ["pepe"]) == {"PEPE"}
+    connections.subscribe("none", "price_feed", ["DOGE"])
+    # Dropping the last symbol leaves the client following none, not all
+    assert connections.unsubscribe("none", "price_feed", ["DOGE"]) == set()
+
+    await manager.broadcast_price_updates([{"symbol": "PEPE", "price": 1.0}, {"symbol": "DOGE", "price": 2.0}])
+    await settle(manager)
+    assert symbols_in(everything.frames) == [["PEPE", "DOGE"]]
+    assert symbols_in(pepe.frames) == [["PEPE"]]
+    assert nothing.frames == []
+
+    assert connections.subscribe("none", "price_feed", ["*"]) is None
+    assert connections.subscriber_counts("price_feed", ["PEPE", "DOGE"]) == {"PEPE": 3, "DOGE": 2}
+    for name in ("all", "pepe", "none"):
+        connections.disconnect(name, "price_feed")
+
+async def test_resume_only_from_sequences_this_worker_issued():
+    manager = WebSocketManager()
+    manager.configure_conflation("price_feed", 0)
+    other = WebSocketManager()
+    since = manager.price_seq
+    await manager.broadcast_price_updates([{"symbol": "PEPE", "price": 1.0}])
+    await manager.broadcast_price_updates([{"symbol": "PEPE", "price": 2.0}, {"symbol": "DOGE", "price": 1.0}])
+
+    assert manager._missed_updates(since) == [{"symbol": "PEPE", "price": 2.0}, {"symbol": "DOGE", "price": 1.0}]
+    assert manager._missed_updates(manager.price_seq) == []
+    assert manager._missed_updates(other.price_seq) is None
+    assert manager._missed_updates(manager.price_seq + 1) is None